@@ -29,4 +29,34 @@ class ArtificialInseminationAdmin(ImportExportModelAdmin):
     list_display = ('animal', 'semen_code', 'breed', 'insemination_date', 'technician', 'status', 'cost')
     list_filter = ('status', 'breed', 'insemination_date', 'farm')
     search_fields = ('animal__name', 'semen_code', 'technician')
-    ordering = ('-insemination_date',)
\ No newline at end of file
+    ordering = ('-insemination_date',)
+@admin.register(HerdCensus)
+class HerdCensusAdmin(admin.ModelAdmin):
+    list_display = ('farm', 'date', 'alive', 'dead', 'sold', 'males', 'females', 'on_sale', 'to_be_archived', 'herd_value', 'updated_at')
+    list_filter = ('farm',)
+    date_hierarchy = 'date'
+    readonly_fields = ('farm', 'date', 'alive', 'dead', 'sold', 'males', 'females', 'on_sale', 'to_be_archived',
+                       'herd_value', 'purchase_value', 'by_type', 'by_breed', 'updated_at')
+
+@admin.register(ArchivedAnimal)
+class ArchivedAnimalAdmin(admin.ModelAdmin):
+    list_display = ('original_id', 'name', 'farm', 'type_name', 'breed_name', 'gender', 'date_of_birth', 'date_of_death', 'date_of_sale', 'archived_at')
+    list_filter = ('farm', 'type_name')
+    search_fields = ['name']
+    readonly_fields = ('original_id', 'farm', 'name', 'type_name', 'breed_name', 'gender', 'date_of_birth', 'date_of_death',
+                       'date_of_purchase', 'date_of_sale', 'price', 'purchase_price', 'data', 'archived_at')
+
+@admin.register(ArchivedRecord)
+class ArchivedRecordAdmin(admin.ModelAdmin):
+    list_display = ('archived_animal', 'kind', 'original_id', 'date', 'amount')
+    list_filter = ('kind',)
+    search_fields = ['archived_animal__name']
+    readonly_fields = ('archived_animal', 'kind', 'original_id', 'date', 'amount', 'data')
+
+@admin.register(BreedingEvent)
+class BreedingEventAdmin(admin.ModelAdmin):
+    list_display = ('animal', 'kind', 'date', 'end_date', 'ai_record', 'farm')
+    list_filter = ('kind', 'farm')
+    search_fields = ['animal__name']
+    date_hierarchy = 'date'
+    readonly_fields = ('farm', 'animal', 'ai_record', 'kind', 'date', 'end_date')
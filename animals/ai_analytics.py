@@ -0,0 +1,73 @@
+"""Success rates of AI services by technician, semen code and breed.
+
+Every figure is computed by the database in one grouped query per
+dimension. Pending services have no outcome yet, so the rates count only
+the services that have one:
+
+- conception_rate: successful services over services with an outcome;
+- services_per_conception: services with an outcome per successful one;
+- cost_per_conception: the cost of every service, pending ones included,
+  over the successful ones.
+"""
+from django.db.models import Count, F, FloatField, Q, Sum
+from django.db.models.functions import Cast, NullIf, TruncMonth
+
+# Dimensions services are compared by, as name: (group field, label field)
+AI_DIMENSIONS = {
+    'technician': ('technician', 'technician'),
+    'semen_code': ('semen_code', 'semen_code'),
+    'breed': ('breed_id', 'breed__name'),
+}
+
+
+def ai_aggregates():
+    return {
+        'services': Count('id'),
+        'successful': Count('id', filter=Q(status='SUCCESSFUL')),
+        'unsuccessful': Count('id', filter=Q(status='UNSUCCESSFUL')),
+        'pending': Count('id', filter=Q(status='PENDING')),
+        'total_cost': Sum('cost'),
+    }
+
+
+def ai_rates():
+    """Rates over the aggregates of ai_aggregates, null where nothing has conceived or has an outcome"""
+    successful = Cast(F('successful'), FloatField())
+    with_outcome = Cast(F('successful') + F('unsuccessful'), FloatField())
+    return {
+        'conception_rate': successful / NullIf(with_outcome, 0.0),
+        'services_per_conception': with_outcome / NullIf(successful, 0.0),
+        'cost_per_conception': Cast(F('total_cost'), FloatField()) / NullIf(successful, 0.0),
+    }
+
+
+def ai_summary(services):
+    """Totals and rates of all the services of a queryset"""
+    summary = services.aggregate(**ai_aggregates())
+    with_outcome = summary['successful'] + summary['unsuccessful']
+    summary['conception_rate'] = summary['successful'] / with_outcome if with_outcome else None
+    summary['services_per_conception'] = with_outcome / summary['successful'] if summary['successful'] else None
+    summary['cost_per_conception'] = (
+        float(summary['total_cost']) / summary['successful'] if summary['successful'] and summary['total_cost'] is not None else None
+    )
+    return summary
+
+
+def ai_by_dimension(services, dimension):
+    """Totals and rates per value of a dimension, best conception rate first"""
+    group_field, label_field = AI_DIMENSIONS[dimension]
+    rows = services.values(group_field).annotate(label=F(label_field), **ai_aggregates()).annotate(**ai_rates())
+    return list(rows.order_by(F('conception_rate').desc(nulls_last=True), '-services', group_field))
+
+
+def ai_monthly_trend(services, dimension=None):
+    """Totals and rates per month, and per value of a dimension within each month when given"""
+    fields = ['month']
+    if dimension is not None:
+        group_field, label_field = AI_DIMENSIONS[dimension]
+        fields.append(group_field)
+    rows = services.annotate(month=TruncMonth('insemination_date')).values(*fields)
+    if dimension is not None:
+        rows = rows.annotate(label=F(label_field))
+    rows = rows.annotate(**ai_aggregates()).annotate(**ai_rates())
+    return list(rows.order_by(*fields))
@@ -4,3 +4,13 @@ from django.apps import AppConfig
 class AnimalsConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'animals'
+
+    def ready(self):
+        from .inbreeding import connect_inbreeding_signals
+        from .census import connect_census_signals
+        from .breeding import connect_breeding_signals
+        from .detail_cache import connect_detail_cache_signals
+        connect_inbreeding_signals()
+        connect_census_signals()
+        connect_breeding_signals()
+        connect_detail_cache_signals()
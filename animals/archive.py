@@ -0,0 +1,159 @@
+"""Archival of the animals flagged to_be_archived.
+
+An archived animal and its production records, health records, treatments,
+AI services, images, production alerts and lactations are copied into ArchivedAnimal and ArchivedRecord,
+with every value of the original row kept as a JSON document, and deleted
+from the live tables. Animals are archived in batches, each in its own
+transaction, so a long run holds no lock for long and can be resumed.
+
+Offspring are archived before their parents: an animal is only archived once
+no live animal names it as dam or sire or descends from one of its AI
+services, so live pedigrees never lose an ancestor. Flagged animals with
+offspring that are not flagged stay until those are archived too.
+
+Archived treatments keep counting in the farm's daily ledger and archived
+animals in its herd census.
+"""
+from collections import namedtuple
+from datetime import datetime
+from django.db import transaction
+from django.db.models import Exists, F, OuterRef, Q
+from health.models import HealthRecord, ProductionAlert, Treatment
+from products.models import Lactation, ProductionRecord
+from .census import census_refresh_suspended
+from .models import Animal, AnimalImage, ArchivedAnimal, ArchivedRecord, ArtificialInsemination
+
+DEFAULT_BATCH_SIZE = 100
+
+# Rows archived with an animal, as (kind, model, lookup of the animal id, date field, amount field)
+ArchiveSource = namedtuple('ArchiveSource', ['kind', 'model', 'animal_lookup', 'date_field', 'amount_field'])
+
+ARCHIVE_SOURCES = [
+    ArchiveSource('production_record', ProductionRecord, 'animal_id', 'date', 'quantity'),
+    ArchiveSource('health_record', HealthRecord, 'animal_id', 'diagnosis_date', None),
+    ArchiveSource('treatment', Treatment, 'health_record__animal_id', 'treatment_date', 'cost'),
+    ArchiveSource('ai_record', ArtificialInsemination, 'animal_id', 'insemination_date', 'cost'),
+    ArchiveSource('image', AnimalImage, 'animal_id', 'created_at', None),
+    ArchiveSource('production_alert', ProductionAlert, 'animal_id', 'date', 'quantity'),
+    ArchiveSource('lactation', Lactation, 'animal_id', 'calving_date', 'total_yield'),
+]
+
+
+def has_live_offspring():
+    return Exists(Animal.objects.filter(
+        Q(dam=OuterRef('pk')) | Q(sire=OuterRef('pk')) | Q(ai_sire__animal=OuterRef('pk'))
+    ))
+
+
+def archivable_animals(farm_ids=None):
+    """Flagged animals that no live animal descends from"""
+    animals = Animal.objects.filter(to_be_archived=True)
+    if farm_ids is not None:
+        animals = animals.filter(farm_id__in=farm_ids)
+    return animals.filter(~has_live_offspring())
+
+
+def plan_archive(farm_ids=None):
+    """Split the flagged animals into those an archive run would archive and those it would keep.
+
+    Replays the run on the parent links: flagged animals without live
+    offspring are archived, which may free their own parents in turn.
+    Returns (archived ids, kept ids).
+    """
+    flagged = Animal.objects.filter(to_be_archived=True)
+    if farm_ids is not None:
+        flagged = flagged.filter(farm_id__in=farm_ids)
+    flagged_ids = set(flagged.values_list('id', flat=True))
+    links = Animal.objects.filter(
+        Q(dam__in=flagged_ids) | Q(sire__in=flagged_ids) | Q(ai_sire__animal__in=flagged_ids)
+    ).values_list('id', 'dam_id', 'sire_id', 'ai_sire__animal_id')
+    parents = {}
+    live_offspring = dict.fromkeys(flagged_ids, 0)
+    for animal_id, *animal_parents in links:
+        parents[animal_id] = {parent for parent in animal_parents if parent in flagged_ids}
+        for parent in parents[animal_id]:
+            live_offspring[parent] += 1
+
+    ready = [animal_id for animal_id, count in live_offspring.items() if count == 0]
+    archived = set()
+    while ready:
+        animal_id = ready.pop()
+        archived.add(animal_id)
+        for parent in parents.get(animal_id, ()):
+            live_offspring[parent] -= 1
+            if live_offspring[parent] == 0:
+                ready.append(parent)
+    return archived, flagged_ids - archived
+
+
+def archived_records(source, animal_ids, archived):
+    """Build the unsaved ArchivedRecord rows of one source for the animals being archived"""
+    rows = source.model.objects.filter(**{f'{source.animal_lookup}__in': animal_ids})
+    if source.model is Treatment:
+        rows = rows.annotate(animal_id=F('health_record__animal_id'))
+        links = Treatment.transactions.through.objects.filter(treatment__in=rows)
+        transactions = {}
+        for treatment_id, transaction_id in links.values_list('treatment_id', 'transaction_id'):
+            transactions.setdefault(treatment_id, []).append(transaction_id)
+
+    records = []
+    for row in rows.values():
+        animal_id = row.pop('animal_id')
+        if source.model is Treatment:
+            row['transactions'] = transactions.get(row['id'], [])
+        day = row[source.date_field]
+        records.append(ArchivedRecord(
+            archived_animal=archived[animal_id],
+            kind=source.kind,
+            original_id=row['id'],
+            date=day.date() if isinstance(day, datetime) else day,
+            amount=row[source.amount_field] if source.amount_field else None,
+            data=row,
+        ))
+    return records
+
+
+def archive_batch(animal_ids):
+    """Archive the animals among animal_ids that can still be archived, returning their count"""
+    with transaction.atomic():
+        animals = list(
+            archivable_animals().filter(id__in=animal_ids).select_for_update(of=('self',))
+            .annotate(type_name=F('type__name'), breed_name=F('breed__name')).values()
+        )
+        if not animals:
+            return 0
+        archived = {}
+        for animal in animals:
+            type_name, breed_name = animal.pop('type_name'), animal.pop('breed_name')
+            archived[animal['id']] = ArchivedAnimal(
+                original_id=animal['id'], farm_id=animal['farm_id'], name=animal['name'],
+                type_name=type_name, breed_name=breed_name, gender=animal['gender'],
+                date_of_birth=animal['date_of_birth'], date_of_death=animal['date_of_death'],
+                date_of_purchase=animal['date_of_purchase'], date_of_sale=animal['date_of_sale'],
+                price=animal['price'], purchase_price=animal['purchase_price'], data=animal,
+            )
+        ArchivedAnimal.objects.bulk_create(archived.values())
+
+        ids = list(archived)
+        records = []
+        for source in ARCHIVE_SOURCES:
+            records.extend(archived_records(source, ids, archived))
+        # Written before the delete, so the ledger refreshed by the treatment
+        # delete signals already counts the archived treatments
+        ArchivedRecord.objects.bulk_create(records)
+
+        # The cascade skips ProductionRecord.delete, so product inventories are
+        # left as they are, and the census is unchanged as it counts archived animals
+        with census_refresh_suspended():
+            Animal.objects.filter(id__in=ids).delete()
+    return len(ids)
+
+
+def archive_animals(farm_ids=None, batch_size=DEFAULT_BATCH_SIZE):
+    """Archive every archivable flagged animal of the farms (all farms when None), returning the count"""
+    total = 0
+    while True:
+        batch = list(archivable_animals(farm_ids).order_by('id').values_list('id', flat=True)[:batch_size])
+        if not batch:
+            return total
+        total += archive_batch(batch)
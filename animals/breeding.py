@@ -0,0 +1,242 @@
+"""Breeding calendar of the herd, projected from AI services and calvings.
+
+The latest AI service of a female since she last calved drives her calendar:
+
+- a PENDING service is followed by a repeat heat window around one heat
+  cycle later, when she is watched for a return to heat, and by the
+  pregnancy check, which is overdue once its day has passed while the
+  service is still pending;
+- a SUCCESSFUL service gives the expected calving one gestation later and
+  the dry-off a dry period before it.
+
+Unsuccessful services, and animals that have died or been sold, have no
+events, and a calf born to the dam after the service ends its projection.
+
+The events are stored in BreedingEvent so the daily task view is an index
+range scan. The events of an animal are recomputed once a transaction that
+wrote one of her AI records, her, or a calf of hers commits.
+
+Calendar apps subscribe to the iCalendar feed by URL and cannot send bearer
+tokens, so the feed is authenticated by a token in its URL, the farm id
+signed with the project's SECRET_KEY.
+"""
+from datetime import timedelta
+from django.core import signing
+from django.db import transaction
+from django.db.models import Max
+from django.db.models.signals import pre_save, post_save, post_delete
+from django.utils import timezone
+from .models import Animal, ArtificialInsemination, BreedingEvent
+
+GESTATION_DAYS = 283
+HEAT_CYCLE_DAYS = 21
+# Days either side of the expected repeat heat that the window covers
+HEAT_WINDOW_DAYS = 3
+PREGNANCY_CHECK_DAYS = 35
+DRY_PERIOD_DAYS = 60
+
+# Longest span of an event, so range queries can bound date as well as end_date
+MAX_EVENT_DAYS = 2 * HEAT_WINDOW_DAYS
+
+REFRESH_BATCH_SIZE = 500
+
+CALENDAR_FEED_SALT = 'animals.breeding.calendar_feed'
+
+
+def project_events(insemination_date, status):
+    """(kind, date, end_date) of the events following an AI service"""
+    if status == 'PENDING':
+        heat = insemination_date + timedelta(days=HEAT_CYCLE_DAYS)
+        check = insemination_date + timedelta(days=PREGNANCY_CHECK_DAYS)
+        return [
+            ('repeat_heat', heat - timedelta(days=HEAT_WINDOW_DAYS), heat + timedelta(days=HEAT_WINDOW_DAYS)),
+            ('pregnancy_check', check, check),
+        ]
+    if status == 'SUCCESSFUL':
+        calving = insemination_date + timedelta(days=GESTATION_DAYS)
+        dry_off = calving - timedelta(days=DRY_PERIOD_DAYS)
+        return [
+            ('dry_off', dry_off, dry_off),
+            ('expected_calving', calving, calving),
+        ]
+    return []
+
+
+def compute_breeding_events(animal_ids):
+    """Return the unsaved BreedingEvent rows of the animals"""
+    animals = dict(Animal.objects.filter(
+        id__in=animal_ids, date_of_death__isnull=True, date_of_sale__isnull=True
+    ).values_list('id', 'farm_id'))
+    last_calving = dict(
+        Animal.objects.filter(dam_id__in=list(animals)).values('dam_id')
+        .annotate(last=Max('date_of_birth')).values_list('dam_id', 'last')
+    )
+    services = ArtificialInsemination.objects.filter(animal_id__in=list(animals)).order_by(
+        'animal_id', '-insemination_date', '-id'
+    ).values('id', 'animal_id', 'insemination_date', 'status')
+
+    events = []
+    seen = set()
+    for service in services:
+        if service['animal_id'] in seen:
+            continue
+        seen.add(service['animal_id'])
+        calved = last_calving.get(service['animal_id'])
+        if calved is not None and calved >= service['insemination_date']:
+            continue
+        for kind, day, end_date in project_events(service['insemination_date'], service['status']):
+            events.append(BreedingEvent(
+                farm_id=animals[service['animal_id']], animal_id=service['animal_id'],
+                ai_record_id=service['id'], kind=kind, date=day, end_date=end_date,
+            ))
+    return events
+
+
+def refresh_breeding_events(animal_ids):
+    """Replace the stored events of the animals"""
+    animal_ids = list(animal_ids)
+    with transaction.atomic():
+        BreedingEvent.objects.filter(animal_id__in=animal_ids).delete()
+        return len(BreedingEvent.objects.bulk_create(compute_breeding_events(animal_ids)))
+
+
+def build_breeding_calendar(farm_ids=None):
+    """Recompute the events of every animal with AI services on the farms (all farms when None)"""
+    services = ArtificialInsemination.objects.all()
+    stale = BreedingEvent.objects.all()
+    if farm_ids is not None:
+        services = services.filter(animal__farm_id__in=farm_ids)
+        stale = stale.filter(farm_id__in=farm_ids)
+    animal_ids = sorted(set(services.values_list('animal_id', flat=True)))
+    stale.exclude(animal_id__in=animal_ids).delete()
+    count = 0
+    for start in range(0, len(animal_ids), REFRESH_BATCH_SIZE):
+        count += refresh_breeding_events(animal_ids[start:start + REFRESH_BATCH_SIZE])
+    return count
+
+
+def get_breeding_events(farm_id, start_date, end_date, kinds=None):
+    """Events of a farm that fall on or overlap the days from start_date to end_date"""
+    events = BreedingEvent.objects.filter(
+        farm_id=farm_id,
+        date__range=(start_date - timedelta(days=MAX_EVENT_DAYS), end_date),
+        end_date__gte=start_date,
+    )
+    if kinds is not None:
+        events = events.filter(kind__in=kinds)
+    return events.select_related('animal', 'ai_record')
+
+
+def get_overdue_pregnancy_checks(farm_id, today=None):
+    today = today or timezone.now().date()
+    return BreedingEvent.objects.filter(
+        farm_id=farm_id, kind='pregnancy_check', date__lt=today
+    ).select_related('animal', 'ai_record')
+
+
+def escape_ical_text(value):
+    return (str(value).replace('\\', '\\\\').replace(';', '\\;').replace(',', '\\,')
+            .replace('\r\n', '\\n').replace('\n', '\\n'))
+
+
+def fold_ical_line(line):
+    """Split a content line into the 75 octet lines iCalendar allows"""
+    encoded = line.encode()
+    lines = []
+    while len(encoded) > 75:
+        cut = 75 if not lines else 74
+        # Never split a UTF-8 sequence
+        while cut and (encoded[cut] & 0xC0) == 0x80:
+            cut -= 1
+        lines.append(encoded[:cut].decode())
+        encoded = encoded[cut:]
+    lines.append(encoded.decode())
+    return '\r\n '.join(lines)
+
+
+def calendar_feed_token(farm_id):
+    """Token authenticating the iCalendar feed of a farm"""
+    return signing.Signer(salt=CALENDAR_FEED_SALT).signature(str(farm_id))
+
+
+def check_calendar_feed_token(farm_id, token):
+    try:
+        signing.Signer(salt=CALENDAR_FEED_SALT).unsign(f'{farm_id}:{token}')
+    except signing.BadSignature:
+        return False
+    return True
+
+
+def render_ical(events, calendar_name):
+    """Render breeding events as an iCalendar feed of all-day events"""
+    stamp = timezone.now().strftime('%Y%m%dT%H%M%SZ')
+    lines = [
+        'BEGIN:VCALENDAR',
+        'VERSION:2.0',
+        'PRODID:-//DairyDrive//Breeding Calendar//EN',
+        'CALSCALE:GREGORIAN',
+        f'X-WR-CALNAME:{escape_ical_text(calendar_name)}',
+    ]
+    for event in events:
+        service = event.ai_record
+        lines += [
+            'BEGIN:VEVENT',
+            # Stable across refreshes, which recreate the rows
+            f'UID:breeding-{event.kind}-{event.ai_record_id}@dairydrive',
+            f'DTSTAMP:{stamp}',
+            f'DTSTART;VALUE=DATE:{event.date:%Y%m%d}',
+            f'DTEND;VALUE=DATE:{event.end_date + timedelta(days=1):%Y%m%d}',
+            f'SUMMARY:{escape_ical_text(f"{event.get_kind_display()}: {event.animal.name}")}',
+            'DESCRIPTION:' + escape_ical_text(
+                f'AI service on {service.insemination_date} with semen {service.semen_code} '
+                f'by {service.technician} ({service.get_status_display()})'
+            ),
+            'END:VEVENT',
+        ]
+    lines.append('END:VCALENDAR')
+    return '\r\n'.join(fold_ical_line(line) for line in lines) + '\r\n'
+
+
+def schedule_breeding_refresh(animal_ids):
+    animal_ids = {animal_id for animal_id in animal_ids if animal_id is not None}
+    if animal_ids:
+        transaction.on_commit(lambda: refresh_breeding_events(animal_ids))
+
+
+def capture_service_animal(sender, instance, **kwargs):
+    instance._stored_breeding_animal = (
+        ArtificialInsemination.objects.filter(pk=instance.pk).values_list('animal_id', flat=True).first()
+        if instance.pk else None
+    )
+
+
+def service_saved(sender, instance, **kwargs):
+    schedule_breeding_refresh([instance.animal_id, getattr(instance, '_stored_breeding_animal', None)])
+
+
+def service_deleted(sender, instance, **kwargs):
+    schedule_breeding_refresh([instance.animal_id])
+
+
+def capture_animal_dam(sender, instance, **kwargs):
+    instance._stored_breeding_dam = (
+        Animal.objects.filter(pk=instance.pk).values_list('dam_id', flat=True).first() if instance.pk else None
+    )
+
+
+def animal_saved(sender, instance, **kwargs):
+    # The animal may have died or been sold, and a calf ends its dam's projection
+    schedule_breeding_refresh([instance.id, instance.dam_id, getattr(instance, '_stored_breeding_dam', None)])
+
+
+def animal_deleted(sender, instance, **kwargs):
+    schedule_breeding_refresh([instance.dam_id])
+
+
+def connect_breeding_signals():
+    pre_save.connect(capture_service_animal, sender=ArtificialInsemination, dispatch_uid='breeding_calendar_ai')
+    post_save.connect(service_saved, sender=ArtificialInsemination, dispatch_uid='breeding_calendar_ai')
+    post_delete.connect(service_deleted, sender=ArtificialInsemination, dispatch_uid='breeding_calendar_ai')
+    pre_save.connect(capture_animal_dam, sender=Animal, dispatch_uid='breeding_calendar_animal')
+    post_save.connect(animal_saved, sender=Animal, dispatch_uid='breeding_calendar_animal')
+    post_delete.connect(animal_deleted, sender=Animal, dispatch_uid='breeding_calendar_animal')
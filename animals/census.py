@@ -0,0 +1,229 @@
+"""Maintenance of the HerdCensus daily snapshots.
+
+An animal is part of the herd from its birth, or its purchase when bought,
+until it dies or is sold. The snapshot of a day counts the animals in the
+herd by gender, type and breed, values them at their price (or purchase
+price), and counts every animal that had died or been sold by then.
+
+A range of snapshots is computed from one query over the farm's animals:
+each animal contributes a join and a leave event, and the days are swept in
+order keeping running totals, so years of history cost a single pass.
+
+Writes to animals that change what the census counts refresh today's
+snapshot once the transaction commits, and every earlier snapshot when a
+date that places the animal in history changes; other edits, such as a
+rename, refresh nothing. The on_sale and to_be_archived flags have no history, so they are
+only recorded for the day a snapshot is taken and kept afterwards.
+"""
+import threading
+from collections import Counter, defaultdict
+from contextlib import contextmanager
+from itertools import chain
+from datetime import timedelta
+from decimal import Decimal
+from django.db import transaction
+from django.db.models import F, Min, Max
+from django.db.models.signals import pre_save, post_save, post_delete
+from django.utils import timezone
+from farms.models import Farm
+from .models import Animal, ArchivedAnimal, HerdCensus
+
+# Dates that place an animal in the herd's history
+HISTORY_FIELDS = ('date_of_birth', 'date_of_purchase', 'date_of_death', 'date_of_sale')
+# Other fields the snapshots count the herd by
+COUNTED_FIELDS = ('type_id', 'breed_id', 'gender', 'price', 'purchase_price', 'is_on_sale', 'to_be_archived')
+
+_refresh_state = threading.local()
+
+
+def herd_interval(animal):
+    """First day in the herd and the day the animal left it (None while it stays) of an animal's values"""
+    joined = max(animal['date_of_birth'], animal['date_of_purchase'] or animal['date_of_birth'])
+    exits = [day for day in (animal['date_of_death'], animal['date_of_sale']) if day]
+    return joined, min(exits) if exits else None
+
+
+class HerdState:
+    """Running totals of the herd while sweeping days"""
+
+    def __init__(self):
+        self.alive = self.males = self.females = self.dead = self.sold = 0
+        self.herd_value = Decimal(0)
+        self.purchase_value = Decimal(0)
+        self.by_type = Counter()
+        self.by_breed = Counter()
+
+    def apply(self, event, animal):
+        if event == 'dead':
+            self.dead += 1
+            return
+        if event == 'sold':
+            self.sold += 1
+            return
+        sign = 1 if event == 'join' else -1
+        self.alive += sign
+        if animal['gender'] == 'Male':
+            self.males += sign
+        elif animal['gender'] == 'Female':
+            self.females += sign
+        self.herd_value += sign * Decimal(animal['price'] or animal['purchase_price'] or 0)
+        self.purchase_value += sign * Decimal(animal['purchase_price'] or 0)
+        self.by_type[animal['type_name']] += sign
+        if animal['breed_name']:
+            self.by_breed[animal['breed_name']] += sign
+
+    def snapshot(self, farm_id, day):
+        return HerdCensus(
+            farm_id=farm_id, date=day, alive=self.alive, dead=self.dead, sold=self.sold,
+            males=self.males, females=self.females, herd_value=self.herd_value,
+            purchase_value=self.purchase_value,
+            by_type={name: count for name, count in sorted(self.by_type.items()) if count},
+            by_breed={name: count for name, count in sorted(self.by_breed.items()) if count},
+        )
+
+
+def compute_census(farm_id, start_date, end_date):
+    """Return unsaved HerdCensus rows of a farm for every day from start_date to end_date"""
+    animals = Animal.objects.filter(farm_id=farm_id).values(
+        *HISTORY_FIELDS, 'gender', 'price', 'purchase_price',
+        type_name=F('type__name'), breed_name=F('breed__name')
+    )
+    # Archived animals keep their place in the herd's history
+    archived = ArchivedAnimal.objects.filter(farm_id=farm_id).values(
+        *HISTORY_FIELDS, 'gender', 'price', 'purchase_price', 'type_name', 'breed_name'
+    )
+    events = defaultdict(list)
+    for animal in chain(animals, archived):
+        joined, left = herd_interval(animal)
+        if left is None or left > joined:
+            events[joined].append(('join', animal))
+            if left is not None:
+                events[left].append(('leave', animal))
+        if animal['date_of_death']:
+            events[animal['date_of_death']].append(('dead', animal))
+        if animal['date_of_sale']:
+            events[animal['date_of_sale']].append(('sold', animal))
+
+    state = HerdState()
+    event_days = sorted(events)
+    position = 0
+    rows = []
+    day = start_date
+    while day <= end_date:
+        while position < len(event_days) and event_days[position] <= day:
+            for event, animal in events[event_days[position]]:
+                state.apply(event, animal)
+            position += 1
+        rows.append(state.snapshot(farm_id, day))
+        day += timedelta(days=1)
+    return rows
+
+
+def save_census(farm_id, rows, today=None):
+    """Replace the stored snapshots of the days in rows.
+
+    Flag counts are taken from the animals for today's snapshot and kept
+    from the stored snapshots for earlier days.
+    """
+    if not rows:
+        return 0
+    today = today or timezone.now().date()
+    start_date, end_date = rows[0].date, rows[-1].date
+    with transaction.atomic():
+        # Serializes refreshes of a farm, and skips farms deleted since the refresh was scheduled
+        if not Farm.objects.select_for_update().filter(id=farm_id).exists():
+            return 0
+        stored = HerdCensus.objects.filter(farm_id=farm_id, date__range=(start_date, end_date))
+        flags = {row['date']: row for row in stored.values('date', 'on_sale', 'to_be_archived')}
+        for row in rows:
+            if row.date == today:
+                herd = Animal.objects.filter(farm_id=farm_id)
+                row.on_sale = herd.filter(is_on_sale=True).count()
+                row.to_be_archived = herd.filter(to_be_archived=True).count()
+            elif row.date in flags:
+                row.on_sale = flags[row.date]['on_sale']
+                row.to_be_archived = flags[row.date]['to_be_archived']
+        stored.delete()
+        HerdCensus.objects.bulk_create(rows)
+    return len(rows)
+
+
+def build_census(farm_id, start_date, end_date):
+    """Compute and store the snapshots of a farm for a range of days, replacing existing ones"""
+    return save_census(farm_id, compute_census(farm_id, start_date, end_date))
+
+
+def refresh_census(farm_id, since=None):
+    """Bring the snapshots of a farm up to date through today.
+
+    Days without a snapshot since the latest one are filled in. When since
+    is given, stored snapshots from that day on are recomputed as well.
+    """
+    today = timezone.now().date()
+    bounds = HerdCensus.objects.filter(farm_id=farm_id).aggregate(first=Min('date'), last=Max('date'))
+    start_date = today
+    if bounds['last'] is not None:
+        start_date = min(start_date, bounds['last'] + timedelta(days=1))
+        if since is not None:
+            start_date = min(start_date, max(since, bounds['first']))
+    return build_census(farm_id, start_date, today)
+
+
+@contextmanager
+def census_refresh_suspended():
+    """Skip the refreshes of animal writes that leave the census unchanged, such as archiving"""
+    previous = getattr(_refresh_state, 'suspended', False)
+    _refresh_state.suspended = True
+    try:
+        yield
+    finally:
+        _refresh_state.suspended = previous
+
+
+def schedule_census_refresh(farm_id, since=None):
+    if getattr(_refresh_state, 'suspended', False):
+        return
+    transaction.on_commit(lambda: refresh_census(farm_id, since))
+
+
+def capture_census_fields(sender, instance, **kwargs):
+    """Remember the stored farm, history dates and counted fields of an animal before a save"""
+    instance._stored_census = (
+        Animal.objects.filter(pk=instance.pk).values('farm_id', *HISTORY_FIELDS, *COUNTED_FIELDS).first()
+        if instance.pk else None
+    )
+
+
+def earliest_history_date(animal, fields=HISTORY_FIELDS):
+    days = [animal[field] for field in fields if animal[field]]
+    return min(days) if days else None
+
+
+def animal_saved(sender, instance, created, **kwargs):
+    current = {
+        'farm_id': instance.farm_id, **{field: getattr(instance, field) for field in HISTORY_FIELDS + COUNTED_FIELDS}
+    }
+    stored = getattr(instance, '_stored_census', None)
+    if created or stored is None:
+        schedule_census_refresh(instance.farm_id, earliest_history_date(current))
+    elif stored['farm_id'] != instance.farm_id:
+        schedule_census_refresh(stored['farm_id'], earliest_history_date(stored))
+        schedule_census_refresh(instance.farm_id, earliest_history_date(current))
+    else:
+        changed = [field for field in HISTORY_FIELDS if stored[field] != current[field]]
+        days = [day for day in (earliest_history_date(stored, changed), earliest_history_date(current, changed)) if day]
+        if days:
+            schedule_census_refresh(instance.farm_id, min(days))
+        elif any(stored[field] != current[field] for field in COUNTED_FIELDS):
+            schedule_census_refresh(instance.farm_id)
+
+
+def animal_deleted(sender, instance, **kwargs):
+    current = {field: getattr(instance, field) for field in HISTORY_FIELDS}
+    schedule_census_refresh(instance.farm_id, earliest_history_date(current))
+
+
+def connect_census_signals():
+    pre_save.connect(capture_census_fields, sender=Animal, dispatch_uid='herd_census_animal')
+    post_save.connect(animal_saved, sender=Animal, dispatch_uid='herd_census_animal')
+    post_delete.connect(animal_deleted, sender=Animal, dispatch_uid='herd_census_animal')
@@ -0,0 +1,154 @@
+"""Cache of the serialized animal detail document.
+
+The document of an animal shows rows of the animal itself and of every
+ancestor in its pedigree (their images and AI sires, whose dams may lie
+outside the pedigree), and names of the farm's types, breeds, conditions,
+veterinarians and vet services. Each animal has a version token, replaced
+once a transaction that wrote the animal or one of its images, AI records,
+health records or treatments commits, and each farm has one for those
+names.
+
+A cached document stores the tokens of everything it was built from, read
+before building it, and is served only while they are all unchanged. A
+write to an ancestor therefore invalidates the documents of its descendants
+without the write having to find them, and a change of parents, being a
+write to the child, invalidates documents that relied on the old pedigree.
+"""
+from django.apps import apps
+from django.conf import settings
+from django.core.cache import cache
+from django.core.exceptions import ObjectDoesNotExist
+from django.db import connection, transaction
+from django.db.models.expressions import RawSQL
+from django.db.models.signals import pre_save, post_save, post_delete
+from django.utils import timezone
+from farms.cache import get_version_token, bump_version_token
+from .models import Animal
+from .pedigree import ANCESTORS_SQL, MAX_PEDIGREE_DEPTH
+
+# Rows shown in the detail document of their animal, with the lookup from the
+# row to the animal id and the attribute path from an instance to it
+ANIMAL_DETAIL_MODELS = {
+    'animals.Animal': ('id', 'id'),
+    'animals.AnimalImage': ('animal_id', 'animal_id'),
+    'animals.ArtificialInsemination': ('animal_id', 'animal_id'),
+    'health.HealthRecord': ('animal_id', 'animal_id'),
+    'health.Treatment': ('health_record__animal_id', 'health_record.animal_id'),
+}
+
+# Farm records whose names appear in detail documents
+ANIMAL_LOOKUP_MODELS = [
+    'animals.AnimalType',
+    'animals.AnimalBreed',
+    'health.HealthCondition',
+    'health.Veterinarian',
+    'health.VetService',
+]
+
+
+def animal_version_key(animal_id):
+    return f'animal:{animal_id}:detail_version'
+
+
+def lookups_version_key(farm_id):
+    return f'farm:{farm_id}:animal_lookups_version'
+
+
+def detail_cache_key(animal_id):
+    # Today's date is part of the key because ages in the document move with it
+    return f'animal:{animal_id}:detail:{timezone.now().date().isoformat()}'
+
+
+def get_dependency_keys(animal_id):
+    """Return the farm of an animal and the version keys its document depends on, (None, []) if it does not exist"""
+    sql = ANCESTORS_SQL.format(table=connection.ops.quote_name(Animal._meta.db_table))
+    pedigree = Animal.objects.filter(id__in=RawSQL(sql, [animal_id, MAX_PEDIGREE_DEPTH])).values_list(
+        'id', 'farm_id', 'ai_sire__animal_id'
+    )
+    farm_id = None
+    animal_ids = set()
+    for ancestor_id, ancestor_farm_id, ai_dam_id in pedigree:
+        if ancestor_id == animal_id:
+            farm_id = ancestor_farm_id
+        animal_ids.add(ancestor_id)
+        if ai_dam_id is not None:
+            animal_ids.add(ai_dam_id)
+    if farm_id is None:
+        return None, []
+    return farm_id, [lookups_version_key(farm_id)] + [animal_version_key(pk) for pk in sorted(animal_ids)]
+
+
+def get_animal_detail(farm_id, animal_id, build):
+    """Return the detail document of an animal of a farm, or None when the farm has no such animal.
+
+    build(animal) serializes the document on a cache miss.
+    """
+    key = detail_cache_key(animal_id)
+    entry = cache.get(key)
+    if entry is not None and cache.get_many(list(entry['versions'])) == entry['versions']:
+        return entry['data'] if entry['farm_id'] == farm_id else None
+
+    animal_farm_id, dependencies = get_dependency_keys(animal_id)
+    if animal_farm_id != farm_id:
+        return None
+    # Read before the data, so a write committed while building leaves the entry stale
+    versions = {dependency: get_version_token(dependency) for dependency in dependencies}
+    try:
+        animal = Animal.objects.get(id=animal_id, farm_id=farm_id)
+    except Animal.DoesNotExist:
+        return None
+    data = build(animal)
+    cache.set(key, {'farm_id': farm_id, 'versions': versions, 'data': data}, settings.FARM_RESPONSE_CACHE_TIMEOUT)
+    return data
+
+
+def bump_animal_versions(animal_ids):
+    for animal_id in animal_ids:
+        bump_version_token(animal_version_key(animal_id))
+
+
+def get_instance_value(instance, path):
+    value = instance
+    for attr in path.split('.'):
+        if value is None:
+            return None
+        value = getattr(value, attr)
+    return value
+
+
+def capture_detail_animal(sender, instance, **kwargs):
+    """Remember the animal a row belonged to before a save, which may move it to another animal"""
+    lookup = ANIMAL_DETAIL_MODELS[sender._meta.label][0]
+    instance._stored_detail_animal = (
+        sender.objects.filter(pk=instance.pk).values_list(lookup, flat=True).first() if instance.pk else None
+    )
+
+
+def detail_row_changed(sender, instance, **kwargs):
+    animal_ids = {getattr(instance, '_stored_detail_animal', None)}
+    try:
+        animal_ids.add(get_instance_value(instance, ANIMAL_DETAIL_MODELS[sender._meta.label][1]))
+    except ObjectDoesNotExist:
+        pass
+    animal_ids.discard(None)
+    if animal_ids:
+        transaction.on_commit(lambda: bump_animal_versions(animal_ids))
+
+
+def lookup_changed(sender, instance, **kwargs):
+    transaction.on_commit(lambda: bump_version_token(lookups_version_key(instance.farm_id)))
+
+
+def connect_detail_cache_signals():
+    for model_label in ANIMAL_DETAIL_MODELS:
+        model = apps.get_model(model_label)
+        uid = f'animal_detail_cache_{model_label}'
+        if model is not Animal:
+            pre_save.connect(capture_detail_animal, sender=model, dispatch_uid=uid)
+        post_save.connect(detail_row_changed, sender=model, dispatch_uid=uid)
+        post_delete.connect(detail_row_changed, sender=model, dispatch_uid=uid)
+    for model_label in ANIMAL_LOOKUP_MODELS:
+        model = apps.get_model(model_label)
+        uid = f'animal_detail_cache_{model_label}'
+        post_save.connect(lookup_changed, sender=model, dispatch_uid=uid)
+        post_delete.connect(lookup_changed, sender=model, dispatch_uid=uid)
@@ -0,0 +1,243 @@
+"""Bulk import of a herd from a CSV or XLSX file.
+
+Every row is parsed and validated against lookups loaded once per import
+(types, breeds and the animal names already taken), so validation costs a
+fixed number of queries whatever the file size. Dams and sires are named
+and may be other rows of the file or animals already on the farm. Rows are
+ordered so that parents are always created before their offspring, and
+each generation is written with bulk_create.
+"""
+import os
+from collections import namedtuple
+import tablib
+from django.core.exceptions import ValidationError
+from django.db import transaction
+from .breeding import schedule_breeding_refresh
+from .census import schedule_census_refresh
+from .inbreeding import bump_pedigree_version
+from .models import Animal, AnimalType, AnimalBreed
+
+IMPORT_FORMATS = {'.csv': 'csv', '.xlsx': 'xlsx'}
+
+# Columns copied onto Animal after conversion by the model field
+VALUE_COLUMNS = [
+    'gender', 'weight', 'description', 'date_of_birth', 'date_of_death', 'date_of_purchase',
+    'date_of_sale', 'is_on_sale', 'price', 'purchase_price',
+]
+
+BOOLEAN_VALUES = {
+    'true': True, 'yes': True, 'y': True, '1': True,
+    'false': False, 'no': False, 'n': False, '0': False,
+}
+
+DEFAULT_BATCH_SIZE = 500
+
+ImportRow = namedtuple('ImportRow', ['number', 'animal', 'dam', 'sire'])
+
+
+class ImportResult:
+    def __init__(self):
+        self.created = []
+        self.errors = {}
+
+    def add_error(self, row, field, message):
+        self.errors.setdefault(row, {}).setdefault(field, []).append(message)
+
+    def error_list(self):
+        return [{'row': row, 'errors': errors} for row, errors in sorted(self.errors.items())]
+
+
+def load_dataset(file, filename):
+    """Read an uploaded or opened file into a tablib Dataset, picking the format from the file name"""
+    extension = os.path.splitext(filename)[1].lower()
+    if extension not in IMPORT_FORMATS:
+        raise ValueError(f'Unsupported file type, use one of: {", ".join(IMPORT_FORMATS)}')
+    content = file.read()
+    if IMPORT_FORMATS[extension] == 'csv' and isinstance(content, bytes):
+        content = content.decode('utf-8-sig')
+    try:
+        return tablib.Dataset().load(content, format=IMPORT_FORMATS[extension])
+    except Exception as e:
+        raise ValueError(f'Could not read the file: {e}')
+
+
+def normalize_header(header):
+    return str(header or '').strip().lower().replace(' ', '_')
+
+
+def clean_value(value):
+    if isinstance(value, str):
+        value = value.strip()
+    return None if value in ('', None) else value
+
+
+class AnimalImporter:
+    """Validate and import the rows of a dataset into a farm.
+
+    Row numbers in errors count the header as row 1, as spreadsheets show them.
+    """
+
+    def __init__(self, farm, user, batch_size=DEFAULT_BATCH_SIZE):
+        self.farm = farm
+        self.user = user
+        self.batch_size = batch_size
+        self.types = {t.name.lower(): t for t in AnimalType.objects.filter(farm=farm)}
+        self.breeds = {
+            (breed.type_id, breed.name.lower()): breed
+            for breed in AnimalBreed.objects.filter(farm=farm)
+        }
+
+    def run(self, dataset, dry_run=False, skip_errors=False):
+        """Import the dataset, returning an ImportResult.
+
+        Nothing is written when any row fails unless skip_errors is set, in
+        which case the valid rows, and offspring whose parents are valid,
+        are imported.
+        """
+        result = ImportResult()
+        headers = [normalize_header(header) for header in dataset.headers or []]
+        if 'name' not in headers:
+            result.add_error(1, 'name', 'The file must have a name column')
+            return result
+
+        rows = [
+            self.parse_row(number, dict(zip(headers, values)), result)
+            for number, values in enumerate(dataset, start=2)
+        ]
+        self.check_names(rows, result)
+        generations = self.resolve_parents(rows, result)
+
+        if dry_run or (result.errors and not skip_errors):
+            return result
+        with transaction.atomic():
+            self.create(generations, result)
+            if result.created:
+                # bulk_create sends no signals, so refresh what the animal signals maintain
+                bump_pedigree_version(self.farm.id)
+                schedule_census_refresh(self.farm.id, min(animal.date_of_birth for animal in result.created))
+                schedule_breeding_refresh(animal.dam_id for animal in result.created)
+        return result
+
+    def parse_row(self, number, data, result):
+        """Build the unsaved Animal of a row, recording any invalid value against the row"""
+        values = {}
+        for column in VALUE_COLUMNS:
+            value = clean_value(data.get(column))
+            if value is None:
+                continue
+            if column == 'is_on_sale':
+                value = BOOLEAN_VALUES.get(str(value).lower(), value)
+            if column == 'gender' and isinstance(value, str):
+                value = value.capitalize()
+            try:
+                values[column] = Animal._meta.get_field(column).to_python(value)
+            except ValidationError as e:
+                for message in e.messages:
+                    result.add_error(number, column, message)
+
+        name = clean_value(data.get('name'))
+        animal = Animal(
+            name=str(name) if name is not None else '', farm=self.farm, created_by=self.user, **values
+        )
+        animal_type = self.types.get(str(clean_value(data.get('type')) or '').lower())
+        if animal_type is None:
+            result.add_error(number, 'type', f'Unknown animal type "{data.get("type") or ""}"')
+        else:
+            animal.type = animal_type
+            breed_name = clean_value(data.get('breed'))
+            if breed_name is not None:
+                animal.breed = self.breeds.get((animal_type.id, str(breed_name).lower()))
+                if animal.breed is None:
+                    result.add_error(number, 'breed', f'Unknown {animal_type.name} breed "{breed_name}"')
+
+        # Field level checks such as required values, choices and lengths, without
+        # the per-row queries of foreign key and uniqueness validation
+        exclude = ['type', 'breed', 'dam', 'sire', 'ai_sire', 'farm', 'created_by', *result.errors.get(number, {})]
+        try:
+            animal.clean_fields(exclude=exclude)
+        except ValidationError as e:
+            for field, messages in e.message_dict.items():
+                for message in messages:
+                    result.add_error(number, field, message)
+
+        dam, sire = clean_value(data.get('dam')), clean_value(data.get('sire'))
+        return ImportRow(number, animal, str(dam) if dam else None, str(sire) if sire else None)
+
+    def check_names(self, rows, result):
+        """Reject names repeated in the file or already used, animal names being unique across farms"""
+        seen = {}
+        for row in rows:
+            if row.animal.name in seen:
+                result.add_error(row.number, 'name', f'Duplicate of row {seen[row.animal.name]}')
+            seen.setdefault(row.animal.name, row.number)
+        taken = set(Animal.objects.filter(name__in=list(seen)).values_list('name', flat=True))
+        for row in rows:
+            if row.animal.name in taken:
+                result.add_error(row.number, 'name', f'An animal named "{row.animal.name}" already exists')
+
+    def resolve_parents(self, rows, result):
+        """Order the valid rows into generations so every parent precedes its offspring.
+
+        Returns a list of generations, each a list of rows. Rows whose parent
+        is unknown, invalid or part of a cycle are reported and left out.
+        """
+        in_file = {}
+        for row in rows:
+            in_file.setdefault(row.animal.name, row)
+        parent_names = {name for row in in_file.values() for name in (row.dam, row.sire) if name}
+        existing = {
+            animal.name: animal
+            for animal in Animal.objects.filter(farm=self.farm, name__in=parent_names - set(in_file))
+        }
+
+        for row in list(in_file.values()):
+            for field, parent_name, gender in (('dam', row.dam, 'Female'), ('sire', row.sire, 'Male')):
+                if parent_name is None:
+                    continue
+                parent = in_file.get(parent_name) or existing.get(parent_name)
+                if parent is None:
+                    result.add_error(row.number, field, f'No animal named "{parent_name}" in the file or the farm')
+                    continue
+                parent_animal = parent.animal if isinstance(parent, ImportRow) else parent
+                if parent_animal.gender != gender:
+                    result.add_error(row.number, field, f'"{parent_name}" is not {gender.lower()}')
+                if isinstance(parent, Animal):
+                    setattr(row.animal, field, parent)
+
+        # Kahn's algorithm over the in-file parent links, one generation at a time
+        pending = {name: row for name, row in in_file.items() if row.number not in result.errors}
+        done = set(existing)
+        generations = []
+        while pending:
+            ready = [
+                row for row in pending.values()
+                if all(parent is None or parent in done for parent in (row.dam, row.sire))
+            ]
+            if not ready:
+                break
+            generations.append(ready)
+            for row in ready:
+                done.add(row.animal.name)
+                del pending[row.animal.name]
+
+        invalid = set(result.errors)
+        for row in pending.values():
+            failed = [parent for parent in (row.dam, row.sire) if parent in in_file and parent not in done]
+            if any(in_file[parent].number in invalid for parent in failed):
+                message = f'Parent "{failed[0]}" could not be imported'
+            else:
+                message = 'The row is part of a dam/sire cycle'
+            result.add_error(row.number, 'dam' if row.dam in failed else 'sire', message)
+        return generations
+
+    def create(self, generations, result):
+        created = {}
+        for generation in generations:
+            for row in generation:
+                for field, parent_name in (('dam', row.dam), ('sire', row.sire)):
+                    if parent_name in created:
+                        setattr(row.animal, field, created[parent_name])
+            animals = Animal.objects.bulk_create([row.animal for row in generation], batch_size=self.batch_size)
+            for animal in animals:
+                created[animal.name] = animal
+            result.created.extend(animals)
@@ -0,0 +1,221 @@
+"""Numerator relationship matrix and inbreeding coefficients of a farm's herd.
+
+The matrix A holds the additive genetic relationship between every pair of
+animals, A[i, i] = 1 + F_i where F_i is the inbreeding coefficient. It is
+built with the tabular method, processed one generation at a time so every
+generation is a handful of vectorized NumPy operations:
+
+    A[i, j] = (A[sire_i, j] + A[dam_i, j]) / 2     for j older than i
+    A[i, i] = 1 + A[sire_i, dam_i] / 2
+
+Semen codes of successful AI services linked through Animal.ai_sire are
+treated as founder sires, so offspring of the same straw are half sibs.
+
+The matrix is cached in process memory per farm together with the farm's
+pedigree version token. The token lives in the shared cache and is replaced
+whenever a dam, sire or AI sire link changes, so every worker rebuilds its
+copy only after a pedigree change. A dense matrix takes 4 n^2 bytes, so the
+cache is bounded by the bytes it holds rather than by a count of farms.
+"""
+from collections import OrderedDict
+import threading
+import numpy as np
+from django.db import transaction
+from django.db.models.signals import pre_save, post_save, post_delete
+from farms.cache import get_version_token, bump_version_token
+from .models import Animal, ArtificialInsemination
+
+# Bytes of farm matrices kept in memory by each worker, about one 5,600 head herd
+MATRIX_CACHE_BYTES = 128 * 1024 * 1024
+
+_matrices = OrderedDict()
+_matrices_lock = threading.Lock()
+
+
+class PedigreeCycleError(ValueError):
+    pass
+
+
+def semen_code_key(semen_code):
+    return f'ai:{semen_code}'
+
+
+class RelationshipMatrix:
+    """Numerator relationship matrix of a herd.
+
+    Members are animal ids or semen_code_key(code) strings for AI sires.
+    """
+
+    def __init__(self, members, matrix):
+        self.members = members
+        self.index = {member: position for position, member in enumerate(members)}
+        self.matrix = matrix
+
+    def __contains__(self, member):
+        return member in self.index
+
+    def inbreeding(self, member):
+        """Inbreeding coefficient F of a member, 0 if it is unknown"""
+        if member not in self.index:
+            return 0.0
+        position = self.index[member]
+        return float(self.matrix[position, position]) - 1
+
+    def inbreeding_coefficients(self):
+        """{member: F} for every member, read off the diagonal"""
+        diagonal = np.diagonal(self.matrix) - 1
+        return dict(zip(self.members, diagonal.tolist()))
+
+    def relationship(self, first, second):
+        """Additive relationship between two members, 0 if either is unknown"""
+        if first not in self.index or second not in self.index:
+            return 0.0
+        return float(self.matrix[self.index[first], self.index[second]])
+
+    def mating_inbreeding(self, dam, sire):
+        """Inbreeding coefficient of the offspring of a proposed mating"""
+        return self.relationship(dam, sire) / 2
+
+
+def get_generations(dams, sires, unknown):
+    """Generation number of every member: 0 for founders, otherwise one more than the older parent"""
+    count = len(dams)
+    generations = np.zeros(count + 1, dtype=np.int64)
+    generations[unknown] = -1
+    for _ in range(count + 1):
+        updated = np.maximum(generations[dams], generations[sires]) + 1
+        if np.array_equal(updated, generations[:count]):
+            return generations[:count]
+        generations[:count] = updated
+    raise PedigreeCycleError('The pedigree contains an animal that is its own ancestor')
+
+
+def compute_relationship_matrix(dams, sires):
+    """Build A from parent positions (-1 for unknown) using generation-ordered blocks.
+
+    Position `count` is a padding row/column of zeros standing in for unknown
+    parents, which keeps every block update branch free.
+    """
+    count = len(dams)
+    unknown = count
+    dams = np.where(dams < 0, unknown, dams)
+    sires = np.where(sires < 0, unknown, sires)
+    generations = get_generations(dams, sires, unknown)
+
+    # float32 halves memory for large herds and is ample for relationship coefficients
+    matrix = np.zeros((count + 1, count + 1), dtype=np.float32)
+    processed = np.empty(0, dtype=np.int64)
+    for generation in range(int(generations.max()) + 1 if count else 0):
+        block = np.flatnonzero(generations == generation)
+        block_sires, block_dams = sires[block], dams[block]
+
+        # Relationships with all older animals
+        older = 0.5 * (matrix[np.ix_(block_sires, processed)] + matrix[np.ix_(block_dams, processed)])
+        matrix[np.ix_(block, processed)] = older
+        matrix[np.ix_(processed, block)] = older.T
+
+        # Relationships within the generation, whose parents are all older
+        within = 0.5 * (matrix[np.ix_(block, block_sires)] + matrix[np.ix_(block, block_dams)])
+        within = 0.5 * (within + within.T)
+        np.fill_diagonal(within, 1 + 0.5 * matrix[block_sires, block_dams])
+        matrix[np.ix_(block, block)] = within
+
+        processed = np.concatenate([processed, block])
+    return matrix[:count, :count]
+
+
+def build_relationship_matrix(farm_id):
+    """Load the pedigree links of a farm's herd in one query and build its relationship matrix"""
+    rows = list(Animal.objects.filter(farm_id=farm_id).values_list(
+        'id', 'dam_id', 'sire_id', 'ai_sire__semen_code'
+    ))
+    members = [animal_id for animal_id, dam_id, sire_id, semen_code in rows]
+    members += sorted({semen_code_key(semen_code) for *link, semen_code in rows if semen_code})
+    index = {member: position for position, member in enumerate(members)}
+
+    dams = np.full(len(members), -1, dtype=np.int64)
+    sires = np.full(len(members), -1, dtype=np.int64)
+    for position, (animal_id, dam_id, sire_id, semen_code) in enumerate(rows):
+        dams[position] = index.get(dam_id, -1)
+        # An AI sire takes precedence over a natural sire, as in the animal serializers
+        sire = semen_code_key(semen_code) if semen_code else sire_id
+        sires[position] = index.get(sire, -1)
+
+    return RelationshipMatrix(members, compute_relationship_matrix(dams, sires))
+
+
+def pedigree_version_key(farm_id):
+    return f'farm:{farm_id}:pedigree_version'
+
+
+def get_relationship_matrix(farm_id, members=()):
+    """Return the farm's relationship matrix, rebuilding it only after a pedigree change.
+
+    The version token is replaced once a pedigree write commits, so an animal
+    committed just before may be missing from a matrix that is still current;
+    the matrix is rebuilt when any of members is missing from it.
+    """
+    version = get_version_token(pedigree_version_key(farm_id))
+    with _matrices_lock:
+        cached = _matrices.get(farm_id)
+        if cached and cached[0] == version and all(member in cached[1] for member in members):
+            _matrices.move_to_end(farm_id)
+            return cached[1]
+
+    matrix = build_relationship_matrix(farm_id)
+    with _matrices_lock:
+        _matrices[farm_id] = (version, matrix)
+        _matrices.move_to_end(farm_id)
+        # Least recently used first; a matrix larger than the whole budget is not kept
+        while _matrices and sum(stored.matrix.nbytes for token, stored in _matrices.values()) > MATRIX_CACHE_BYTES:
+            _matrices.popitem(last=False)
+    return matrix
+
+
+def bump_pedigree_version(farm_id):
+    transaction.on_commit(lambda: bump_version_token(pedigree_version_key(farm_id)))
+
+
+PEDIGREE_FIELDS = ('farm_id', 'dam_id', 'sire_id', 'ai_sire_id')
+
+
+def capture_pedigree_links(sender, instance, **kwargs):
+    """Remember the stored pedigree links (or semen code) before a save"""
+    fields = PEDIGREE_FIELDS if sender is Animal else ('farm_id', 'semen_code')
+    instance._stored_pedigree = (
+        sender.objects.filter(pk=instance.pk).values_list(*fields).first() if instance.pk else None
+    )
+
+
+def animal_saved(sender, instance, created, **kwargs):
+    links = tuple(getattr(instance, field) for field in PEDIGREE_FIELDS)
+    stored = getattr(instance, '_stored_pedigree', None)
+    if created or stored != links:
+        bump_pedigree_version(instance.farm_id)
+        if stored and stored[0] != instance.farm_id:
+            bump_pedigree_version(stored[0])
+
+
+def animal_deleted(sender, instance, **kwargs):
+    bump_pedigree_version(instance.farm_id)
+
+
+def ai_record_saved(sender, instance, created, **kwargs):
+    # New records only matter once linked through Animal.ai_sire, which is an Animal save
+    stored = getattr(instance, '_stored_pedigree', None)
+    if not created and stored != (instance.farm_id, instance.semen_code):
+        bump_pedigree_version(instance.farm_id)
+
+
+def ai_record_deleted(sender, instance, **kwargs):
+    # Deleting clears Animal.ai_sire through SET_NULL, which sends no Animal signals
+    bump_pedigree_version(instance.farm_id)
+
+
+def connect_inbreeding_signals():
+    pre_save.connect(capture_pedigree_links, sender=Animal, dispatch_uid='pedigree_links_animal')
+    post_save.connect(animal_saved, sender=Animal, dispatch_uid='pedigree_links_animal')
+    post_delete.connect(animal_deleted, sender=Animal, dispatch_uid='pedigree_links_animal')
+    pre_save.connect(capture_pedigree_links, sender=ArtificialInsemination, dispatch_uid='pedigree_links_ai')
+    post_save.connect(ai_record_saved, sender=ArtificialInsemination, dispatch_uid='pedigree_links_ai')
+    post_delete.connect(ai_record_deleted, sender=ArtificialInsemination, dispatch_uid='pedigree_links_ai')
@@ -0,0 +1,87 @@
+"""Query parameter handling of the herd list: filters, sorting and keyset pages."""
+from datetime import date
+from django.db.models import Q
+
+# Sort keys accepted by get_animals, each backed by a (farm, field, id) index
+SORT_FIELDS = ('name', 'date_of_birth', 'created_at', 'updated_at')
+
+# Age in months only grows as the date of birth gets earlier
+SORT_ALIASES = {'age': '-date_of_birth', '-age': 'date_of_birth'}
+
+BOOLEAN_VALUES = {'true': True, '1': True, 'false': False, '0': False}
+
+
+def parse_boolean(params, name):
+    value = params[name].lower()
+    if value not in BOOLEAN_VALUES:
+        raise ValueError(f'{name} must be true or false')
+    return BOOLEAN_VALUES[value]
+
+
+def parse_integer(params, name):
+    try:
+        return int(params[name])
+    except ValueError:
+        raise ValueError(f'{name} must be a number')
+
+
+def parse_date(params, name):
+    try:
+        return date.fromisoformat(params[name])
+    except ValueError:
+        raise ValueError(f'{name} must be a date in YYYY-MM-DD format')
+
+
+def filter_animals(animals, params, today=None):
+    """Apply the herd list filters in params to a queryset, raising ValueError on invalid values"""
+    today = today or date.today()
+
+    # Filters on names kept from the original endpoint
+    if "breed" in params:
+        animals = animals.filter(breed__name=params["breed"])
+    if "name" in params:
+        animals = animals.filter(name__icontains=params["name"])
+    if "type" in params:
+        animals = animals.filter(type__name=params["type"])
+
+    if "gender" in params:
+        if params["gender"] not in ('Male', 'Female'):
+            raise ValueError('gender must be Male or Female')
+        animals = animals.filter(gender=params["gender"])
+    if "breed_id" in params:
+        animals = animals.filter(breed_id=parse_integer(params, "breed_id"))
+    if "type_id" in params:
+        animals = animals.filter(type_id=parse_integer(params, "type_id"))
+    if "alive" in params:
+        animals = animals.filter(date_of_death__isnull=parse_boolean(params, "alive"))
+    if "is_on_sale" in params:
+        animals = animals.filter(is_on_sale=parse_boolean(params, "is_on_sale"))
+    if "to_be_archived" in params:
+        animals = animals.filter(to_be_archived=parse_boolean(params, "to_be_archived"))
+    if "has_dam" in params:
+        animals = animals.filter(dam__isnull=not parse_boolean(params, "has_dam"))
+    if "has_sire" in params:
+        has_sire = Q(sire__isnull=False) | Q(ai_sire__isnull=False)
+        animals = animals.filter(has_sire if parse_boolean(params, "has_sire") else ~has_sire)
+
+    if "born_after" in params:
+        animals = animals.filter(date_of_birth__gte=parse_date(params, "born_after"))
+    if "born_before" in params:
+        animals = animals.filter(date_of_birth__lte=parse_date(params, "born_before"))
+    if "min_age" in params or "max_age" in params:
+        animals = animals.age_between(
+            parse_integer(params, "min_age") if "min_age" in params else None,
+            parse_integer(params, "max_age") if "max_age" in params else None,
+            today
+        )
+    return animals
+
+
+def get_ordering(params):
+    """Keyset ordering for the `ordering` parameter, e.g. "-date_of_birth", with id as tie breaker"""
+    value = params.get("ordering", "name")
+    value = SORT_ALIASES.get(value, value)
+    direction = '-' if value.startswith('-') else ''
+    if value[len(direction):] not in SORT_FIELDS:
+        raise ValueError(f'ordering must be one of {", ".join(SORT_FIELDS + ("age",))}, optionally prefixed with -')
+    return [value, f'{direction}id']
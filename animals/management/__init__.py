@@ -0,0 +1 @@
+# Django management commands package 
\ No newline at end of file
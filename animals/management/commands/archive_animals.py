@@ -0,0 +1,57 @@
+from django.core.management.base import BaseCommand, CommandError
+from farms.models import Farm
+from animals.archive import archive_animals, plan_archive, DEFAULT_BATCH_SIZE
+
+
+class Command(BaseCommand):
+    help = 'Move the animals flagged to_be_archived and their records into the archive tables'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--farm-id',
+            type=int,
+            help='Specific farm ID to archive animals of',
+        )
+        parser.add_argument(
+            '--all-farms',
+            action='store_true',
+            help='Archive animals of all farms',
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=DEFAULT_BATCH_SIZE,
+            help=f'Animals archived per transaction (default {DEFAULT_BATCH_SIZE})',
+        )
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help='Report what would be archived without changing anything',
+        )
+
+    def handle(self, *args, **options):
+        if options['farm_id']:
+            if not Farm.objects.filter(id=options['farm_id']).exists():
+                raise CommandError(f'Farm with ID {options["farm_id"]} does not exist')
+            farm_ids = [options['farm_id']]
+        elif options['all_farms']:
+            farm_ids = None
+        else:
+            self.stdout.write(
+                self.style.WARNING('Please specify --farm-id or --all-farms')
+            )
+            return
+        if options['batch_size'] < 1:
+            raise CommandError('--batch-size must be at least 1')
+
+        if options['dry_run']:
+            archived, kept = plan_archive(farm_ids)
+            self.stdout.write(f'Would archive {len(archived)} animals')
+        else:
+            count = archive_animals(farm_ids, options['batch_size'])
+            kept = plan_archive(farm_ids)[1]
+            self.stdout.write(self.style.SUCCESS(f'Successfully archived {count} animals'))
+        if kept:
+            self.stdout.write(self.style.WARNING(
+                f'{len(kept)} flagged animals are kept while animals that are not flagged descend from them'
+            ))
@@ -0,0 +1,35 @@
+from django.core.management.base import BaseCommand, CommandError
+from farms.models import Farm
+from animals.breeding import build_breeding_calendar
+
+
+class Command(BaseCommand):
+    help = 'Recompute the breeding calendar events from the AI records'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--farm-id',
+            type=int,
+            help='Specific farm ID to build the calendar for',
+        )
+        parser.add_argument(
+            '--all-farms',
+            action='store_true',
+            help='Build the calendar for all farms',
+        )
+
+    def handle(self, *args, **options):
+        if options['farm_id']:
+            if not Farm.objects.filter(id=options['farm_id']).exists():
+                raise CommandError(f'Farm with ID {options["farm_id"]} does not exist')
+            farm_ids = [options['farm_id']]
+        elif options['all_farms']:
+            farm_ids = None
+        else:
+            self.stdout.write(
+                self.style.WARNING('Please specify --farm-id or --all-farms')
+            )
+            return
+
+        count = build_breeding_calendar(farm_ids)
+        self.stdout.write(self.style.SUCCESS(f'Successfully built {count} breeding calendar events'))
@@ -0,0 +1,70 @@
+from datetime import datetime
+from django.core.management.base import BaseCommand, CommandError
+from django.db.models import Min
+from django.utils import timezone
+from farms.models import Farm
+from animals.models import Animal
+from animals.census import build_census, refresh_census
+
+
+def parse_date(value):
+    try:
+        return datetime.strptime(value, '%Y-%m-%d').date()
+    except ValueError:
+        raise CommandError(f'Invalid date "{value}", use YYYY-MM-DD')
+
+
+class Command(BaseCommand):
+    help = 'Build the daily herd census snapshots, run daily to record today\'s snapshot'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--farm-id',
+            type=int,
+            help='Specific farm ID to build snapshots for',
+        )
+        parser.add_argument(
+            '--all-farms',
+            action='store_true',
+            help='Build snapshots for all farms',
+        )
+        parser.add_argument(
+            '--start',
+            help='First day to rebuild (YYYY-MM-DD), "history" for the earliest animal date of each farm',
+        )
+        parser.add_argument(
+            '--end',
+            help='Last day to rebuild (YYYY-MM-DD), defaults to today',
+        )
+
+    def handle(self, *args, **options):
+        if options['farm_id']:
+            farms = Farm.objects.filter(id=options['farm_id'])
+            if not farms.exists():
+                raise CommandError(f'Farm with ID {options["farm_id"]} does not exist')
+        elif options['all_farms']:
+            farms = Farm.objects.all()
+        else:
+            self.stdout.write(
+                self.style.WARNING('Please specify --farm-id or --all-farms')
+            )
+            return
+
+        today = timezone.now().date()
+        end_date = parse_date(options['end']) if options['end'] else today
+        row_count = 0
+        for farm in farms:
+            if options['start'] == 'history':
+                start_date = Animal.objects.filter(farm=farm).aggregate(first=Min('date_of_birth'))['first']
+            elif options['start']:
+                start_date = parse_date(options['start'])
+            else:
+                # Without a range only the days since the latest snapshot are filled in
+                row_count += refresh_census(farm.id)
+                continue
+            if start_date is not None and start_date <= end_date:
+                row_count += build_census(farm.id, start_date, end_date)
+
+        self.stdout.write(
+            self.style.SUCCESS(f'Successfully built {row_count} herd census snapshots for {farms.count()} farms')
+        )
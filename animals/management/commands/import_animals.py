@@ -0,0 +1,73 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.contrib.auth.models import User
+from farms.models import Farm
+from animals.importer import AnimalImporter, load_dataset, DEFAULT_BATCH_SIZE
+
+
+class Command(BaseCommand):
+    help = 'Import the animals of a farm from a CSV or XLSX file'
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help='CSV or XLSX file with one animal per row')
+        parser.add_argument(
+            '--farm-id',
+            type=int,
+            required=True,
+            help='Farm to import the animals into',
+        )
+        parser.add_argument(
+            '--user-id',
+            type=int,
+            help='User recorded as creator of the animals, defaults to the farm owner',
+        )
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help='Only validate the file and report errors',
+        )
+        parser.add_argument(
+            '--skip-errors',
+            action='store_true',
+            help='Import the valid rows even when some rows fail',
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=DEFAULT_BATCH_SIZE,
+            help='Number of animals inserted per query',
+        )
+
+    def handle(self, *args, **options):
+        try:
+            farm = Farm.objects.get(id=options['farm_id'])
+        except Farm.DoesNotExist:
+            raise CommandError(f'Farm with ID {options["farm_id"]} does not exist')
+        user = farm.created_by
+        if options['user_id']:
+            user = User.objects.filter(id=options['user_id']).first()
+            if user is None:
+                raise CommandError(f'User with ID {options["user_id"]} does not exist')
+
+        try:
+            with open(options['path'], 'rb') as file:
+                dataset = load_dataset(file, options['path'])
+        except (OSError, ValueError) as e:
+            raise CommandError(str(e))
+
+        importer = AnimalImporter(farm, user, batch_size=options['batch_size'])
+        result = importer.run(dataset, dry_run=options['dry_run'], skip_errors=options['skip_errors'])
+        for error in result.error_list():
+            for field, messages in error['errors'].items():
+                self.stdout.write(f'Row {error["row"]} {field}: {" ".join(messages)}')
+
+        if options['dry_run']:
+            style = self.style.ERROR if result.errors else self.style.SUCCESS
+            self.stdout.write(style(f'Validated {len(dataset)} rows, {len(result.errors)} with errors'))
+        elif result.created or not result.errors:
+            self.stdout.write(
+                self.style.SUCCESS(f'Imported {len(result.created)} animals into farm: {farm.name}')
+            )
+        else:
+            self.stdout.write(
+                self.style.ERROR(f'Nothing imported, {len(result.errors)} rows have errors (use --skip-errors to import the rest)')
+            )
@@ -0,0 +1,29 @@
+# Generated by Django 4.2.13 on 2026-10-18 11:56
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('animals', '0007_alter_animal_date_of_death'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='animal',
+            index=models.Index(fields=['farm', 'name', 'id'], name='animal_farm_name_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='animal',
+            index=models.Index(fields=['farm', 'date_of_birth', 'id'], name='animal_farm_dob_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='animal',
+            index=models.Index(fields=['farm', 'created_at', 'id'], name='animal_farm_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='animal',
+            index=models.Index(fields=['farm', 'updated_at', 'id'], name='animal_farm_updated_idx'),
+        ),
+    ]
@@ -0,0 +1,39 @@
+# Generated by Django 4.2.13 on 2026-10-18 12:03
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('farms', '0015_search_trigram_indexes'),
+        ('animals', '0008_animal_list_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='HerdCensus',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField()),
+                ('alive', models.PositiveIntegerField(default=0)),
+                ('dead', models.PositiveIntegerField(default=0)),
+                ('sold', models.PositiveIntegerField(default=0)),
+                ('males', models.PositiveIntegerField(default=0)),
+                ('females', models.PositiveIntegerField(default=0)),
+                ('on_sale', models.PositiveIntegerField(blank=True, null=True)),
+                ('to_be_archived', models.PositiveIntegerField(blank=True, null=True)),
+                ('herd_value', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('purchase_value', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('by_type', models.JSONField(blank=True, default=dict)),
+                ('by_breed', models.JSONField(blank=True, default=dict)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('farm', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='herd_census', to='farms.farm')),
+            ],
+            options={
+                'ordering': ['-date'],
+                'unique_together': {('farm', 'date')},
+            },
+        ),
+    ]
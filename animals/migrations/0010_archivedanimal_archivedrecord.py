@@ -0,0 +1,60 @@
+# Generated by Django 4.2.13 on 2026-10-18 12:07
+
+import django.core.serializers.json
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('farms', '0015_search_trigram_indexes'),
+        ('animals', '0009_herdcensus'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ArchivedAnimal',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('original_id', models.BigIntegerField(unique=True)),
+                ('name', models.CharField(max_length=255)),
+                ('type_name', models.CharField(max_length=255)),
+                ('breed_name', models.CharField(blank=True, max_length=255, null=True)),
+                ('gender', models.CharField(choices=[('Male', 'Male'), ('Female', 'Female')], max_length=255)),
+                ('date_of_birth', models.DateField()),
+                ('date_of_death', models.DateField(blank=True, null=True)),
+                ('date_of_purchase', models.DateField(blank=True, null=True)),
+                ('date_of_sale', models.DateField(blank=True, null=True)),
+                ('price', models.IntegerField(blank=True, null=True)),
+                ('purchase_price', models.IntegerField(blank=True, null=True)),
+                ('data', models.JSONField(encoder=django.core.serializers.json.DjangoJSONEncoder)),
+                ('archived_at', models.DateTimeField(auto_now_add=True)),
+                ('farm', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='archived_animals', to='farms.farm')),
+            ],
+            options={
+                'ordering': ['-archived_at', '-id'],
+            },
+        ),
+        migrations.CreateModel(
+            name='ArchivedRecord',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('kind', models.CharField(choices=[('production_record', 'Production Record'), ('health_record', 'Health Record'), ('treatment', 'Treatment'), ('ai_record', 'Artificial Insemination'), ('image', 'Image')], max_length=30)),
+                ('original_id', models.BigIntegerField()),
+                ('date', models.DateField(blank=True, null=True)),
+                ('amount', models.DecimalField(blank=True, decimal_places=2, max_digits=10, null=True)),
+                ('data', models.JSONField(encoder=django.core.serializers.json.DjangoJSONEncoder)),
+                ('archived_animal', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='records', to='animals.archivedanimal')),
+            ],
+            options={
+                'ordering': ['kind', '-date', '-original_id'],
+                'indexes': [models.Index(fields=['archived_animal', 'kind', 'date'], name='archived_record_animal_idx'), models.Index(fields=['kind', 'date'], name='archived_record_kind_idx')],
+                'unique_together': {('kind', 'original_id')},
+            },
+        ),
+        migrations.AddIndex(
+            model_name='archivedanimal',
+            index=models.Index(fields=['farm', 'archived_at', 'id'], name='archived_animal_farm_idx'),
+        ),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 4.2.13 on 2026-10-18 12:09
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('animals', '0010_archivedanimal_archivedrecord'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='artificialinsemination',
+            index=models.Index(fields=['animal', 'insemination_date', 'id'], name='ai_animal_date_idx'),
+        ),
+    ]
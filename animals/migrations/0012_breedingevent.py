@@ -0,0 +1,31 @@
+# Generated by Django 4.2.13 on 2026-10-18 12:11
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('farms', '0015_search_trigram_indexes'),
+        ('animals', '0011_timeline_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='BreedingEvent',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('kind', models.CharField(choices=[('repeat_heat', 'Repeat Heat'), ('pregnancy_check', 'Pregnancy Check'), ('dry_off', 'Dry Off'), ('expected_calving', 'Expected Calving')], max_length=30)),
+                ('date', models.DateField()),
+                ('end_date', models.DateField()),
+                ('ai_record', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='breeding_events', to='animals.artificialinsemination')),
+                ('animal', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='breeding_events', to='animals.animal')),
+                ('farm', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='breeding_events', to='farms.farm')),
+            ],
+            options={
+                'ordering': ['date', 'kind', 'id'],
+                'indexes': [models.Index(fields=['farm', 'date'], name='breeding_event_farm_date_idx'), models.Index(fields=['farm', 'kind', 'date'], name='breeding_event_farm_kind_idx')],
+            },
+        ),
+    ]
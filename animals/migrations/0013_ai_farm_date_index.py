@@ -0,0 +1,17 @@
+# Generated by Django 4.2.13 on 2026-10-18 12:12
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('animals', '0012_breedingevent'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='artificialinsemination',
+            index=models.Index(fields=['farm', 'insemination_date'], name='ai_farm_date_idx'),
+        ),
+    ]
@@ -0,0 +1,46 @@
+from django.db import migrations
+
+# Columns of animals searched by farms.search, as (model, field)
+TRIGRAM_COLUMNS = [
+    ('animals.Animal', 'name'),
+    ('animals.Animal', 'description'),
+]
+
+
+def trigram_indexes(apps, schema_editor):
+    quote = schema_editor.quote_name
+    for model_label, field_name in TRIGRAM_COLUMNS:
+        model = apps.get_model(model_label)
+        table = model._meta.db_table
+        column = model._meta.get_field(field_name).column
+        yield quote(f'{table}_{column}_trgm'), quote(table), quote(column)
+
+
+def create_trigram_indexes(apps, schema_editor):
+    # GIN trigram indexes are PostgreSQL only, other databases search in Python.
+    # They index UPPER(column), the expression of both the word similarity and icontains lookups.
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    schema_editor.execute('CREATE EXTENSION IF NOT EXISTS pg_trgm')
+    for index, table, column in trigram_indexes(apps, schema_editor):
+        schema_editor.execute(
+            f'CREATE INDEX IF NOT EXISTS {index} ON {table} USING gin ((UPPER({column}::text)) gin_trgm_ops)'
+        )
+
+
+def drop_trigram_indexes(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    for index, table, column in trigram_indexes(apps, schema_editor):
+        schema_editor.execute(f'DROP INDEX IF EXISTS {index}')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('animals', '0013_ai_farm_date_index'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_trigram_indexes, drop_trigram_indexes),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 4.2.13 on 2026-10-18 12:50
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('animals', '0014_search_trigram_indexes'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='archivedrecord',
+            name='kind',
+            field=models.CharField(choices=[('production_record', 'Production Record'), ('health_record', 'Health Record'), ('treatment', 'Treatment'), ('ai_record', 'Artificial Insemination'), ('image', 'Image'), ('production_alert', 'Production Alert'), ('lactation', 'Lactation')], max_length=30),
+        ),
+    ]
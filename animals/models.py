@@ -1,4 +1,7 @@
+from django.core.serializers.json import DjangoJSONEncoder
 from django.db import models
+from django.db.models import Case, ExpressionWrapper, Value, When
+from django.db.models.functions import ExtractMonth, ExtractYear
 from django.contrib.auth.models import User
 from farms.models import Farm
 from datetime import date
@@ -55,6 +58,44 @@ class ArtificialInsemination(models.Model):
     def __str__(self):
         return f"{self.animal.name} - {self.semen_code} - {self.insemination_date}"
 
+    class Meta:
+        indexes = [
+            models.Index(fields=['animal', 'insemination_date', 'id'], name='ai_animal_date_idx'),
+            models.Index(fields=['farm', 'insemination_date'], name='ai_farm_date_idx'),
+        ]
+
+def age_cutoff(today, months):
+    """Latest date of birth of an animal that is at least `months` old today, by the rule of Animal.age"""
+    month_index = today.year * 12 + today.month - 1 - months
+    return date(month_index // 12, month_index % 12 + 1, 14)
+
+
+class AnimalQuerySet(models.QuerySet):
+    def with_age(self, today=None):
+        """Annotate age_in_months, computed in SQL with the rounding of Animal.age"""
+        today = today or date.today()
+        birth_month = ExtractYear('date_of_birth') * 12 + ExtractMonth('date_of_birth')
+        born_late_in_month = Case(When(date_of_birth__day__gte=15, then=Value(1)), default=Value(0))
+        return self.annotate(age_in_months=ExpressionWrapper(
+            Value(today.year * 12 + today.month) - birth_month - born_late_in_month,
+            output_field=models.IntegerField()
+        ))
+
+    def age_between(self, min_age=None, max_age=None, today=None):
+        """Filter on age in months, both ends inclusive.
+
+        Age only decreases as the date of birth gets later, so the range is
+        applied as date_of_birth bounds that the date of birth index serves.
+        """
+        today = today or date.today()
+        queryset = self
+        if min_age is not None:
+            queryset = queryset.filter(date_of_birth__lte=age_cutoff(today, min_age))
+        if max_age is not None:
+            queryset = queryset.filter(date_of_birth__gt=age_cutoff(today, max_age + 1))
+        return queryset
+
+
 class Animal(models.Model):
     name = models.CharField(max_length=255, unique=True)
     type = models.ForeignKey(AnimalType, on_delete=models.CASCADE)
@@ -79,6 +120,17 @@ class Animal(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    objects = AnimalQuerySet.as_manager()
+
+    class Meta:
+        # Herd list sort keys, each ending in id for keyset pagination
+        indexes = [
+            models.Index(fields=['farm', 'name', 'id'], name='animal_farm_name_idx'),
+            models.Index(fields=['farm', 'date_of_birth', 'id'], name='animal_farm_dob_idx'),
+            models.Index(fields=['farm', 'created_at', 'id'], name='animal_farm_created_idx'),
+            models.Index(fields=['farm', 'updated_at', 'id'], name='animal_farm_updated_idx'),
+        ]
+
     @property
     def age(self):
         today = date.today()
@@ -105,4 +157,116 @@ class AnimalImage(models.Model):
     updated_at = models.DateTimeField(auto_now=True)
 
     def __str__(self):
-        return self.image_url
\ No newline at end of file
+        return self.image_url
+
+class HerdCensus(models.Model):
+    """Daily snapshot of a farm's herd, kept current by animals.census"""
+    farm = models.ForeignKey(Farm, on_delete=models.CASCADE, related_name='herd_census')
+    date = models.DateField()
+    alive = models.PositiveIntegerField(default=0)
+    dead = models.PositiveIntegerField(default=0)
+    sold = models.PositiveIntegerField(default=0)
+    males = models.PositiveIntegerField(default=0)
+    females = models.PositiveIntegerField(default=0)
+    # Current flags, only known for days snapshotted while they were current
+    on_sale = models.PositiveIntegerField(null=True, blank=True)
+    to_be_archived = models.PositiveIntegerField(null=True, blank=True)
+    herd_value = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    purchase_value = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    by_type = models.JSONField(default=dict, blank=True)
+    by_breed = models.JSONField(default=dict, blank=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"{self.farm.name} - {self.date}: {self.alive} alive"
+
+    class Meta:
+        ordering = ['-date']
+        unique_together = ['farm', 'date']
+
+
+class ArchivedAnimal(models.Model):
+    """An animal moved out of the live tables by animals.archive, with its values as they were"""
+    original_id = models.BigIntegerField(unique=True)
+    farm = models.ForeignKey(Farm, on_delete=models.CASCADE, related_name='archived_animals')
+    name = models.CharField(max_length=255)
+    type_name = models.CharField(max_length=255)
+    breed_name = models.CharField(max_length=255, null=True, blank=True)
+    gender = models.CharField(max_length=255, choices=GENDER)
+    date_of_birth = models.DateField()
+    date_of_death = models.DateField(null=True, blank=True)
+    date_of_purchase = models.DateField(null=True, blank=True)
+    date_of_sale = models.DateField(null=True, blank=True)
+    price = models.IntegerField(null=True, blank=True)
+    purchase_price = models.IntegerField(null=True, blank=True)
+    data = models.JSONField(encoder=DjangoJSONEncoder)
+    archived_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return f"{self.original_id} - {self.name} (archived)"
+
+    class Meta:
+        ordering = ['-archived_at', '-id']
+        indexes = [
+            models.Index(fields=['farm', 'archived_at', 'id'], name='archived_animal_farm_idx'),
+        ]
+
+
+class ArchivedRecord(models.Model):
+    """A production, health, treatment, AI, image, production alert or lactation row of an archived animal"""
+    KINDS = [
+        ('production_record', 'Production Record'),
+        ('health_record', 'Health Record'),
+        ('treatment', 'Treatment'),
+        ('ai_record', 'Artificial Insemination'),
+        ('image', 'Image'),
+        ('production_alert', 'Production Alert'),
+        ('lactation', 'Lactation'),
+    ]
+
+    archived_animal = models.ForeignKey(ArchivedAnimal, on_delete=models.CASCADE, related_name='records')
+    kind = models.CharField(max_length=30, choices=KINDS)
+    original_id = models.BigIntegerField()
+    date = models.DateField(null=True, blank=True)
+    # Quantity of production records and alerts, cost of treatments and AI services, total yield of lactations
+    amount = models.DecimalField(max_digits=10, decimal_places=2, null=True, blank=True)
+    data = models.JSONField(encoder=DjangoJSONEncoder)
+
+    def __str__(self):
+        return f"{self.archived_animal.name} - {self.kind} {self.original_id}"
+
+    class Meta:
+        ordering = ['kind', '-date', '-original_id']
+        unique_together = ['kind', 'original_id']
+        indexes = [
+            models.Index(fields=['archived_animal', 'kind', 'date'], name='archived_record_animal_idx'),
+            models.Index(fields=['kind', 'date'], name='archived_record_kind_idx'),
+        ]
+
+
+class BreedingEvent(models.Model):
+    """Projected breeding date of an animal, kept current by animals.breeding"""
+    KINDS = [
+        ('repeat_heat', 'Repeat Heat'),
+        ('pregnancy_check', 'Pregnancy Check'),
+        ('dry_off', 'Dry Off'),
+        ('expected_calving', 'Expected Calving'),
+    ]
+
+    farm = models.ForeignKey(Farm, on_delete=models.CASCADE, related_name='breeding_events')
+    animal = models.ForeignKey(Animal, on_delete=models.CASCADE, related_name='breeding_events')
+    ai_record = models.ForeignKey(ArtificialInsemination, on_delete=models.CASCADE, related_name='breeding_events')
+    kind = models.CharField(max_length=30, choices=KINDS)
+    date = models.DateField()
+    # Last day of a window such as a repeat heat, the same as date for single days
+    end_date = models.DateField()
+
+    def __str__(self):
+        return f"{self.animal.name} - {self.get_kind_display()} ({self.date})"
+
+    class Meta:
+        ordering = ['date', 'kind', 'id']
+        indexes = [
+            models.Index(fields=['farm', 'date'], name='breeding_event_farm_date_idx'),
+            models.Index(fields=['farm', 'kind', 'date'], name='breeding_event_farm_kind_idx'),
+        ]
@@ -0,0 +1,148 @@
+from collections import defaultdict
+from django.db import connection
+from django.db.models import Avg, Count, F, Prefetch, Q, Sum
+from django.db.models.expressions import RawSQL
+from products.models import ProductionRecord
+from .models import Animal, AnimalImage, ArtificialInsemination
+
+# Generations loaded when no depth is given, deep enough for any real herd book
+MAX_PEDIGREE_DEPTH = 50
+
+# Number of images included for every animal in a pedigree
+PEDIGREE_IMAGES = 5
+
+ANCESTORS_SQL = """
+    WITH RECURSIVE pedigree(id, depth) AS (
+        SELECT id, 0 FROM {table} WHERE id = %s
+        UNION
+        SELECT parent.id, pedigree.depth + 1
+        FROM pedigree
+        JOIN {table} child ON child.id = pedigree.id
+        JOIN {table} parent ON parent.id = child.dam_id OR parent.id = child.sire_id
+        WHERE pedigree.depth < %s
+    )
+    SELECT id FROM pedigree
+"""
+
+
+def get_ancestors(animal_id, depth=MAX_PEDIGREE_DEPTH):
+    """Load an animal and its dam/sire ancestors up to depth generations as {id: Animal}.
+
+    The ancestor ids are resolved by a single recursive CTE used as a subquery,
+    so the animals, their type, breed and AI sire arrive in one query, plus one
+    windowed query for their latest images (stored on pedigree_images).
+    """
+    sql = ANCESTORS_SQL.format(table=connection.ops.quote_name(Animal._meta.db_table))
+    ancestors = Animal.objects.filter(
+        id__in=RawSQL(sql, [animal_id, depth])
+    ).select_related(
+        'type', 'breed', 'ai_sire__animal', 'ai_sire__breed'
+    ).prefetch_related(
+        Prefetch(
+            'animalimage_set',
+            queryset=AnimalImage.objects.order_by('-id')[:PEDIGREE_IMAGES],
+            to_attr='pedigree_images'
+        )
+    )
+    return {animal.id: animal for animal in ancestors}
+
+
+# Children are linked to a parent through dam, sire, or an AI service of the dam
+DESCENDANTS_SQL = """
+    WITH RECURSIVE descendants(id, depth) AS (
+        SELECT id, 0 FROM {table} WHERE id = %s
+        UNION
+        SELECT child.id, descendants.depth + 1
+        FROM descendants, {table} child
+        LEFT JOIN {ai_table} ai ON ai.id = child.ai_sire_id
+        WHERE descendants.depth < %s AND (
+            child.dam_id = descendants.id
+            OR child.sire_id = descendants.id
+            OR ai.animal_id = descendants.id
+        )
+    )
+    SELECT id FROM descendants WHERE depth > 0
+"""
+
+
+def get_descendants(animal_id, depth):
+    """Queryset of the offspring of an animal up to depth generations down.
+
+    The ids are resolved by a recursive CTE, so the queryset can be aggregated
+    or related to other tables entirely in SQL.
+    """
+    sql = DESCENDANTS_SQL.format(
+        table=connection.ops.quote_name(Animal._meta.db_table),
+        ai_table=connection.ops.quote_name(ArtificialInsemination._meta.db_table)
+    )
+    return Animal.objects.filter(id__in=RawSQL(sql, [animal_id, depth]))
+
+
+def get_progeny_summary(descendants):
+    """Counts, sex split and production of a descendants queryset, aggregated in SQL"""
+    summary = descendants.aggregate(
+        count=Count('id'),
+        males=Count('id', filter=Q(gender='Male')),
+        females=Count('id', filter=Q(gender='Female')),
+        alive=Count('id', filter=Q(date_of_death__isnull=True)),
+    )
+    summary['production'] = list(
+        ProductionRecord.objects.filter(
+            animal__in=descendants, record_type='individual'
+        ).values(
+            'product_id', product_name=F('product__name'), unit=F('product__unit')
+        ).annotate(
+            producing_offspring=Count('animal', distinct=True),
+            records=Count('id'),
+            total_quantity=Sum('quantity'),
+            average_quantity=Avg('quantity'),
+        ).order_by('product_name')
+    )
+    return summary
+
+
+def build_descendant_tree(animal_id, descendants, depth):
+    """Nest a descendants queryset under its root animal as a list of offspring nodes.
+
+    An animal whose dam and sire both descend from the root appears under
+    each of them. Production is averaged per animal in the same query that
+    loads the descendants.
+    """
+    rows = descendants.annotate(
+        average_production=Avg(
+            'production_records__quantity',
+            filter=Q(production_records__record_type='individual')
+        ),
+        ai_sire_dam_id=F('ai_sire__animal_id'),
+    ).values(
+        'id', 'name', 'gender', 'date_of_birth', 'date_of_death',
+        'dam_id', 'sire_id', 'ai_sire_id', 'ai_sire_dam_id', 'average_production'
+    ).order_by('date_of_birth', 'id')
+
+    children = defaultdict(list)
+    for row in rows:
+        parents = {row['dam_id'], row['sire_id'], row['ai_sire_dam_id']} - {None}
+        for parent_id in parents:
+            children[parent_id].append(row)
+
+    def offspring_nodes(parent_id, generation):
+        if generation > depth:
+            return []
+        return [
+            {
+                'id': row['id'],
+                'name': row['name'],
+                'gender': row['gender'],
+                'date_of_birth': row['date_of_birth'],
+                'date_of_death': row['date_of_death'],
+                'generation': generation,
+                'dam': row['dam_id'],
+                'sire': row['sire_id'],
+                'ai_sire': row['ai_sire_id'],
+                'average_production': row['average_production'],
+                'offspring': offspring_nodes(row['id'], generation + 1),
+            }
+            for row in children[parent_id]
+        ]
+
+    return offspring_nodes(animal_id, 1)
@@ -1,6 +1,9 @@
 from rest_framework import serializers
-from .models import Animal, AnimalImage, AnimalType, AnimalBreed, ArtificialInsemination
+from django.db.models import Prefetch
+from .models import Animal, AnimalImage, AnimalType, AnimalBreed, ArtificialInsemination, HerdCensus, ArchivedAnimal, ArchivedRecord, BreedingEvent
 from health.models import HealthRecord, Treatment, VetService
+from products.models import ProductionRecord
+from .pedigree import get_ancestors, MAX_PEDIGREE_DEPTH
 
 class AnimalTypeSerializer(serializers.ModelSerializer):
     breeds = serializers.SerializerMethodField()
@@ -40,6 +43,49 @@ class ArtificialInseminationSerializer(serializers.ModelSerializer):
     def get_breed_name(self, obj):
         return obj.breed.name if obj.breed else None
 
+class ProductionEventSerializer(serializers.ModelSerializer):
+    """Production record of an animal as shown on its timeline"""
+    product_name = serializers.CharField(source='product.name', read_only=True)
+    unit = serializers.CharField(source='product.unit', read_only=True)
+
+    class Meta:
+        model = ProductionRecord
+        fields = ['id', 'product', 'product_name', 'unit', 'quantity', 'date', 'time', 'notes']
+
+class HerdCensusSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = HerdCensus
+        fields = [
+            'date', 'alive', 'dead', 'sold', 'males', 'females', 'on_sale', 'to_be_archived',
+            'herd_value', 'purchase_value', 'by_type', 'by_breed'
+        ]
+
+class BreedingEventSerializer(serializers.ModelSerializer):
+    animal_name = serializers.CharField(source='animal.name', read_only=True)
+    semen_code = serializers.CharField(source='ai_record.semen_code', read_only=True)
+    insemination_date = serializers.DateField(source='ai_record.insemination_date', read_only=True)
+    technician = serializers.CharField(source='ai_record.technician', read_only=True)
+
+    class Meta:
+        model = BreedingEvent
+        fields = [
+            'id', 'kind', 'date', 'end_date', 'animal', 'animal_name', 'ai_record', 'semen_code',
+            'insemination_date', 'technician'
+        ]
+
+class ArchivedAnimalSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = ArchivedAnimal
+        fields = [
+            'id', 'original_id', 'farm', 'name', 'type_name', 'breed_name', 'gender', 'date_of_birth',
+            'date_of_death', 'date_of_purchase', 'date_of_sale', 'price', 'purchase_price', 'archived_at'
+        ]
+
+class ArchivedRecordSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = ArchivedRecord
+        fields = ['kind', 'original_id', 'date', 'amount', 'data']
+
 class TreatmentSerializer(serializers.ModelSerializer):
     service_name = serializers.SerializerMethodField()
     
@@ -91,8 +137,40 @@ class AnimalSerializer(serializers.ModelSerializer):
             'images', 'ai_records', 'health_records'
         ]
 
+    @staticmethod
+    def prefetch_for_list(queryset):
+        """Load everything the list representation needs in a fixed number of queries.
+
+        The prefetched rows are stored under prefetched_* attributes with the same
+        ordering and limits the per-animal queries use, so the output is identical.
+        Images are limited to the latest 10 per animal with a window function.
+        """
+        return queryset.select_related(
+            'type', 'breed', 'ai_sire__animal', 'ai_sire__breed'
+        ).prefetch_related(
+            Prefetch(
+                'animalimage_set',
+                queryset=AnimalImage.objects.order_by('-id')[:10],
+                to_attr='prefetched_images'
+            ),
+            Prefetch(
+                'ai_records',
+                queryset=ArtificialInsemination.objects.select_related('breed').order_by('-insemination_date'),
+                to_attr='prefetched_ai_records'
+            ),
+            Prefetch(
+                'health_records',
+                queryset=HealthRecord.objects.select_related('condition', 'veterinarian').prefetch_related(
+                    Prefetch('treatments', queryset=Treatment.objects.select_related('service'))
+                ).order_by('-diagnosis_date'),
+                to_attr='prefetched_health_records'
+            ),
+        )
+
     def get_images(self, obj):
-        images = AnimalImage.objects.filter(animal=obj).order_by("-id")[:10]
+        images = getattr(obj, 'prefetched_images', None)
+        if images is None:
+            images = AnimalImage.objects.filter(animal=obj).order_by("-id")[:10]
         return AnimalImageSerializer(images, many=True).data
     
     def get_type_name(self, obj):
@@ -102,7 +180,9 @@ class AnimalSerializer(serializers.ModelSerializer):
         return obj.breed.name if obj.breed else None
 
     def get_ai_records(self, obj):
-        ai_records = ArtificialInsemination.objects.filter(animal=obj).order_by('-insemination_date')
+        ai_records = getattr(obj, 'prefetched_ai_records', None)
+        if ai_records is None:
+            ai_records = ArtificialInsemination.objects.filter(animal=obj).order_by('-insemination_date')
         return ArtificialInseminationSerializer(ai_records, many=True).data
 
     def get_ai_sire_details(self, obj):
@@ -111,58 +191,67 @@ class AnimalSerializer(serializers.ModelSerializer):
         return None
 
     def get_sire_type(self, obj):
-        if obj.ai_sire:
+        if obj.ai_sire_id:
             return 'AI'
-        elif obj.sire:
+        elif obj.sire_id:
             return 'Natural'
         return None
 
     def get_health_records(self, obj):
-        health_records = HealthRecord.objects.filter(animal=obj).order_by('-diagnosis_date')
+        health_records = getattr(obj, 'prefetched_health_records', None)
+        if health_records is None:
+            health_records = HealthRecord.objects.filter(animal=obj).order_by('-diagnosis_date')
         return HealthRecordSerializer(health_records, many=True).data
 
+    def get_ancestors(self, obj):
+        """Ancestors of obj, loaded once per serializer by a recursive query"""
+        if getattr(self, '_ancestors_of', None) != obj.pk:
+            self._ancestors = get_ancestors(obj.pk)
+            self._ancestors_of = obj.pk
+        return self._ancestors
+
     def get_sire_details(self, obj):
-        if not self.context.get('many', True) and obj.sire:
-            sire = obj.sire
-            return {
-                'id': sire.id,
-                'name': sire.name,
-                'type': sire.type.name if sire.type else None,
-                'breed': sire.breed.name if sire.breed else None,
-                'gender': sire.gender,
-                'age': sire.age,
-                'date_of_birth': sire.date_of_birth,
-                'farm': sire.farm.id,
-                'images': AnimalImageSerializer(AnimalImage.objects.filter(animal=sire).order_by("-id")[:5], many=True).data,
-                'dam': sire.dam.id if sire.dam else None,
-                'dam_details': self.get_dam_details(sire),
-                'sire': sire.sire.id if sire.sire else None,
-                'sire_details': self.get_sire_details(sire),
-                'ai_sire': sire.ai_sire.id if sire.ai_sire else None,
-                'ai_sire_details': self.get_ai_sire_details(sire),
-                'sire_type': self.get_sire_type(sire)
-            }
+        if not self.context.get('many', True) and obj.sire_id:
+            ancestors = self.get_ancestors(obj)
+            return build_pedigree_node(ancestors.get(obj.sire_id), ancestors, MAX_PEDIGREE_DEPTH - 1)
         return None
 
     def get_dam_details(self, obj):
-        if not self.context.get('many', True) and obj.dam:
-            dam = obj.dam
-            return {
-                'id': dam.id,
-                'name': dam.name,
-                'type': dam.type.name if dam.type else None,
-                'breed': dam.breed.name if dam.breed else None,
-                'gender': dam.gender,
-                'age': dam.age,
-                'date_of_birth': dam.date_of_birth,
-                'farm': dam.farm.id,
-                'images': AnimalImageSerializer(AnimalImage.objects.filter(animal=dam).order_by("-id")[:5], many=True).data,
-                'dam': dam.dam.id if dam.dam else None,
-                'dam_details': self.get_dam_details(dam),
-                'sire': dam.sire.id if dam.sire else None,
-                'sire_details': self.get_sire_details(dam),
-                'ai_sire': dam.ai_sire.id if dam.ai_sire else None,
-                'ai_sire_details': self.get_ai_sire_details(dam),
-                'sire_type': self.get_sire_type(dam)
-            }
+        if not self.context.get('many', True) and obj.dam_id:
+            ancestors = self.get_ancestors(obj)
+            return build_pedigree_node(ancestors.get(obj.dam_id), ancestors, MAX_PEDIGREE_DEPTH - 1)
         return None
+
+
+def build_pedigree_node(animal, ancestors, depth):
+    """Build the nested pedigree of an animal from an {id: Animal} map returned by get_ancestors.
+
+    Parents are expanded for depth more generations; beyond that, or for
+    parents outside the map, only their ids are returned.
+    """
+    if animal is None:
+        return None
+
+    def parent_node(parent_id):
+        if depth > 0 and parent_id in ancestors:
+            return build_pedigree_node(ancestors[parent_id], ancestors, depth - 1)
+        return None
+
+    return {
+        'id': animal.id,
+        'name': animal.name,
+        'type': animal.type.name if animal.type else None,
+        'breed': animal.breed.name if animal.breed else None,
+        'gender': animal.gender,
+        'age': animal.age,
+        'date_of_birth': animal.date_of_birth,
+        'farm': animal.farm_id,
+        'images': AnimalImageSerializer(animal.pedigree_images, many=True).data,
+        'dam': animal.dam_id,
+        'dam_details': parent_node(animal.dam_id),
+        'sire': animal.sire_id,
+        'sire_details': parent_node(animal.sire_id),
+        'ai_sire': animal.ai_sire_id,
+        'ai_sire_details': ArtificialInseminationSerializer(animal.ai_sire).data if animal.ai_sire else None,
+        'sire_type': 'AI' if animal.ai_sire_id else 'Natural' if animal.sire_id else None
+    }
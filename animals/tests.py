@@ -1,3 +1,299 @@
-from django.test import TestCase
+from datetime import date, timedelta
+from unittest import mock
+from django.contrib.auth.models import User
+from django.test import TestCase, override_settings
+from django.utils import timezone
+from rest_framework.test import APIClient
+from farms.ledger import verify_ledger
+from farms.models import Farm, FarmDailyLedger
+from health.models import HealthCondition, HealthRecord, ProductionAlert, Treatment, Veterinarian, VetService
+from products.models import Lactation, Product
+from . import inbreeding
+from .archive import archive_animals, archive_batch, plan_archive
+from .census import build_census, census_refresh_suspended
+from .models import Animal, AnimalBreed, AnimalType, ArchivedAnimal, ArchivedRecord, HerdCensus
 
-# Create your tests here.
+
+class HerdCensusRefreshTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user('farmer@example.com', 'farmer@example.com', 'password')
+        self.farm = Farm.objects.create(name='Green Acres', address='Nakuru', created_by=self.user)
+        self.cow_type = AnimalType.objects.create(name='Cow', farm=self.farm, created_by=self.user)
+        self.breed = AnimalBreed.objects.create(name='Friesian', type=self.cow_type, farm=self.farm, created_by=self.user)
+        self.today = timezone.now().date()
+        self.past = self.today - timedelta(days=10)
+
+    def add_animal(self, name, gender='Female', born=date(2020, 1, 1), **fields):
+        with self.captureOnCommitCallbacks(execute=True):
+            return Animal.objects.create(
+                name=name, type=self.cow_type, breed=self.breed, gender=gender,
+                date_of_birth=born, farm=self.farm, created_by=self.user, **fields
+            )
+
+    def census(self, day):
+        return HerdCensus.objects.get(farm=self.farm, date=day)
+
+    def test_new_animal_refreshes_today(self):
+        self.add_animal('Daisy', price=1200, is_on_sale=True)
+        census = self.census(self.today)
+        self.assertEqual((census.alive, census.females, census.males), (1, 1, 0))
+        self.assertEqual(census.herd_value, 1200)
+        self.assertEqual((census.by_type, census.by_breed), ({'Cow': 1}, {'Friesian': 1}))
+        self.assertEqual(census.on_sale, 1)
+
+    def test_animal_born_in_history_refreshes_stored_days(self):
+        self.add_animal('Daisy')
+        build_census(self.farm.id, self.past, self.today)
+        self.add_animal('Bull', gender='Male', born=self.past + timedelta(days=4))
+        self.assertEqual(self.census(self.past + timedelta(days=3)).alive, 1)
+        self.assertEqual(self.census(self.past + timedelta(days=4)).males, 1)
+        self.assertEqual(self.census(self.today).alive, 2)
+
+    def test_backdated_death_refreshes_from_that_day(self):
+        daisy = self.add_animal('Daisy')
+        self.add_animal('Bella')
+        build_census(self.farm.id, self.past, self.today)
+        died = self.past + timedelta(days=5)
+        with self.captureOnCommitCallbacks(execute=True):
+            daisy.date_of_death = died
+            daisy.save()
+        self.assertEqual((self.census(died - timedelta(days=1)).alive, self.census(died - timedelta(days=1)).dead), (2, 0))
+        self.assertEqual((self.census(died).alive, self.census(died).dead), (1, 1))
+        self.assertEqual((self.census(self.today).alive, self.census(self.today).dead), (1, 1))
+
+    def test_sale_leaves_the_herd(self):
+        daisy = self.add_animal('Daisy', price=900)
+        build_census(self.farm.id, self.past, self.today)
+        with self.captureOnCommitCallbacks(execute=True):
+            daisy.date_of_sale = self.today
+            daisy.save()
+        census = self.census(self.today)
+        self.assertEqual((census.alive, census.sold, census.herd_value), (0, 1, 0))
+        self.assertEqual(self.census(self.today - timedelta(days=1)).alive, 1)
+
+    def test_purchased_animal_joins_on_purchase(self):
+        self.add_animal('Daisy')
+        build_census(self.farm.id, self.past, self.today)
+        bought = self.past + timedelta(days=2)
+        self.add_animal('Bella', date_of_purchase=bought, purchase_price=700)
+        self.assertEqual(self.census(bought - timedelta(days=1)).alive, 1)
+        census = self.census(bought)
+        self.assertEqual((census.alive, census.purchase_value), (2, 700))
+
+    def test_delete_refreshes_today(self):
+        daisy = self.add_animal('Daisy')
+        with self.captureOnCommitCallbacks(execute=True):
+            daisy.delete()
+        self.assertEqual(self.census(self.today).alive, 0)
+
+    def test_rename_leaves_the_census(self):
+        daisy = self.add_animal('Daisy', price=900)
+        census = self.census(self.today)
+        with self.captureOnCommitCallbacks(execute=True):
+            daisy.name = 'Daisy II'
+            daisy.description = 'Renamed'
+            daisy.save()
+        self.assertEqual(self.census(self.today).id, census.id)
+
+    def test_counted_field_change_refreshes_today(self):
+        daisy = self.add_animal('Daisy', price=900)
+        with self.captureOnCommitCallbacks(execute=True):
+            daisy.price = 1500
+            daisy.save()
+        self.assertEqual(self.census(self.today).herd_value, 1500)
+
+    def test_suspended_refresh_leaves_the_census(self):
+        daisy = self.add_animal('Daisy')
+        with census_refresh_suspended(), self.captureOnCommitCallbacks(execute=True):
+            daisy.date_of_death = self.today
+            daisy.save()
+        self.assertEqual(self.census(self.today).alive, 1)
+
+
+class ArchiveTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user('farmer@example.com', 'farmer@example.com', 'password')
+        self.farm = Farm.objects.create(name='Green Acres', address='Nakuru', created_by=self.user)
+        self.cow_type = AnimalType.objects.create(name='Cow', farm=self.farm, created_by=self.user)
+        self.product = Product.objects.create(name='Milk', unit='liters', farm=self.farm)
+        self.vet = Veterinarian.objects.create(name='Dr Otieno', contact_number='0700', farm=self.farm)
+        self.condition = HealthCondition.objects.create(name='Mastitis', description='Udder', severity='MILD', farm=self.farm)
+        self.day = date(2026, 3, 1)
+
+    def add_animal(self, name, dam=None, **fields):
+        return Animal.objects.create(
+            name=name, type=self.cow_type, gender='Female', date_of_birth=date(2020, 1, 1),
+            dam=dam, farm=self.farm, created_by=self.user, **fields
+        )
+
+    def archived(self, kind):
+        return ArchivedRecord.objects.filter(kind=kind)
+
+    def test_alerts_and_lactations_are_archived(self):
+        cow = self.add_animal('Daisy', to_be_archived=True)
+        record = HealthRecord.objects.create(
+            animal=cow, condition=self.condition, veterinarian=self.vet, diagnosis_date=self.day, symptoms='Clots'
+        )
+        alert = ProductionAlert.objects.create(
+            farm=self.farm, animal=cow, product=self.product, date=self.day, quantity=6.5,
+            baseline=20, deviation=1.5, z_score=-6.1, status='RECORDED', health_record=record,
+        )
+        lactation = Lactation.objects.create(
+            farm=self.farm, animal=cow, product=self.product, number=1, calving_date=self.day - timedelta(days=40),
+            record_days=40, last_record_date=self.day, total_yield=812.5,
+        )
+        self.assertEqual(archive_animals([self.farm.id]), 1)
+
+        self.assertFalse(ProductionAlert.objects.exists())
+        archived_alert = self.archived('production_alert').get()
+        self.assertEqual((archived_alert.original_id, archived_alert.date), (alert.id, self.day))
+        self.assertEqual(archived_alert.data['health_record_id'], self.archived('health_record').get().original_id)
+        archived_lactation = self.archived('lactation').get()
+        self.assertEqual((archived_lactation.original_id, float(archived_lactation.amount)), (lactation.id, 812.5))
+
+    def test_offspring_are_archived_before_their_dam(self):
+        dam = self.add_animal('Daisy', to_be_archived=True)
+        calf = self.add_animal('Calf', dam=dam, to_be_archived=True)
+        grandcalf = self.add_animal('Grandcalf', dam=calf, to_be_archived=True)
+        self.assertEqual(plan_archive([self.farm.id]), ({dam.id, calf.id, grandcalf.id}, set()))
+        # One animal per batch, so each batch only finds the youngest generation left
+        self.assertEqual(archive_animals([self.farm.id], batch_size=1), 3)
+        self.assertFalse(Animal.objects.exists())
+        self.assertEqual(
+            list(ArchivedAnimal.objects.order_by('id').values_list('original_id', flat=True)),
+            [grandcalf.id, calf.id, dam.id],
+        )
+
+    def test_dam_of_a_live_calf_is_kept(self):
+        dam = self.add_animal('Daisy', to_be_archived=True)
+        calf = self.add_animal('Calf', dam=dam)
+        self.assertEqual(plan_archive([self.farm.id]), (set(), {dam.id}))
+        self.assertEqual(archive_batch([dam.id]), 0)
+        self.assertEqual(archive_animals([self.farm.id]), 0)
+        self.assertEqual(set(Animal.objects.values_list('id', flat=True)), {dam.id, calf.id})
+        self.assertFalse(ArchivedAnimal.objects.exists())
+
+    def test_archived_treatments_stay_in_the_ledger(self):
+        service = VetService.objects.create(name='Antibiotics', description='Course', base_cost=50, farm=self.farm)
+        for name, flagged, cost in (('Daisy', True, 120), ('Bella', False, 30)):
+            record = HealthRecord.objects.create(
+                animal=self.add_animal(name, to_be_archived=flagged), condition=self.condition,
+                veterinarian=self.vet, diagnosis_date=self.day, symptoms='Clots',
+            )
+            Treatment.objects.create(health_record=record, service=service, treatment_date=self.day, cost=cost)
+        ledger = FarmDailyLedger.objects.get(farm=self.farm, date=self.day, category='treatments')
+        self.assertEqual((ledger.amount, ledger.entries), (150, 2))
+
+        self.assertEqual(archive_animals([self.farm.id]), 1)
+        self.assertEqual(Treatment.objects.count(), 1)
+        ledger.refresh_from_db()
+        self.assertEqual((ledger.amount, ledger.entries), (150, 2))
+        self.assertEqual(verify_ledger([self.farm.id]), [])
+
+
+@override_settings(CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}})
+class RelationshipMatrixCacheTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user('farmer@example.com', 'farmer@example.com', 'password')
+        self.farm = Farm.objects.create(name='Green Acres', address='Nakuru', created_by=self.user)
+        self.cow_type = AnimalType.objects.create(name='Cow', farm=self.farm, created_by=self.user)
+        inbreeding._matrices.clear()
+        self.addCleanup(inbreeding._matrices.clear)
+
+    def add_animal(self, name, **fields):
+        return Animal.objects.create(
+            name=name, type=self.cow_type, gender='Female', date_of_birth=date(2020, 1, 1),
+            farm=self.farm, created_by=self.user, **fields
+        )
+
+    def test_missing_member_rebuilds_the_matrix(self):
+        self.add_animal('Daisy')
+        matrix = inbreeding.get_relationship_matrix(self.farm.id)
+        # Committed, but the pedigree version is not bumped yet
+        calf = self.add_animal('Calf')
+        self.assertEqual(matrix.inbreeding(calf.id), 0.0)
+        self.assertIs(inbreeding.get_relationship_matrix(self.farm.id), matrix)
+        self.assertIn(calf.id, inbreeding.get_relationship_matrix(self.farm.id, [calf.id]))
+
+    def test_cache_is_bounded_by_bytes(self):
+        other_farm = Farm.objects.create(name='Hill Side', address='Nyeri', created_by=self.user)
+        for number in range(4):
+            self.add_animal(f'Cow {number}')
+        Animal.objects.create(
+            name='Bull', type=self.cow_type, gender='Male', date_of_birth=date(2020, 1, 1),
+            farm=other_farm, created_by=self.user,
+        )
+        # Room for the 4 x 4 float32 matrix of the first farm only
+        with mock.patch.object(inbreeding, 'MATRIX_CACHE_BYTES', 4 * 4 * 4):
+            inbreeding.get_relationship_matrix(self.farm.id)
+            self.assertEqual(list(inbreeding._matrices), [self.farm.id])
+            inbreeding.get_relationship_matrix(other_farm.id)
+            self.assertEqual(list(inbreeding._matrices), [other_farm.id])
+            self.add_animal('Cow 4')
+            inbreeding.get_relationship_matrix(self.farm.id, [Animal.objects.get(name='Cow 4').id])
+            # A 5 x 5 matrix is over the budget on its own and is not kept
+            self.assertEqual(list(inbreeding._matrices), [])
+
+
+@override_settings(CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}})
+class BreedingCalendarFeedTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user('farmer@example.com', 'farmer@example.com', 'password')
+        self.farm = Farm.objects.create(name='Green Acres', address='Nakuru', created_by=self.user)
+        self.other_farm = Farm.objects.create(name='Hill Side', address='Nyeri', created_by=self.user)
+
+    def feed_url(self, farm):
+        client = APIClient()
+        client.force_authenticate(self.user)
+        response = client.get(f'/animals/get_breeding_calendar_feed/{farm.id}')
+        self.assertEqual(response.status_code, 200)
+        return response.data['url']
+
+    def test_feed_is_read_with_the_url_token(self):
+        response = APIClient().get(self.feed_url(self.farm))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Content-Type'], 'text/calendar; charset=utf-8')
+        self.assertIn(b'X-WR-CALNAME:Green Acres breeding calendar', response.content)
+
+    def test_feed_needs_a_token_of_its_farm(self):
+        path = f'/animals/get_breeding_calendar_ical/{self.farm.id}'
+        other_token = self.feed_url(self.other_farm).split('token=')[1]
+        for query in ('', '?token=forged', f'?token={other_token}'):
+            self.assertEqual(APIClient().get(path + query).status_code, 403)
+
+
+@override_settings(CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}})
+class AnimalListPaginationTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user('farmer@example.com', 'farmer@example.com', 'password')
+        self.farm = Farm.objects.create(name='Green Acres', address='Nakuru', created_by=self.user)
+        self.cow_type = AnimalType.objects.create(name='Cow', farm=self.farm, created_by=self.user)
+        # Shared birth dates, so pages must break ties on id
+        for number, born in enumerate([date(2020, 1, 1)] * 3 + [date(2021, 6, 1)] * 2):
+            Animal.objects.create(
+                name=f'Cow {number}', type=self.cow_type, gender='Female', date_of_birth=born,
+                farm=self.farm, created_by=self.user,
+            )
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        self.url = f'/animals/get_animals/{self.farm.id}'
+
+    def test_pages_continue_across_ties(self):
+        names, cursor = [], ''
+        while True:
+            response = self.client.get(self.url, {'limit': 2, 'ordering': '-date_of_birth', 'cursor': cursor})
+            self.assertEqual(response.status_code, 200)
+            names += [animal['name'] for animal in response.data['results']]
+            cursor = response.data['next_cursor']
+            if cursor is None:
+                break
+        self.assertEqual(names, ['Cow 4', 'Cow 3', 'Cow 2', 'Cow 1', 'Cow 0'])
+
+    def test_cursor_of_another_ordering_is_rejected(self):
+        cursor = self.client.get(self.url, {'limit': 2, 'ordering': 'name'}).data['next_cursor']
+        response = self.client.get(self.url, {'limit': 2, 'ordering': '-date_of_birth', 'cursor': cursor})
+        self.assertEqual(response.status_code, 400)
+
+    def test_malformed_cursor_is_rejected(self):
+        response = self.client.get(self.url, {'limit': 2, 'cursor': 'garbage'})
+        self.assertEqual(response.status_code, 400)
@@ -0,0 +1,124 @@
+"""Timeline of an animal's AI services, health records, images and production records.
+
+A page of events is selected by one UNION ALL query over the event tables,
+newest first by (date, kind, id), and paged with a keyset cursor over that
+key. Each branch applies the cursor to its own columns so the (animal, date,
+id) indexes serve it and, where the database allows LIMIT inside a compound
+query, each branch also stops at the page size. The events of the page are
+then loaded with one query per kind, so a page costs the same however long
+the animal's history is.
+"""
+from collections import namedtuple
+from datetime import date
+from django.db import connection
+from django.db.models import CharField, F, Prefetch, Q, Value
+from django.db.models.functions import TruncDate
+from farms.pagination import InvalidCursor, encode_cursor, read_cursor
+from health.models import HealthRecord, Treatment
+from products.models import ProductionRecord
+from .models import AnimalImage, ArtificialInsemination
+from .serializers import (
+    AnimalImageSerializer, ArtificialInseminationSerializer, HealthRecordSerializer, ProductionEventSerializer
+)
+
+TIMELINE_ORDERING = ['-date', '-kind', '-id']
+DEFAULT_TIMELINE_PAGE_SIZE = 20
+
+
+def load_ai_records(ids):
+    records = ArtificialInsemination.objects.select_related('animal', 'breed').filter(id__in=ids)
+    return {record.id: ArtificialInseminationSerializer(record).data for record in records}
+
+
+def load_health_records(ids):
+    records = HealthRecord.objects.select_related('condition', 'veterinarian').prefetch_related(
+        Prefetch('treatments', queryset=Treatment.objects.select_related('service'))
+    ).filter(id__in=ids)
+    return {record.id: HealthRecordSerializer(record).data for record in records}
+
+
+def load_images(ids):
+    return {image.id: AnimalImageSerializer(image).data for image in AnimalImage.objects.filter(id__in=ids)}
+
+
+def load_production_records(ids):
+    records = ProductionRecord.objects.select_related('product').filter(id__in=ids)
+    return {record.id: ProductionEventSerializer(record).data for record in records}
+
+
+# Event tables, as (kind, model, date expression, loader of the events by id)
+TimelineSource = namedtuple('TimelineSource', ['kind', 'model', 'date', 'load'])
+
+TIMELINE_SOURCES = [
+    TimelineSource('ai_record', ArtificialInsemination, F('insemination_date'), load_ai_records),
+    TimelineSource('health_record', HealthRecord, F('diagnosis_date'), load_health_records),
+    TimelineSource('image', AnimalImage, TruncDate('created_at'), load_images),
+    TimelineSource('production_record', ProductionRecord, F('date'), load_production_records),
+]
+
+TIMELINE_KINDS = [source.kind for source in TIMELINE_SOURCES]
+
+
+def parse_timeline_cursor(cursor):
+    values = read_cursor(cursor, TIMELINE_ORDERING)
+    try:
+        day, kind, event_id = date.fromisoformat(values[0]), values[1], int(values[2])
+    except (TypeError, ValueError) as e:
+        raise InvalidCursor('Invalid cursor') from e
+    if kind not in TIMELINE_KINDS:
+        raise InvalidCursor('Invalid cursor')
+    return day, kind, event_id
+
+
+def after_cursor(kind, cursor):
+    """Q selecting the events of a kind that sort after the cursor, with the kind fixed per branch"""
+    day, cursor_kind, event_id = cursor
+    if kind < cursor_kind:
+        return Q(event_date__lte=day)
+    if kind > cursor_kind:
+        return Q(event_date__lt=day)
+    return Q(event_date__lt=day) | Q(event_date=day, id__lt=event_id)
+
+
+def get_timeline(animal_id, kinds=None, cursor=None, limit=DEFAULT_TIMELINE_PAGE_SIZE):
+    """Return (events, next_cursor) for the page of an animal's timeline following cursor.
+
+    Each event is a dict with date, kind, id and the event's data.
+    kinds restricts the timeline to some of TIMELINE_KINDS.
+    """
+    position = parse_timeline_cursor(cursor) if cursor else None
+    limit_branches = connection.features.supports_slicing_ordering_in_compound
+    branches = []
+    for source in TIMELINE_SOURCES:
+        if kinds is not None and source.kind not in kinds:
+            continue
+        events = source.model.objects.filter(animal_id=animal_id).annotate(
+            event_date=source.date, kind=Value(source.kind, output_field=CharField())
+        )
+        if position is not None:
+            events = events.filter(after_cursor(source.kind, position))
+        events = events.values('id', 'event_date', 'kind').order_by()
+        if limit_branches:
+            events = events.order_by('-event_date', '-id')[:limit + 1]
+        branches.append(events)
+    if not branches:
+        return [], None
+
+    page = list(branches[0].union(*branches[1:], all=True).order_by('-event_date', '-kind', '-id')[:limit + 1])
+    next_cursor = None
+    if len(page) > limit:
+        page = page[:limit]
+        last = page[-1]
+        next_cursor = encode_cursor(TIMELINE_ORDERING, [last['event_date'], last['kind'], last['id']])
+
+    details = {}
+    for source in TIMELINE_SOURCES:
+        ids = [event['id'] for event in page if event['kind'] == source.kind]
+        if ids:
+            details[source.kind] = source.load(ids)
+    events = [
+        {'date': event['event_date'], 'kind': event['kind'], 'id': event['id'],
+         'data': details[event['kind']].get(event['id'])}
+        for event in page
+    ]
+    return events, next_cursor
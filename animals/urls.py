@@ -18,11 +18,23 @@ urlpatterns = [
 
     # Animals
     path("get_animals/<int:farm_id>", get_animals, name="get_animals"),
+    path("get_herd_age_statistics/<int:farm_id>", get_herd_age_statistics, name="get_herd_age_statistics"),
+    path("get_herd_census/<int:farm_id>", get_herd_census, name="get_herd_census"),
     path("get_animal/<int:farm_id>/<int:id>", get_animal, name="get_animal"),
+    path("get_animal_pedigree/<int:farm_id>/<int:id>", get_animal_pedigree, name="get_animal_pedigree"),
+    path("get_animal_timeline/<int:farm_id>/<int:id>", get_animal_timeline, name="get_animal_timeline"),
+    path("get_animal_descendants/<int:farm_id>/<int:id>", get_animal_descendants, name="get_animal_descendants"),
+    path("get_inbreeding/<int:farm_id>", get_inbreeding, name="get_inbreeding"),
+    path("get_mating_relationship/<int:farm_id>", get_mating_relationship, name="get_mating_relationship"),
     path("create_animal/<int:farm_id>", add_animal, name="create_animal"),
+    path("import_animals/<int:farm_id>", import_animals, name="import_animals"),
     path("edit_animal/<int:farm_id>/<int:id>", edit_animal, name="edit_animal"),
     path("delete_animal/<int:farm_id>/<int:id>", delete_animal, name="delete_animal"),
 
+    # Archived Animals
+    path("get_archived_animals/<int:farm_id>", get_archived_animals, name="get_archived_animals"),
+    path("get_archived_animal/<int:farm_id>/<int:id>", get_archived_animal, name="get_archived_animal"),
+
     # Animal Images
     path("post_animal_image/<int:id>", post_animal_image, name="post_animal_image"),
     path("delete_animal_image/<int:farm_id>/<int:id>", delete_animal_image, name="delete_animal_image"),
@@ -32,6 +44,10 @@ urlpatterns = [
     path("add_ai_record/<int:farm_id>", add_ai_record, name="add_ai_record"),
     path("edit_ai_record/<int:farm_id>/<int:id>", edit_ai_record, name="edit_ai_record"),
     path("delete_ai_record/<int:farm_id>/<int:id>", delete_ai_record, name="delete_ai_record"),
+    path("get_ai_analytics/<int:farm_id>", get_ai_analytics, name="get_ai_analytics"),
+    path("get_breeding_calendar/<int:farm_id>", get_breeding_calendar, name="get_breeding_calendar"),
+    path("get_breeding_calendar_feed/<int:farm_id>", get_breeding_calendar_feed, name="get_breeding_calendar_feed"),
+    path("get_breeding_calendar_ical/<int:farm_id>", get_breeding_calendar_ical, name="get_breeding_calendar_ical"),
     path("set_ai_sire/<int:animal_id>", set_ai_sire, name="set_ai_sire"),
     path("clear_ai_sire/<int:animal_id>", clear_ai_sire, name="clear_ai_sire"),
 
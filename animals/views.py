@@ -1,11 +1,23 @@
 from django.contrib.auth.models import User
 from .serializers import *
 from farms.models import Farm
-from datetime import date
+from datetime import date, timedelta
 from users.models import UserProfile
 from rest_framework.decorators import authentication_classes, permission_classes, api_view
 from rest_framework.response import Response
 from health.models import HealthRecord
+from .pedigree import get_ancestors, get_descendants, get_progeny_summary, build_descendant_tree, MAX_PEDIGREE_DEPTH
+from .inbreeding import get_relationship_matrix, semen_code_key, PedigreeCycleError
+from .listing import filter_animals, get_ordering
+from .importer import AnimalImporter, load_dataset
+from .timeline import get_timeline, TIMELINE_KINDS, DEFAULT_TIMELINE_PAGE_SIZE
+from .breeding import get_breeding_events, get_overdue_pregnancy_checks, render_ical, calendar_feed_token, check_calendar_feed_token
+from .detail_cache import get_animal_detail
+from .ai_analytics import AI_DIMENSIONS, ai_summary, ai_by_dimension, ai_monthly_trend
+from django.http import HttpResponse
+from django.urls import reverse
+from django.db.models import Avg, Count, F, Max, Min, Q
+from farms.pagination import paginate_keyset, get_page_size, InvalidCursor
 
 
 ###################### ANIMAL TYPES ########################
@@ -113,37 +125,254 @@ def delete_animal_breed(request, farm_id, id):
 
 @api_view(['GET'])
 def get_animals(request, farm_id):
-    """Get animals, Returns animals in users farms"""
+    """Get animals, Returns animals in users farms.
+
+    The whole herd is returned unless `limit` or `cursor` is given, in which
+    case one keyset page is returned with the cursor of the next page.
+    """
     farm = Farm.objects.get(id=farm_id)
     animals = Animal.objects.filter(farm=farm)
-    # if breed is specified
-    if "breed" in request.query_params:
-        breed = request.query_params["breed"]
-        animals = animals.filter(breed__name=breed)
-
-    # if name is specified
-    if "name" in request.query_params:
-        name = request.query_params["name"]
-        animals = animals.filter(name__icontains=name)
-
-    # if type is specified
-    if "type" in request.query_params:
-        type = request.query_params["type"]
-        animals = animals.filter(type__name=type)
-    # Serialize the animal data
-    serializer = AnimalSerializer(animals, many=True, context={'many': True})
+    params = request.query_params
+    try:
+        animals = filter_animals(animals, params)
+        ordering = get_ordering(params)
+        limit = get_page_size(params.get("limit"))
+    except ValueError as e:
+        return Response({"error": str(e)}, status=400)
+
+    if "limit" not in params and "cursor" not in params:
+        if "ordering" in params:
+            animals = animals.order_by(*ordering)
+        # Serialize the animal data
+        animals = AnimalSerializer.prefetch_for_list(animals)
+        serializer = AnimalSerializer(animals, many=True, context={'many': True})
+        return Response(serializer.data, status=200)
+
+    try:
+        page, next_cursor = paginate_keyset(
+            AnimalSerializer.prefetch_for_list(animals), ordering, params.get("cursor"), limit
+        )
+    except InvalidCursor as e:
+        return Response({"error": str(e)}, status=400)
+    serializer = AnimalSerializer(page, many=True, context={'many': True})
+    return Response({"results": serializer.data, "next_cursor": next_cursor}, status=200)
+
+# Age groups of the herd age statistics in months, as (name, from, up to but excluding)
+AGE_GROUPS = [
+    ('calves', 0, 6),
+    ('weaners', 6, 12),
+    ('young_stock', 12, 24),
+    ('adults', 24, None),
+]
+
+@api_view(['GET'])
+def get_herd_age_statistics(request, farm_id):
+    """Get the age structure of the living herd, overall and per type and gender, in one query each"""
+    if not Farm.objects.filter(id=farm_id).exists():
+        return Response({"error": f"Farm with id:{farm_id} does not exist"}, status=404)
+    try:
+        animals = filter_animals(Animal.objects.filter(farm_id=farm_id, date_of_death__isnull=True), request.query_params)
+    except ValueError as e:
+        return Response({"error": str(e)}, status=400)
+
+    aggregates = {
+        "count": Count("id"),
+        "average_age": Avg("age_in_months"),
+        "youngest": Min("age_in_months"),
+        "oldest": Max("age_in_months"),
+    }
+    for name, start, end in AGE_GROUPS:
+        in_group = Q(age_in_months__gte=start)
+        if end is not None:
+            in_group &= Q(age_in_months__lt=end)
+        aggregates[name] = Count("id", filter=in_group)
+
+    animals = animals.with_age()
+    herd = animals.aggregate(**aggregates)
+    groups = animals.values(type_name=F("type__name"), sex=F("gender")).annotate(**aggregates).order_by("type_name", "sex")
+    return Response({
+        "age_groups": [{"name": name, "from": start, "to": end} for name, start, end in AGE_GROUPS],
+        "herd": herd,
+        "by_type_and_gender": [
+            dict(group, type=group.pop("type_name"), gender=group.pop("sex")) for group in groups
+        ]
+    }, status=200)
+
+@api_view(['GET'])
+def get_herd_census(request, farm_id):
+    """Get the daily herd census snapshots between `start` and `end`, the last 30 days by default"""
+    if not Farm.objects.filter(id=farm_id).exists():
+        return Response({"error": f"Farm with id:{farm_id} does not exist"}, status=404)
+    try:
+        end_date = date.fromisoformat(request.query_params["end"]) if "end" in request.query_params else date.today()
+        start_date = date.fromisoformat(request.query_params["start"]) if "start" in request.query_params else end_date - timedelta(days=29)
+    except ValueError:
+        return Response({"error": "start and end must be dates in YYYY-MM-DD format"}, status=400)
+    if start_date > end_date:
+        return Response({"error": "start must be on or before end"}, status=400)
+
+    snapshots = HerdCensus.objects.filter(farm_id=farm_id, date__range=(start_date, end_date)).order_by('date')
+    serializer = HerdCensusSerializer(snapshots, many=True)
     return Response(serializer.data, status=200)
 
+@api_view(['GET'])
+def get_archived_animals(request, farm_id):
+    """Get the archived animals of a farm, latest archived first, one keyset page at a time"""
+    if not Farm.objects.filter(id=farm_id).exists():
+        return Response({"error": f"Farm with id:{farm_id} does not exist"}, status=404)
+    try:
+        limit = get_page_size(request.query_params.get("limit"))
+        page, next_cursor = paginate_keyset(
+            ArchivedAnimal.objects.filter(farm_id=farm_id), ['-archived_at', '-id'], request.query_params.get("cursor"), limit
+        )
+    except ValueError as e:
+        return Response({"error": str(e)}, status=400)
+    serializer = ArchivedAnimalSerializer(page, many=True)
+    return Response({"results": serializer.data, "next_cursor": next_cursor}, status=200)
+
+@api_view(['GET'])
+def get_archived_animal(request, farm_id, id):
+    """Get an archived animal by its original id, with all its values and archived records by kind"""
+    try:
+        archived = ArchivedAnimal.objects.get(original_id=id, farm_id=farm_id)
+    except ArchivedAnimal.DoesNotExist:
+        return Response({"error": f"Archived animal with id:{id} not found in farm:{farm_id}"}, status=404)
+    records = {kind: [] for kind, label in ArchivedRecord.KINDS}
+    for record in ArchivedRecordSerializer(archived.records.all(), many=True).data:
+        records[record.pop("kind")].append(record)
+    return Response({
+        **ArchivedAnimalSerializer(archived).data,
+        "data": archived.data,
+        "records": records,
+    }, status=200)
+
 @api_view(['GET'])
 def get_animal(request, farm_id, id):
-    """Get specific animal"""
+    """Get specific animal, served from the animal detail cache while nothing it shows has changed"""
+    data = get_animal_detail(farm_id, id, lambda animal: AnimalSerializer(animal, context={'many': False}).data)
+    if data is None:
+        return Response({"error": f"Animal with id:{id} not found in farm:{farm_id}"}, status=404)
+    return Response(data, status=200)
+
+@api_view(['GET'])
+def get_animal_pedigree(request, farm_id, id):
+    """Get the ancestors of an animal as a nested tree, `depth` generations deep"""
+    try:
+        depth = int(request.query_params.get("depth", 5))
+    except ValueError:
+        return Response({"error": "depth must be a number"}, status=400)
+    if depth < 0 or depth > MAX_PEDIGREE_DEPTH:
+        return Response({"error": f"depth must be between 0 and {MAX_PEDIGREE_DEPTH}"}, status=400)
+
+    ancestors = get_ancestors(id, depth)
+    animal = ancestors.get(id)
+    if animal is None or animal.farm_id != farm_id:
+        return Response({"error": f"Animal with id:{id} not found in farm:{farm_id}"}, status=404)
+    return Response(build_pedigree_node(animal, ancestors, depth), status=200)
+
+@api_view(['GET'])
+def get_animal_descendants(request, farm_id, id):
+    """Get the offspring of an animal `depth` generations down with a progeny summary"""
+    try:
+        depth = int(request.query_params.get("depth", 3))
+    except ValueError:
+        return Response({"error": "depth must be a number"}, status=400)
+    if depth < 1 or depth > MAX_PEDIGREE_DEPTH:
+        return Response({"error": f"depth must be between 1 and {MAX_PEDIGREE_DEPTH}"}, status=400)
+
     try:
         animal = Animal.objects.get(id=id, farm_id=farm_id)
-        serializer = AnimalSerializer(animal, context={'many': False})
-        return Response(serializer.data, status=200)
     except Animal.DoesNotExist:
         return Response({"error": f"Animal with id:{id} not found in farm:{farm_id}"}, status=404)
 
+    descendants = get_descendants(animal.id, depth).filter(farm_id=farm_id)
+    return Response({
+        "id": animal.id,
+        "name": animal.name,
+        "gender": animal.gender,
+        "depth": depth,
+        "summary": get_progeny_summary(descendants),
+        "offspring": build_descendant_tree(animal.id, descendants, depth)
+    }, status=200)
+
+@api_view(['GET'])
+def get_animal_timeline(request, farm_id, id):
+    """Get an animal's AI services, health records, images and production records newest first.
+
+    Events are returned one page of `limit` (20 by default) at a time with
+    the cursor of the next page. `kinds` restricts them to a comma separated
+    list of event kinds.
+    """
+    if not Animal.objects.filter(id=id, farm_id=farm_id).exists():
+        return Response({"error": f"Animal with id:{id} not found in farm:{farm_id}"}, status=404)
+    params = request.query_params
+    kinds = None
+    if params.get("kinds"):
+        kinds = [kind.strip() for kind in params["kinds"].split(",") if kind.strip()]
+        unknown = [kind for kind in kinds if kind not in TIMELINE_KINDS]
+        if unknown:
+            return Response({"error": f"Unknown event kinds: {', '.join(unknown)}, use {', '.join(TIMELINE_KINDS)}"}, status=400)
+    try:
+        limit = get_page_size(params.get("limit"), default=DEFAULT_TIMELINE_PAGE_SIZE)
+        events, next_cursor = get_timeline(id, kinds, params.get("cursor"), limit)
+    except ValueError as e:
+        return Response({"error": str(e)}, status=400)
+    return Response({"results": events, "next_cursor": next_cursor}, status=200)
+
+@api_view(['GET'])
+def get_inbreeding(request, farm_id):
+    """Get the inbreeding coefficient of every animal in a farm"""
+    try:
+        matrix = get_relationship_matrix(farm_id)
+    except PedigreeCycleError as e:
+        return Response({"error": str(e)}, status=409)
+    coefficients = matrix.inbreeding_coefficients()
+    animals = Animal.objects.filter(farm_id=farm_id).values('id', 'name').order_by('name')
+    data = [
+        {"id": animal["id"], "name": animal["name"], "inbreeding": round(coefficients.get(animal["id"], 0.0), 6)}
+        for animal in animals
+    ]
+    return Response(data, status=200)
+
+@api_view(['GET'])
+def get_mating_relationship(request, farm_id):
+    """Get the relationship between a dam and candidate sires and the inbreeding of their offspring.
+
+    Candidates are given as comma separated animal ids in `sires` and/or AI semen codes in `semen_codes`.
+    """
+    try:
+        dam_id = int(request.query_params["dam"])
+        sire_ids = [int(sire) for sire in request.query_params.get("sires", "").split(",") if sire.strip()]
+    except (KeyError, ValueError):
+        return Response({"error": "dam and sires must be animal ids"}, status=400)
+    semen_codes = [code.strip() for code in request.query_params.get("semen_codes", "").split(",") if code.strip()]
+    if not sire_ids and not semen_codes:
+        return Response({"error": "At least one candidate sire or semen code is required"}, status=400)
+
+    names = dict(Animal.objects.filter(farm_id=farm_id, id__in=[dam_id] + sire_ids).values_list('id', 'name'))
+    missing = [animal_id for animal_id in [dam_id] + sire_ids if animal_id not in names]
+    if missing:
+        return Response({"error": f"Animals with ids:{missing} not found in farm:{farm_id}"}, status=404)
+
+    try:
+        matrix = get_relationship_matrix(farm_id, [dam_id] + sire_ids)
+    except PedigreeCycleError as e:
+        return Response({"error": str(e)}, status=409)
+    candidates = [(sire_id, {"sire": sire_id, "name": names[sire_id]}) for sire_id in sire_ids]
+    candidates += [(semen_code_key(code), {"semen_code": code}) for code in semen_codes]
+    results = []
+    for member, candidate in candidates:
+        candidate["relationship"] = round(matrix.relationship(dam_id, member), 6)
+        candidate["offspring_inbreeding"] = round(matrix.mating_inbreeding(dam_id, member), 6)
+        results.append(candidate)
+    results.sort(key=lambda candidate: candidate["offspring_inbreeding"])
+    return Response({
+        "dam": dam_id,
+        "name": names[dam_id],
+        "inbreeding": round(matrix.inbreeding(dam_id), 6),
+        "candidates": results
+    }, status=200)
+
 @api_view(['POST'])
 def add_animal(request, farm_id):
     """Add animal"""
@@ -155,6 +384,38 @@ def add_animal(request, farm_id):
         return Response(serializer.data, status=201)
     return Response(serializer.errors, status=400)
 
+@api_view(['POST'])
+def import_animals(request, farm_id):
+    """Import animals from an uploaded CSV or XLSX `file`.
+
+    Rows name their type, breed, dam and sire. Nothing is imported when a row
+    fails unless `skip_errors` is true, and `dry_run` only validates the file.
+    """
+    try:
+        farm = Farm.objects.get(id=farm_id)
+    except Farm.DoesNotExist:
+        return Response({"error": f"Farm with id:{farm_id} does not exist"}, status=404)
+    upload = request.FILES.get("file")
+    if upload is None:
+        return Response({"error": "A CSV or XLSX file is required"}, status=400)
+    try:
+        dataset = load_dataset(upload, upload.name)
+    except ValueError as e:
+        return Response({"error": str(e)}, status=400)
+
+    dry_run = str(request.data.get("dry_run", "")).lower() in ("true", "1")
+    skip_errors = str(request.data.get("skip_errors", "")).lower() in ("true", "1")
+    result = AnimalImporter(farm, request.user).run(dataset, dry_run=dry_run, skip_errors=skip_errors)
+    data = {
+        "rows": len(dataset),
+        "created": len(result.created),
+        "dry_run": dry_run,
+        "errors": result.error_list()
+    }
+    if result.created:
+        return Response(data, status=201)
+    return Response(data, status=400 if result.errors else 200)
+
 @api_view(['PUT'])
 def edit_animal(request, farm_id, id):
     """Edit animal"""
@@ -280,6 +541,100 @@ def delete_ai_record(request, farm_id, id):
     except ArtificialInsemination.DoesNotExist:
         return Response({"error": f"AI record with id:{id} not found in farm:{farm_id}"}, status=404)
 
+@api_view(['GET'])
+def get_ai_analytics(request, farm_id):
+    """Get AI conception rates, services and cost per conception by technician, semen code and breed.
+
+    Services are limited to `start` and `end` when given. The monthly trend is
+    split by one of the dimensions when `trend_by` names it.
+    """
+    if not Farm.objects.filter(id=farm_id).exists():
+        return Response({"error": f"Farm with id:{farm_id} does not exist"}, status=404)
+    params = request.query_params
+    services = ArtificialInsemination.objects.filter(farm_id=farm_id)
+    try:
+        if "start" in params:
+            services = services.filter(insemination_date__gte=date.fromisoformat(params["start"]))
+        if "end" in params:
+            services = services.filter(insemination_date__lte=date.fromisoformat(params["end"]))
+    except ValueError:
+        return Response({"error": "start and end must be dates in YYYY-MM-DD format"}, status=400)
+    trend_by = params.get("trend_by") or None
+    if trend_by is not None and trend_by not in AI_DIMENSIONS:
+        return Response({"error": f"trend_by must be one of: {', '.join(AI_DIMENSIONS)}"}, status=400)
+
+    return Response({
+        "overall": ai_summary(services),
+        **{f"by_{dimension}": ai_by_dimension(services, dimension) for dimension in AI_DIMENSIONS},
+        "monthly": ai_monthly_trend(services, trend_by),
+    }, status=200)
+
+def parse_breeding_range(params, default_start, default_days):
+    """Read the start, end and kinds query parameters of the breeding calendar, raising ValueError"""
+    try:
+        start_date = date.fromisoformat(params["start"]) if "start" in params else default_start
+        end_date = date.fromisoformat(params["end"]) if "end" in params else start_date + timedelta(days=default_days)
+    except ValueError:
+        raise ValueError("start and end must be dates in YYYY-MM-DD format")
+    if start_date > end_date:
+        raise ValueError("start must be on or before end")
+    kinds = None
+    if params.get("kinds"):
+        kinds = [kind.strip() for kind in params["kinds"].split(",") if kind.strip()]
+        valid = [kind for kind, label in BreedingEvent.KINDS]
+        unknown = [kind for kind in kinds if kind not in valid]
+        if unknown:
+            raise ValueError(f"Unknown event kinds: {', '.join(unknown)}, use {', '.join(valid)}")
+    return start_date, end_date, kinds
+
+@api_view(['GET'])
+def get_breeding_calendar(request, farm_id):
+    """Get the breeding events between `start` and `end`, the next 30 days by default, and the overdue pregnancy checks"""
+    if not Farm.objects.filter(id=farm_id).exists():
+        return Response({"error": f"Farm with id:{farm_id} does not exist"}, status=404)
+    today = date.today()
+    try:
+        start_date, end_date, kinds = parse_breeding_range(request.query_params, today, 30)
+    except ValueError as e:
+        return Response({"error": str(e)}, status=400)
+    events = get_breeding_events(farm_id, start_date, end_date, kinds)
+    overdue = get_overdue_pregnancy_checks(farm_id, today)
+    return Response({
+        "events": BreedingEventSerializer(events, many=True).data,
+        "overdue_pregnancy_checks": BreedingEventSerializer(overdue, many=True).data,
+    }, status=200)
+
+@api_view(['GET'])
+def get_breeding_calendar_feed(request, farm_id):
+    """Get the URL calendar apps subscribe to for the farm's breeding calendar"""
+    if not Farm.objects.filter(id=farm_id).exists():
+        return Response({"error": f"Farm with id:{farm_id} does not exist"}, status=404)
+    path = reverse("get_breeding_calendar_ical", args=[farm_id])
+    return Response({"url": request.build_absolute_uri(f"{path}?token={calendar_feed_token(farm_id)}")}, status=200)
+
+@api_view(['GET'])
+@authentication_classes([])
+@permission_classes([])
+def get_breeding_calendar_ical(request, farm_id):
+    """Get the breeding events from 30 days ago to a year ahead, or between `start` and `end`, as an iCalendar file.
+
+    Authenticated by the `token` of the URL given by get_breeding_calendar_feed, as calendar apps send no bearer token.
+    """
+    if not check_calendar_feed_token(farm_id, request.query_params.get("token", "")):
+        return Response({"error": "A valid calendar feed token is required"}, status=403)
+    try:
+        farm = Farm.objects.get(id=farm_id)
+    except Farm.DoesNotExist:
+        return Response({"error": f"Farm with id:{farm_id} does not exist"}, status=404)
+    try:
+        start_date, end_date, kinds = parse_breeding_range(request.query_params, date.today() - timedelta(days=30), 395)
+    except ValueError as e:
+        return Response({"error": str(e)}, status=400)
+    events = get_breeding_events(farm_id, start_date, end_date, kinds)
+    response = HttpResponse(render_ical(events, f"{farm.name} breeding calendar"), content_type="text/calendar; charset=utf-8")
+    response["Content-Disposition"] = f'attachment; filename="breeding-calendar-{farm_id}.ics"'
+    return response
+
 @api_view(['PUT'])
 def set_ai_sire(request, animal_id):
     """Set AI sire for an animal"""
@@ -11,5 +11,8 @@ python manage.py collectstatic --no-input
 # Apply any outstanding database migrations
 python manage.py migrate
 
+# Create the database cache table (no-op if it already exists)
+python manage.py createcachetable
+
 # Create a super user
 python manage.py createsuperuser
\ No newline at end of file
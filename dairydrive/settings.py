@@ -106,6 +106,27 @@ DATABASES = {
     )
 }
 
+# Cache
+# Shared by all gunicorn/uvicorn workers: Redis when REDIS_URL is set, the database otherwise
+# (run `python manage.py createcachetable` for the database backend)
+if os.environ.get('REDIS_URL'):
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': os.environ['REDIS_URL'],
+        }
+    }
+else:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.db.DatabaseCache',
+            'LOCATION': 'dairydrive_cache',
+        }
+    }
+
+# Lifetime of cached farm responses, entries are invalidated early by the farm data version
+FARM_RESPONSE_CACHE_TIMEOUT = 60 * 60 * 24
+
 # Password validation
 # https://docs.djangoproject.com/en/4.2/ref/settings/#auth-password-validators
 
@@ -1,5 +1,5 @@
 from django.contrib import admin
-from .models import Farm, Transaction, Equipment, Expense, EquipmentPurchase, ExpenseCategory
+from .models import Farm, Transaction, Equipment, Expense, EquipmentPurchase, ExpenseCategory, FarmDailyLedger
 from import_export.admin import ImportExportModelAdmin
 
 
@@ -67,3 +67,10 @@ class TransactionAdmin(ImportExportModelAdmin):
     search_fields = ('description', 'farm__name', 'transaction_code')
     date_hierarchy = 'created_at'
     readonly_fields = ('transaction_code', 'created_at', 'updated_at')
+
+@admin.register(FarmDailyLedger)
+class FarmDailyLedgerAdmin(admin.ModelAdmin):
+    list_display = ('farm', 'date', 'category', 'amount', 'entries', 'updated_at')
+    list_filter = ('category', 'farm')
+    date_hierarchy = 'date'
+    readonly_fields = ('farm', 'date', 'category', 'amount', 'entries', 'updated_at')
@@ -4,3 +4,9 @@ from django.apps import AppConfig
 class FarmsConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'farms'
+
+    def ready(self):
+        from .ledger import connect_ledger_signals
+        from .cache import connect_cache_signals
+        connect_ledger_signals()
+        connect_cache_signals()
@@ -0,0 +1,168 @@
+"""Per-farm versioned response cache.
+
+Each farm has a data version token stored in the shared cache. Any write to
+the farm itself or to one of its finance, feed, health or product records
+replaces the token once the surrounding transaction commits, so cached
+responses are keyed on data that can never be stale: a new token simply
+makes the old entries unreachable until they expire.
+
+Responses also show the names of the users who created records, so a user
+or profile write replaces the tokens of the farms the user belongs to or
+created.
+
+Tokens are replaced from model signals, which queryset update() and
+bulk_create() do not send. Code writing farm data that way must call
+bump_data_version itself, as the milking session ingest does.
+"""
+import hashlib
+import uuid
+from functools import wraps
+from urllib.parse import urlencode
+from django.apps import apps
+from django.conf import settings
+from django.core.cache import cache
+from django.core.exceptions import ObjectDoesNotExist
+from django.db.models import Q
+from django.db.models.signals import post_save, post_delete, pre_delete
+from django.utils import timezone
+from rest_framework.response import Response
+from .transactions import on_commit_collect
+
+# Models whose writes invalidate a farm's cached responses, with the
+# attribute path leading from an instance to its farm id
+FARM_DATA_MODELS = {
+    'farms.Farm': 'id',
+    'farms.Transaction': 'farm_id',
+    'farms.Expense': 'farm_id',
+    'farms.ExpenseCategory': 'farm_id',
+    'farms.Equipment': 'farm_id',
+    'farms.EquipmentPurchase': 'farm_id',
+    'feeds.AnimalFeedType': 'farm_id',
+    'feeds.AnimalFeed': 'farm_id',
+    'feeds.AnimalFeedEntry': 'farm_id',
+    'feeds.AnimalFeedPurchase': 'farm_id',
+    'health.Veterinarian': 'farm_id',
+    'health.HealthCondition': 'farm_id',
+    'health.VetService': 'farm_id',
+    'health.HealthRecord': 'animal.farm_id',
+    'health.Treatment': 'health_record.animal.farm_id',
+    'products.Product': 'farm_id',
+    'products.ProductionRecord': 'farm_id',
+    'products.Buyer': 'farm_id',
+    'products.Sale': 'farm_id',
+}
+
+# Models whose writes change the user names shown in cached responses,
+# with the attribute path leading from an instance to its user
+USER_DATA_MODELS = {
+    'auth.User': 'id',
+    'users.UserProfile': 'user_id',
+}
+
+
+def data_version_key(farm_id):
+    return f'farm:{farm_id}:data_version'
+
+
+def get_version_token(key):
+    """Return the version token stored under key, creating one if needed"""
+    version = cache.get(key)
+    if version is None:
+        cache.add(key, uuid.uuid4().hex, timeout=None)
+        version = cache.get(key)
+    return version
+
+
+def bump_version_token(key):
+    """Replace the version token stored under key.
+
+    A fresh random token is written instead of incrementing a counter so that
+    concurrent writers never need a read-modify-write on the cache.
+    """
+    cache.set(key, uuid.uuid4().hex, timeout=None)
+
+
+def get_data_version(farm_id):
+    """Return the current data version token of a farm"""
+    return get_version_token(data_version_key(farm_id))
+
+
+def bump_data_version(farm_id):
+    """Invalidate every cached response of a farm"""
+    bump_version_token(data_version_key(farm_id))
+
+
+def bump_data_versions(farm_ids):
+    for farm_id in farm_ids:
+        bump_data_version(farm_id)
+
+
+def get_instance_farm_id(instance, path):
+    value = instance
+    for attr in path.split('.'):
+        if value is None:
+            return None
+        value = getattr(value, attr)
+    return value
+
+
+def record_changed(sender, instance, **kwargs):
+    try:
+        farm_id = get_instance_farm_id(instance, FARM_DATA_MODELS[sender._meta.label])
+    except ObjectDoesNotExist:
+        return
+    if farm_id is not None:
+        # A transaction writing many rows of a farm bumps its version once
+        on_commit_collect('farm_data_version', [farm_id], bump_data_versions)
+
+
+def get_user_farm_ids(user_id):
+    """Ids of the farms a user belongs to or created"""
+    Farm = apps.get_model('farms.Farm')
+    return set(Farm.objects.filter(Q(userprofile__user_id=user_id) | Q(created_by_id=user_id)).values_list('id', flat=True))
+
+
+def user_changed(sender, instance, update_fields=None, **kwargs):
+    # Logins save the user's last_login only, which no response shows
+    if update_fields is not None and set(update_fields) == {'last_login'}:
+        return
+    farm_ids = get_user_farm_ids(get_instance_farm_id(instance, USER_DATA_MODELS[sender._meta.label]))
+    if farm_ids:
+        on_commit_collect('farm_data_version', farm_ids, bump_data_versions)
+
+
+def connect_cache_signals():
+    for model_label in FARM_DATA_MODELS:
+        model = apps.get_model(model_label)
+        uid = f'farm_response_cache_{model_label}'
+        post_save.connect(record_changed, sender=model, dispatch_uid=uid)
+        post_delete.connect(record_changed, sender=model, dispatch_uid=uid)
+    for model_label in USER_DATA_MODELS:
+        model = apps.get_model(model_label)
+        uid = f'farm_response_cache_{model_label}'
+        post_save.connect(user_changed, sender=model, dispatch_uid=uid)
+        # Before the delete, while the user's memberships still exist
+        pre_delete.connect(user_changed, sender=model, dispatch_uid=uid)
+
+
+def cache_farm_response(endpoint):
+    """Cache successful responses of a farm view per endpoint, query parameters and data version"""
+    def decorator(view_func):
+        @wraps(view_func)
+        def _wrapped_view(request, farm_id, *args, **kwargs):
+            params = urlencode(sorted(request.GET.lists()), doseq=True)
+            # Today's date is part of the key because default date windows move with it
+            key = 'farm:{}:{}:{}:{}:{}'.format(
+                farm_id, endpoint, get_data_version(farm_id),
+                timezone.now().date().isoformat(), hashlib.md5(params.encode()).hexdigest()
+            )
+            data = cache.get(key)
+            if data is not None:
+                return Response(data)
+
+            response = view_func(request, farm_id, *args, **kwargs)
+            if response.status_code == 200:
+                cache.set(key, response.data, settings.FARM_RESPONSE_CACHE_TIMEOUT)
+            return response
+        return _wrapped_view
+    return decorator
@@ -0,0 +1,183 @@
+"""Maintenance of the FarmDailyLedger rollup.
+
+Every ledger category is described by a LedgerSource: the model it is
+summed from, the lookups that lead to its farm and day, and the amount
+field. Writes to a source model refresh the (farm, day, category) rows they
+touch by re-aggregating that single day, so edits that move a record to
+another day, farm or transaction type stay correct without tracking deltas.
+Sources sharing a category, such as live and archived treatments, are
+summed into the same row.
+"""
+from collections import namedtuple
+from decimal import Decimal
+from django.apps import apps as global_apps
+from django.db import transaction
+from django.db.models import Sum, Count, F
+from django.db.models.signals import pre_save, post_save, pre_delete, post_delete
+
+LedgerSource = namedtuple('LedgerSource', ['category', 'model', 'farm_lookup', 'date_lookup', 'amount_field', 'filters'])
+
+LEDGER_SOURCES = [
+    LedgerSource('sales', 'products.Sale', 'farm', 'date', 'total_amount', {}),
+    LedgerSource('incoming_transactions', 'farms.Transaction', 'farm', 'transaction_date__date', 'amount',
+                 {'transaction_type': 'incoming'}),
+    LedgerSource('outgoing_transactions', 'farms.Transaction', 'farm', 'transaction_date__date', 'amount',
+                 {'transaction_type': 'outgoing'}),
+    LedgerSource('expenses', 'farms.Expense', 'farm', 'due_date', 'amount', {}),
+    LedgerSource('treatments', 'health.Treatment', 'health_record__animal__farm', 'treatment_date', 'cost', {}),
+    LedgerSource('treatments', 'animals.ArchivedRecord', 'archived_animal__farm', 'date', 'amount',
+                 {'kind': 'treatment'}),
+    LedgerSource('equipment_purchases', 'farms.EquipmentPurchase', 'farm', 'purchase_date', 'total_cost', {}),
+    LedgerSource('feed_purchases', 'feeds.AnimalFeedPurchase', 'farm', 'date', 'cost', {'is_deleted': False}),
+    LedgerSource('feed_consumption', 'feeds.AnimalFeedEntry', 'farm', 'feed_date', 'total_cost', {'is_deleted': False}),
+]
+
+
+def get_sources(model_label=None):
+    if model_label is None:
+        return LEDGER_SOURCES
+    return [source for source in LEDGER_SOURCES if source.model == model_label]
+
+
+def source_queryset(source, apps=global_apps):
+    return apps.get_model(source.model)._default_manager.filter(**source.filters)
+
+
+def get_ledger_keys(model, pk, sources):
+    """Return the (farm_id, day) pairs a stored record contributes to, read from the database"""
+    row = model._default_manager.filter(pk=pk).values(
+        *{source.farm_lookup for source in sources}, *{source.date_lookup for source in sources}
+    ).first()
+    if row is None:
+        return set()
+    keys = set()
+    for source in sources:
+        if row[source.farm_lookup] is not None and row[source.date_lookup] is not None:
+            keys.add((row[source.farm_lookup], row[source.date_lookup]))
+    return keys
+
+
+def get_category_sources(sources):
+    """Every source of the categories fed by sources, as {category: [source]}"""
+    categories = {source.category for source in sources}
+    category_sources = {}
+    for source in LEDGER_SOURCES:
+        if source.category in categories:
+            category_sources.setdefault(source.category, []).append(source)
+    return category_sources
+
+
+def refresh_ledger_day(farm_id, day, sources=LEDGER_SOURCES):
+    """Recompute the ledger rows of one farm and day from the source tables"""
+    from .models import FarmDailyLedger
+
+    for category, category_sources in get_category_sources(sources).items():
+        amount, entries = Decimal('0'), 0
+        for source in category_sources:
+            totals = source_queryset(source).filter(**{
+                source.farm_lookup: farm_id,
+                source.date_lookup: day
+            }).aggregate(amount=Sum(source.amount_field), entries=Count('pk'))
+            amount += totals['amount'] or 0
+            entries += totals['entries']
+
+        if entries:
+            FarmDailyLedger.objects.update_or_create(
+                farm_id=farm_id, date=day, category=category,
+                defaults={'amount': amount, 'entries': entries}
+            )
+        else:
+            FarmDailyLedger.objects.filter(farm_id=farm_id, date=day, category=category).delete()
+
+
+def compute_ledger_rows(farm_ids=None, apps=global_apps):
+    """Aggregate the source tables into {(farm_id, day, category): (amount, entries)}"""
+    rows = {}
+    for source in LEDGER_SOURCES:
+        try:
+            queryset = source_queryset(source, apps)
+        except LookupError:
+            # Sources added after a historical migration state have no rows yet
+            continue
+        queryset = queryset.exclude(**{f'{source.date_lookup}__isnull': True})
+        if farm_ids is not None:
+            queryset = queryset.filter(**{f'{source.farm_lookup}__in': farm_ids})
+        totals = queryset.values(
+            ledger_farm=F(source.farm_lookup), ledger_date=F(source.date_lookup)
+        ).annotate(amount=Sum(source.amount_field), entries=Count('pk')).order_by()
+        for total in totals:
+            key = (total['ledger_farm'], total['ledger_date'], source.category)
+            amount, entries = rows.get(key, (Decimal('0'), 0))
+            rows[key] = (amount + (total['amount'] or Decimal('0')), entries + total['entries'])
+    return rows
+
+
+def rebuild_ledger(farm_ids=None, apps=global_apps, batch_size=1000):
+    """Replace the ledger rows of the given farms (or all farms) with freshly aggregated ones"""
+    FarmDailyLedger = apps.get_model('farms', 'FarmDailyLedger')
+    rows = compute_ledger_rows(farm_ids, apps)
+    with transaction.atomic():
+        existing = FarmDailyLedger.objects.all()
+        if farm_ids is not None:
+            existing = existing.filter(farm_id__in=farm_ids)
+        existing.delete()
+        FarmDailyLedger.objects.bulk_create([
+            FarmDailyLedger(farm_id=farm_id, date=day, category=category, amount=amount, entries=entries)
+            for (farm_id, day, category), (amount, entries) in rows.items()
+        ], batch_size=batch_size)
+    return len(rows)
+
+
+def verify_ledger(farm_ids=None):
+    """Compare the stored ledger with the source tables and return the mismatching keys.
+
+    Each mismatch is (farm_id, day, category, stored, expected) where stored and
+    expected are (amount, entries) pairs or None when the row is missing.
+    """
+    from .models import FarmDailyLedger
+
+    expected = compute_ledger_rows(farm_ids)
+    stored_rows = FarmDailyLedger.objects.all()
+    if farm_ids is not None:
+        stored_rows = stored_rows.filter(farm_id__in=farm_ids)
+    stored = {
+        (row['farm_id'], row['date'], row['category']): (row['amount'], row['entries'])
+        for row in stored_rows.values('farm_id', 'date', 'category', 'amount', 'entries')
+    }
+
+    mismatches = []
+    for key in sorted(set(expected) | set(stored), key=lambda key: (key[0], key[1], key[2])):
+        if expected.get(key) != stored.get(key):
+            mismatches.append((*key, stored.get(key), expected.get(key)))
+    return mismatches
+
+
+def capture_ledger_keys(sender, instance, **kwargs):
+    """Remember which ledger days the record belonged to before it is changed"""
+    sources = get_sources(sender._meta.label)
+    instance._ledger_keys = get_ledger_keys(sender, instance.pk, sources) if instance.pk else set()
+
+
+def update_ledger_after_save(sender, instance, **kwargs):
+    sources = get_sources(sender._meta.label)
+    keys = getattr(instance, '_ledger_keys', set()) | get_ledger_keys(sender, instance.pk, sources)
+    for farm_id, day in keys:
+        refresh_ledger_day(farm_id, day, sources)
+    instance._ledger_keys = set()
+
+
+def update_ledger_after_delete(sender, instance, **kwargs):
+    sources = get_sources(sender._meta.label)
+    for farm_id, day in getattr(instance, '_ledger_keys', set()):
+        refresh_ledger_day(farm_id, day, sources)
+    instance._ledger_keys = set()
+
+
+def connect_ledger_signals():
+    for model_label in {source.model for source in LEDGER_SOURCES}:
+        model = global_apps.get_model(model_label)
+        uid = f'farm_daily_ledger_{model_label}'
+        pre_save.connect(capture_ledger_keys, sender=model, dispatch_uid=uid)
+        post_save.connect(update_ledger_after_save, sender=model, dispatch_uid=uid)
+        pre_delete.connect(capture_ledger_keys, sender=model, dispatch_uid=uid)
+        post_delete.connect(update_ledger_after_delete, sender=model, dispatch_uid=uid)
@@ -0,0 +1,65 @@
+from django.core.management.base import BaseCommand
+from farms.models import Farm
+from farms.ledger import rebuild_ledger, verify_ledger
+
+
+class Command(BaseCommand):
+    help = 'Backfill or verify the per-farm daily financial ledger'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--farm-id',
+            type=int,
+            help='Specific farm ID to rebuild or verify',
+        )
+        parser.add_argument(
+            '--all-farms',
+            action='store_true',
+            help='Rebuild or verify the ledger of all farms',
+        )
+        parser.add_argument(
+            '--verify',
+            action='store_true',
+            help='Only compare the ledger with the source tables and report differences',
+        )
+
+    def handle(self, *args, **options):
+        if options['farm_id']:
+            if not Farm.objects.filter(id=options['farm_id']).exists():
+                self.stdout.write(
+                    self.style.ERROR(f'Farm with ID {options["farm_id"]} does not exist')
+                )
+                return
+            farm_ids = [options['farm_id']]
+        elif options['all_farms']:
+            farm_ids = None
+        else:
+            self.stdout.write(
+                self.style.WARNING('Please specify --farm-id or --all-farms')
+            )
+            return
+
+        if options['verify']:
+            self.verify(farm_ids)
+        else:
+            row_count = rebuild_ledger(farm_ids)
+            self.stdout.write(
+                self.style.SUCCESS(f'Successfully rebuilt {row_count} ledger rows')
+            )
+
+    def verify(self, farm_ids):
+        """Report ledger rows that differ from the source tables"""
+        mismatches = verify_ledger(farm_ids)
+        for farm_id, day, category, stored, expected in mismatches:
+            self.stdout.write(
+                f'Farm {farm_id} {day} {category}: stored {stored}, expected {expected}'
+            )
+
+        if mismatches:
+            self.stdout.write(
+                self.style.ERROR(f'Found {len(mismatches)} mismatching ledger rows, run without --verify to rebuild')
+            )
+        else:
+            self.stdout.write(
+                self.style.SUCCESS('Ledger matches the source tables')
+            )
@@ -0,0 +1,30 @@
+# Generated by Django 4.2.13 on 2026-10-18 11:47
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('farms', '0012_farm_max_users'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='FarmDailyLedger',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField()),
+                ('category', models.CharField(choices=[('sales', 'Sales Revenue'), ('incoming_transactions', 'Incoming Transactions'), ('outgoing_transactions', 'Outgoing Transactions'), ('expenses', 'Expenses'), ('treatments', 'Treatment Costs'), ('equipment_purchases', 'Equipment Purchases'), ('feed_purchases', 'Feed Purchases'), ('feed_consumption', 'Feed Consumption')], max_length=30)),
+                ('amount', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('entries', models.PositiveIntegerField(default=0)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('farm', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='daily_ledger', to='farms.farm')),
+            ],
+            options={
+                'ordering': ['-date', 'category'],
+                'unique_together': {('farm', 'date', 'category')},
+            },
+        ),
+    ]
@@ -0,0 +1,22 @@
+# Generated by Django 4.2.13 on 2026-10-18 11:52
+
+from django.db import migrations
+
+
+def backfill_ledger(apps, schema_editor):
+    from farms.ledger import rebuild_ledger
+    rebuild_ledger(apps=apps)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('farms', '0013_farmdailyledger'),
+        ('products', '0004_alter_product_inventory'),
+        ('health', '0005_alter_treatment_transactions'),
+        ('feeds', '0013_remove_animalfeedpurchase_transactions'),
+    ]
+
+    operations = [
+        migrations.RunPython(backfill_ledger, migrations.RunPython.noop),
+    ]
@@ -228,4 +228,31 @@ class Expense(models.Model):
         # Update payment status based on due date
         if self.due_date < timezone.now().date():
             self.payment_status = 'overdue'
-        super().save(*args, **kwargs)
\ No newline at end of file
+        super().save(*args, **kwargs)
+
+class FarmDailyLedger(models.Model):
+    """Daily financial rollup per farm and category, kept current by farms.ledger"""
+    CATEGORIES = [
+        ('sales', 'Sales Revenue'),
+        ('incoming_transactions', 'Incoming Transactions'),
+        ('outgoing_transactions', 'Outgoing Transactions'),
+        ('expenses', 'Expenses'),
+        ('treatments', 'Treatment Costs'),
+        ('equipment_purchases', 'Equipment Purchases'),
+        ('feed_purchases', 'Feed Purchases'),
+        ('feed_consumption', 'Feed Consumption'),
+    ]
+
+    farm = models.ForeignKey(Farm, on_delete=models.CASCADE, related_name='daily_ledger')
+    date = models.DateField()
+    category = models.CharField(max_length=30, choices=CATEGORIES)
+    amount = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    entries = models.PositiveIntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"{self.farm.name} - {self.date} - {self.category}: {self.amount}"
+
+    class Meta:
+        ordering = ['-date', 'category']
+        unique_together = ['farm', 'date', 'category']
@@ -0,0 +1,99 @@
+"""Keyset pagination for querysets ordered on non-null fields.
+
+A page is fetched by filtering on the sort key of the last row of the
+previous page instead of an OFFSET, so every page costs one index range
+scan however deep the client has scrolled. The sort key travels to the
+client as an opaque cursor.
+"""
+import base64
+import json
+from functools import reduce
+from django.core.exceptions import ValidationError
+from django.db.models import Q
+
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 200
+
+
+class InvalidCursor(ValueError):
+    pass
+
+
+def encode_cursor(ordering, values):
+    data = json.dumps({'o': ordering, 'v': values}, default=str, separators=(',', ':'))
+    return base64.urlsafe_b64encode(data.encode()).decode()
+
+
+def read_cursor(cursor, ordering):
+    """Return the sort key values stored in a cursor as they were serialized"""
+    try:
+        data = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+        stored_ordering, values = data['o'], data['v']
+    except (ValueError, KeyError, TypeError) as e:
+        raise InvalidCursor('Invalid cursor') from e
+    if stored_ordering != ordering or not isinstance(values, list) or len(values) != len(ordering):
+        raise InvalidCursor('The cursor does not belong to this ordering')
+    return values
+
+
+def decode_cursor(cursor, ordering, model):
+    """Return the sort key values stored in a cursor, converted to python values"""
+    values = read_cursor(cursor, ordering)
+    try:
+        return [
+            model._meta.get_field(field.lstrip('-')).to_python(value)
+            for field, value in zip(ordering, values)
+        ]
+    except ValidationError as e:
+        raise InvalidCursor('Invalid cursor') from e
+
+
+def keyset_filter(ordering, values):
+    """Q selecting the rows that sort after values in ordering.
+
+    For ordering [a, -b, id] this is
+    a > va OR (a = va AND b < vb) OR (a = va AND b = vb AND id > vid).
+    """
+    conditions = []
+    for position, field in enumerate(ordering):
+        name = field.lstrip('-')
+        lookup = 'lt' if field.startswith('-') else 'gt'
+        equal = {f.lstrip('-'): value for f, value in zip(ordering[:position], values[:position])}
+        conditions.append(Q(**equal, **{f'{name}__{lookup}': values[position]}))
+    return reduce(lambda left, right: left | right, conditions)
+
+
+def get_page_size(value, default=DEFAULT_PAGE_SIZE, maximum=MAX_PAGE_SIZE):
+    """Parse a page size query parameter, raising ValueError when it is out of range"""
+    if value in (None, ''):
+        return default
+    try:
+        size = int(value)
+    except ValueError:
+        raise ValueError('limit must be a number')
+    if size < 1 or size > maximum:
+        raise ValueError(f'limit must be between 1 and {maximum}')
+    return size
+
+
+def paginate_keyset(queryset, ordering, cursor=None, limit=DEFAULT_PAGE_SIZE):
+    """Return (rows, next_cursor) for the page of queryset following cursor.
+
+    ordering must end with a unique field, usually 'id' or '-id', so every
+    row has a distinct sort key. next_cursor is None on the last page.
+    """
+    queryset = queryset.order_by(*ordering)
+    if cursor:
+        queryset = queryset.filter(keyset_filter(ordering, decode_cursor(cursor, ordering, queryset.model)))
+
+    rows = list(queryset[:limit + 1])
+    if len(rows) <= limit:
+        return rows, None
+
+    rows = rows[:limit]
+    last = rows[-1]
+    values = [
+        last[field.lstrip('-')] if isinstance(last, dict) else getattr(last, field.lstrip('-'))
+        for field in ordering
+    ]
+    return rows, encode_cursor(ordering, values)
@@ -0,0 +1,126 @@
+"""Fuzzy search across the records staff look up by name, code or phone number.
+
+On PostgreSQL every searched column has a pg_trgm GIN index on its UPPER()
+value, created by the search_trigram_indexes migration of the column's app,
+and a row matches when the query is word-similar to a column (the `%>`
+operator) or is contained in it (icontains, an UPPER() LIKE). Both are
+answered from the trigram indexes, and rows are ranked by their best
+WORD_SIMILARITY, which ignores case.
+
+Other databases, SQLite in development and tests, score the farm's rows in
+Python with the same trigram rules, which is fine for small data sets.
+"""
+import re
+from collections import namedtuple
+from functools import reduce
+from django.apps import apps
+from django.contrib.postgres.lookups import TrigramWordSimilar
+from django.contrib.postgres.search import TrigramWordSimilarity
+from django.db import connection
+from django.db.models import F, Q
+from django.db.models.functions import Greatest, Upper
+
+# pg_trgm's default pg_trgm.word_similarity_threshold
+WORD_SIMILARITY_THRESHOLD = 0.6
+
+DEFAULT_SEARCH_LIMIT = 20
+MAX_SEARCH_LIMIT = 100
+
+SearchSource = namedtuple('SearchSource', ['kind', 'model', 'fields', 'label_field'])
+
+SEARCH_SOURCES = [
+    SearchSource('animal', 'animals.Animal', ('name', 'description'), 'name'),
+    SearchSource('buyer', 'products.Buyer', ('name', 'contact_person', 'phone'), 'name'),
+    SearchSource('transaction', 'farms.Transaction', ('transaction_code', 'description'), 'transaction_code'),
+    SearchSource('veterinarian', 'health.Veterinarian', ('name',), 'name'),
+]
+
+SEARCH_KINDS = [source.kind for source in SEARCH_SOURCES]
+
+
+def get_trigrams(text):
+    """Ordered trigrams of text as pg_trgm extracts them: per lower-cased word, padded with two spaces before and one after"""
+    trigrams = []
+    for word in re.findall(r'[^\W_]+', text.lower()):
+        padded = f'  {word} '
+        trigrams.extend(padded[i:i + 3] for i in range(len(padded) - 2))
+    return trigrams
+
+
+def word_similarity(query, text):
+    """Python counterpart of pg_trgm's word_similarity(query, text).
+
+    The greatest share of the query's trigrams found in any continuous extent
+    of the text's trigrams, where trigrams of the extent that are not in the
+    query count against it.
+    """
+    query_trigrams = set(get_trigrams(query))
+    if not query_trigrams or not text:
+        return 0.0
+    text_trigrams = get_trigrams(text)
+    best = 0.0
+    for start in range(len(text_trigrams)):
+        found, extra = set(), set()
+        for trigram in text_trigrams[start:]:
+            if trigram in query_trigrams:
+                found.add(trigram)
+            else:
+                extra.add(trigram)
+            best = max(best, len(found) / (len(query_trigrams) + len(extra)))
+            if best == 1.0:
+                return best
+    return best
+
+
+def get_sources(kinds=None):
+    return [source for source in SEARCH_SOURCES if kinds is None or source.kind in kinds]
+
+
+def search_source_postgres(source, farm_id, query, limit):
+    model = apps.get_model(source.model)
+    # Every expression is on UPPER(field), the expression the trigram indexes are built on
+    matches = reduce(lambda left, right: left | right, [
+        Q(TrigramWordSimilar(Upper(field), query)) | Q(**{f'{field}__icontains': query})
+        for field in source.fields
+    ])
+    similarities = [TrigramWordSimilarity(query, Upper(field)) for field in source.fields]
+    score = Greatest(*similarities) if len(similarities) > 1 else similarities[0]
+    rows = model.objects.filter(matches, farm_id=farm_id).annotate(
+        score=score, label=F(source.label_field)
+    ).order_by('-score', 'id').values('id', 'label', 'score')[:limit]
+    return [dict(row, kind=source.kind, score=row['score'] or 0.0) for row in rows]
+
+
+def search_source_python(source, farm_id, query, limit):
+    model = apps.get_model(source.model)
+    lowered = query.lower()
+    results = []
+    for row in model.objects.filter(farm_id=farm_id).values('id', source.label_field, *source.fields):
+        values = [row[field] or '' for field in source.fields]
+        score = max(word_similarity(query, value) for value in values)
+        if score >= WORD_SIMILARITY_THRESHOLD or any(lowered in value.lower() for value in values):
+            results.append({'id': row['id'], 'label': row[source.label_field], 'score': score, 'kind': source.kind})
+    results.sort(key=lambda result: (-result['score'], result['id']))
+    return results[:limit]
+
+
+def search_farm(farm_id, query, kinds=None, limit=DEFAULT_SEARCH_LIMIT):
+    """Search a farm's records, best matches first, as [{kind, id, label, score}]"""
+    query = query.strip()
+    if not query:
+        return []
+    if connection.vendor == 'postgresql':
+        search_source = search_source_postgres
+    else:
+        search_source = search_source_python
+
+    results = []
+    for source in get_sources(kinds):
+        results.extend(search_source(source, farm_id, query, limit))
+    results.sort(key=lambda result: (-result['score'], SEARCH_KINDS.index(result['kind']), result['id']))
+    for result in results:
+        result['score'] = round(result['score'], 4)
+    return [
+        {'kind': result['kind'], 'id': result['id'], 'label': result['label'], 'score': result['score']}
+        for result in results[:limit]
+    ]
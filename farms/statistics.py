@@ -0,0 +1,301 @@
+import calendar
+from datetime import date, timedelta
+from django.db.models import Sum, Q, DateField
+from django.db.models.functions import Trunc
+from django.utils import timezone
+from .models import FarmDailyLedger
+
+
+REVENUE_CATEGORIES = ['sales', 'incoming_transactions']
+COST_CATEGORIES = [
+    'expenses', 'treatments', 'equipment_purchases', 'feed_purchases', 'feed_consumption', 'outgoing_transactions'
+]
+
+# Bucket sizes of the time series endpoint, as calendar months where applicable
+GRANULARITIES = {
+    'day': None,
+    'week': None,
+    'month': 1,
+    'quarter': 3,
+    'year': 12,
+}
+
+# Upper bound on the number of buckets a single time series may return
+MAX_TIME_SERIES_BUCKETS = 5000
+
+
+def add_months(day, months):
+    """Shift a date by a number of calendar months, clamping the day to the target month"""
+    month_index = day.month - 1 + months
+    year = day.year + month_index // 12
+    month = month_index % 12 + 1
+    return day.replace(year=year, month=month, day=min(day.day, calendar.monthrange(year, month)[1]))
+
+
+def month_bounds(day):
+    """Return the first and last day of the month containing day"""
+    return day.replace(day=1), day.replace(day=calendar.monthrange(day.year, day.month)[1])
+
+
+def get_statistics_buckets(start_date, end_date, current_date):
+    """Return every reporting window of the statistics dashboard as {name: (start, end)}"""
+    buckets = {'period': (start_date, end_date)}
+
+    # Last 7 days, oldest first
+    week_start = current_date - timedelta(days=6)
+    for i in range(7):
+        day_date = week_start + timedelta(days=i)
+        buckets[f'day_{i}'] = (day_date, day_date)
+
+    # Last 8 full weeks (Monday to Sunday), most recent first
+    for i in range(8):
+        week_start_date = current_date - timedelta(weeks=i+1, days=current_date.weekday())
+        buckets[f'week_{i}'] = (week_start_date, week_start_date + timedelta(days=6))
+
+    # Last 6 calendar months, current month first
+    for i in range(6):
+        buckets[f'month_{i}'] = month_bounds(add_months(current_date.replace(day=1), -i))
+
+    buckets['this_year'] = (date(current_date.year, 1, 1), date(current_date.year, 12, 31))
+    buckets['last_year'] = (date(current_date.year - 1, 1, 1), date(current_date.year - 1, 12, 31))
+    return buckets
+
+
+def sum_ledger_by_bucket(farm, buckets):
+    """Total every ledger category for every bucket in a single query using conditional aggregation.
+
+    Returns {category: {bucket: total}}. The ledger is first narrowed to the
+    span covering all buckets so only the relevant daily rows are read.
+    """
+    lower = min(start for start, end in buckets.values())
+    upper = max(end for start, end in buckets.values())
+    categories = [category for category, label in FarmDailyLedger.CATEGORIES]
+    totals = FarmDailyLedger.objects.filter(farm=farm, date__range=[lower, upper]).aggregate(**{
+        f'{category}_{name}': Sum('amount', filter=Q(category=category, date__range=[start, end]))
+        for category in categories
+        for name, (start, end) in buckets.items()
+    })
+    return {
+        category: {name: totals[f'{category}_{name}'] or 0 for name in buckets}
+        for category in categories
+    }
+
+
+def percentage(part, whole):
+    return float((part / whole * 100) if whole > 0 else 0)
+
+
+def summarize(revenue, costs):
+    return {
+        'revenue': float(revenue),
+        'costs': float(costs),
+        'net': float(revenue - costs)
+    }
+
+
+def build_farm_statistics(farm, start_date, end_date, current_date=None):
+    """Build the farm statistics document.
+
+    All figures come from the FarmDailyLedger rollup in one query: the selected
+    period and every daily, weekly, monthly and yearly window are computed
+    together with one conditional Sum per category and window.
+    """
+    if current_date is None:
+        current_date = timezone.now().date()
+
+    buckets = get_statistics_buckets(start_date, end_date, current_date)
+    totals = sum_ledger_by_bucket(farm, buckets)
+    sales = totals['sales']
+    expenses = totals['expenses']
+    treatments = totals['treatments']
+    equipment = totals['equipment_purchases']
+    feed_purchases = totals['feed_purchases']
+    feed_consumption = totals['feed_consumption']['period']
+    income_transactions = totals['incoming_transactions']['period']
+    expense_transactions = totals['outgoing_transactions']['period']
+
+    def bucket_costs(name):
+        # Time series costs cover direct spending only, as they always have
+        return expenses[name] + treatments[name] + equipment[name] + feed_purchases[name]
+
+    # Calculate totals
+    sales_revenue = sales['period']
+    expenses_cost = expenses['period']
+    treatments_cost = treatments['period']
+    equipment_cost = equipment['period']
+    feed_purchases_cost = feed_purchases['period']
+    total_revenue = sales_revenue + income_transactions
+    total_costs = (expenses_cost + treatments_cost + equipment_cost +
+                   feed_purchases_cost + feed_consumption + expense_transactions)
+    net_income = total_revenue - total_costs
+
+    daily_summary = []
+    for i in range(7):
+        day_date = buckets[f'day_{i}'][0]
+        daily_summary.append({
+            'date': day_date.strftime('%Y-%m-%d'),
+            'day_name': day_date.strftime('%A'),
+            **summarize(sales[f'day_{i}'], bucket_costs(f'day_{i}'))
+        })
+
+    weekly_summary = []
+    for i in range(8):
+        week_start_date, week_end_date = buckets[f'week_{i}']
+        weekly_summary.append({
+            'week_start': week_start_date.strftime('%Y-%m-%d'),
+            'week_end': week_end_date.strftime('%Y-%m-%d'),
+            'week_number': f"Week {8-i}",
+            **summarize(sales[f'week_{i}'], bucket_costs(f'week_{i}'))
+        })
+
+    monthly_summary = []
+    for i in range(6):
+        month_start, month_end = buckets[f'month_{i}']
+        monthly_summary.append({
+            'month': month_start.strftime('%B %Y'),
+            'month_start': month_start.strftime('%Y-%m-%d'),
+            'month_end': month_end.strftime('%Y-%m-%d'),
+            **summarize(sales[f'month_{i}'], bucket_costs(f'month_{i}'))
+        })
+
+    yearly_summary = {
+        'this_year': {
+            'year': current_date.year,
+            **summarize(sales['this_year'], bucket_costs('this_year'))
+        },
+        'last_year': {
+            'year': current_date.year - 1,
+            **summarize(sales['last_year'], bucket_costs('last_year'))
+        }
+    }
+
+    cost_breakdown = {
+        name: {'amount': float(amount), 'percentage': percentage(amount, total_costs)}
+        for name, amount in [
+            ('expenses', expenses_cost),
+            ('health_treatments', treatments_cost),
+            ('equipment_purchases', equipment_cost),
+            ('feed_purchases', feed_purchases_cost),
+            ('feed_consumption', feed_consumption),
+            ('general_transactions', expense_transactions),
+        ]
+    }
+
+    revenue_breakdown = {
+        'product_sales': {
+            'amount': float(sales_revenue),
+            'percentage': percentage(sales_revenue, total_revenue)
+        },
+        'general_transactions': {
+            'amount': float(income_transactions),
+            'percentage': percentage(income_transactions, total_revenue)
+        }
+    }
+
+    return {
+        'farm_info': {
+            'farm_id': farm.id,
+            'farm_name': farm.name,
+            'period': {
+                'start_date': start_date.strftime('%Y-%m-%d'),
+                'end_date': end_date.strftime('%Y-%m-%d')
+            }
+        },
+        'summary': {
+            'total_revenue': float(total_revenue),
+            'total_costs': float(total_costs),
+            'net_income': float(net_income),
+            'profit_margin': percentage(net_income, total_revenue)
+        },
+        'revenue_breakdown': revenue_breakdown,
+        'cost_breakdown': cost_breakdown,
+        'time_series': {
+            'daily_summary': daily_summary,
+            'weekly_summary': weekly_summary,
+            'monthly_summary': monthly_summary,
+            'yearly_summary': yearly_summary
+        }
+    }
+
+
+def truncate_date(day, granularity):
+    """Return the first day of the bucket containing day, matching the database Trunc functions"""
+    if granularity == 'day':
+        return day
+    if granularity == 'week':
+        return day - timedelta(days=day.weekday())
+    if granularity == 'month':
+        return day.replace(day=1)
+    if granularity == 'quarter':
+        return day.replace(month=(day.month - 1) // 3 * 3 + 1, day=1)
+    return day.replace(month=1, day=1)
+
+
+def next_bucket(day, granularity):
+    if granularity == 'day':
+        return day + timedelta(days=1)
+    if granularity == 'week':
+        return day + timedelta(weeks=1)
+    return add_months(day, GRANULARITIES[granularity])
+
+
+def count_time_series_buckets(start_date, end_date, granularity):
+    """Number of buckets get_time_series_buckets would return, without building them"""
+    first, last = truncate_date(start_date, granularity), truncate_date(end_date, granularity)
+    if granularity == 'day':
+        return (last - first).days + 1
+    if granularity == 'week':
+        return (last - first).days // 7 + 1
+    months = (last.year - first.year) * 12 + last.month - first.month
+    return months // GRANULARITIES[granularity] + 1
+
+
+def get_time_series_buckets(start_date, end_date, granularity):
+    """Return the start dates of every bucket overlapping [start_date, end_date]"""
+    buckets = []
+    bucket = truncate_date(start_date, granularity)
+    while bucket <= end_date:
+        buckets.append(bucket)
+        bucket = next_bucket(bucket, granularity)
+    return buckets
+
+
+def build_time_series(farm, start_date, end_date, granularity):
+    """Revenue, costs and net of a farm per day, week, month, quarter or year.
+
+    Buckets are grouped in the database with Trunc over the daily ledger, and
+    buckets without any activity are filled with zeros so the series is
+    continuous. Partial first and last buckets only count days inside the
+    requested range.
+    """
+    rows = FarmDailyLedger.objects.filter(
+        farm=farm,
+        date__range=[start_date, end_date]
+    ).annotate(
+        bucket=Trunc('date', granularity, output_field=DateField())
+    ).values('bucket').annotate(
+        revenue=Sum('amount', filter=Q(category__in=REVENUE_CATEGORIES)),
+        costs=Sum('amount', filter=Q(category__in=COST_CATEGORIES))
+    ).order_by('bucket')
+    totals = {row['bucket']: (row['revenue'] or 0, row['costs'] or 0) for row in rows}
+
+    series = []
+    total_revenue = total_costs = 0
+    for bucket in get_time_series_buckets(start_date, end_date, granularity):
+        revenue, costs = totals.get(bucket, (0, 0))
+        total_revenue += revenue
+        total_costs += costs
+        series.append({
+            'period_start': max(bucket, start_date).strftime('%Y-%m-%d'),
+            'period_end': min(next_bucket(bucket, granularity) - timedelta(days=1), end_date).strftime('%Y-%m-%d'),
+            **summarize(revenue, costs)
+        })
+
+    return {
+        'farm_id': farm.id,
+        'granularity': granularity,
+        'start_date': start_date.strftime('%Y-%m-%d'),
+        'end_date': end_date.strftime('%Y-%m-%d'),
+        'series': series,
+        'totals': summarize(total_revenue, total_costs)
+    }
@@ -1,3 +1,162 @@
-from django.test import TestCase
+from decimal import Decimal
+from django.contrib.auth.models import User
+from django.db import transaction
+from django.test import TestCase, override_settings
+from django.utils import timezone
+from rest_framework.test import APIClient
+from users.models import UserProfile
+from .cache import get_data_version
+from .models import Farm, Transaction
+from .pagination import InvalidCursor, encode_cursor, paginate_keyset
 
-# Create your tests here.
+LOCAL_CACHE = {'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}}
+
+
+@override_settings(CACHES=LOCAL_CACHE)
+class FarmResponseCacheTests(TestCase):
+    def setUp(self):
+        # Run the fixture's commit callbacks, so the tests' writes are collected in callbacks of their own
+        with self.captureOnCommitCallbacks(execute=True):
+            self.user = User.objects.create_user('farmer@example.com', 'farmer@example.com', 'password')
+            self.profile = UserProfile.objects.create(
+                user=self.user, email=self.user.email, first_name='Jo', last_name='Kamau', phone='0700'
+            )
+            self.farm = Farm.objects.create(name='Green Acres', address='Nakuru', created_by=self.user)
+            self.other_farm = Farm.objects.create(name='Hill Side', address='Nyeri', created_by=self.user)
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        self.income_url = f'/farms/get_farm_income/{self.farm.id}'
+
+    def add_income(self, amount='100'):
+        return Transaction.objects.create(
+            farm=self.farm, transaction_type='incoming', payment_method='cash',
+            amount=Decimal(amount), transaction_date=timezone.now(), created_by=self.user,
+        )
+
+    def test_write_bumps_only_its_farm_on_commit(self):
+        version, other_version = get_data_version(self.farm.id), get_data_version(self.other_farm.id)
+        with self.captureOnCommitCallbacks() as callbacks:
+            self.add_income()
+        self.assertEqual(get_data_version(self.farm.id), version)
+        for callback in callbacks:
+            callback()
+        self.assertNotEqual(get_data_version(self.farm.id), version)
+        self.assertEqual(get_data_version(self.other_farm.id), other_version)
+
+    def test_many_writes_bump_a_farm_once(self):
+        with self.captureOnCommitCallbacks() as callbacks:
+            with transaction.atomic():
+                for amount in range(1, 51):
+                    self.add_income(amount)
+                Transaction.objects.filter(farm=self.farm).delete()
+        bumps = [callback for callback in callbacks if getattr(callback, 'key', None) == 'farm_data_version']
+        self.assertEqual(len(bumps), 1)
+        self.assertEqual(bumps[0].values, {self.farm.id})
+
+    def test_write_refreshes_the_response(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            self.add_income('100')
+        self.assertEqual(len(self.client.get(self.income_url).data), 1)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.add_income('40')
+        self.assertEqual(len(self.client.get(self.income_url).data), 2)
+
+    def test_delete_refreshes_the_response(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            transaction = self.add_income()
+        self.assertEqual(len(self.client.get(self.income_url).data), 1)
+        with self.captureOnCommitCallbacks(execute=True):
+            transaction.delete()
+        self.assertEqual(self.client.get(self.income_url).data, [])
+
+    def test_farm_rename_refreshes_the_response(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            self.add_income()
+        self.assertEqual(self.client.get(self.income_url).data[0]['farm_name'], 'Green Acres')
+        with self.captureOnCommitCallbacks(execute=True):
+            self.farm.name = 'Green Pastures'
+            self.farm.save()
+        self.assertEqual(self.client.get(self.income_url).data[0]['farm_name'], 'Green Pastures')
+
+    def test_profile_change_refreshes_the_response(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            self.add_income()
+        self.assertEqual(self.client.get(self.income_url).data[0]['created_by_name'], 'Jo Kamau')
+        with self.captureOnCommitCallbacks(execute=True):
+            self.profile.first_name = 'Joy'
+            self.profile.save()
+        self.assertEqual(self.client.get(self.income_url).data[0]['created_by_name'], 'Joy Kamau')
+
+    def test_login_leaves_the_farm_version(self):
+        version = get_data_version(self.farm.id)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.user.last_login = timezone.now()
+            self.user.save(update_fields=['last_login'])
+        self.assertEqual(get_data_version(self.farm.id), version)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.user.email = 'jo@example.com'
+            self.user.save()
+        self.assertNotEqual(get_data_version(self.farm.id), version)
+
+    def test_user_change_leaves_other_farms(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            neighbour = User.objects.create_user('neighbour@example.com', 'neighbour@example.com', 'password')
+            profile = UserProfile.objects.create(user=neighbour, email=neighbour.email, first_name='Ann', phone='0711')
+            farm = Farm.objects.create(name='Valley View', address='Eldoret', created_by=neighbour)
+            member = User.objects.create_user('member@example.com', 'member@example.com', 'password')
+            membership = UserProfile.objects.create(user=member, email=member.email, first_name='Max', phone='0722')
+            membership.farms.add(self.other_farm)
+        versions = {farm_id: get_data_version(farm_id) for farm_id in (self.farm.id, self.other_farm.id, farm.id)}
+        with self.captureOnCommitCallbacks(execute=True):
+            profile.first_name = 'Anne'
+            profile.save()
+        self.assertEqual(get_data_version(self.farm.id), versions[self.farm.id])
+        self.assertNotEqual(get_data_version(farm.id), versions[farm.id])
+        with self.captureOnCommitCallbacks(execute=True):
+            membership.last_name = 'Otieno'
+            membership.save()
+        self.assertEqual(get_data_version(self.farm.id), versions[self.farm.id])
+        self.assertNotEqual(get_data_version(self.other_farm.id), versions[self.other_farm.id])
+
+
+class KeysetPaginationTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user('farmer@example.com', 'farmer@example.com', 'password')
+        self.farm = Farm.objects.create(name='Green Acres', address='Nakuru', created_by=self.user)
+        # Amounts with ties, so pages must break them on id
+        for amount in (50, 20, 50, 50, 10, 20, 50, 30, 20):
+            Transaction.objects.create(
+                farm=self.farm, transaction_type='incoming', payment_method='cash',
+                amount=Decimal(amount), transaction_date=timezone.now(), created_by=self.user,
+            )
+        self.transactions = Transaction.objects.filter(farm=self.farm)
+
+    def read_all(self, ordering, limit):
+        ids, cursor = [], None
+        while True:
+            page, cursor = paginate_keyset(self.transactions, ordering, cursor, limit)
+            ids += [transaction.id for transaction in page]
+            if cursor is None:
+                return ids
+
+    def test_pages_continue_across_ties(self):
+        for ordering in (['-amount', 'id'], ['amount', '-id'], ['-amount', '-id']):
+            expected = list(self.transactions.order_by(*ordering).values_list('id', flat=True))
+            for limit in (1, 2, 3, 4, 9, 10):
+                self.assertEqual(self.read_all(ordering, limit), expected, (ordering, limit))
+
+    def test_values_rows_are_paged(self):
+        page, cursor = paginate_keyset(self.transactions.values('id', 'amount'), ['-amount', 'id'], None, 4)
+        page, cursor = paginate_keyset(self.transactions.values('id', 'amount'), ['-amount', 'id'], cursor, 4)
+        self.assertEqual([row['amount'] for row in page], [Decimal(30), Decimal(20), Decimal(20), Decimal(20)])
+
+    def test_cursor_of_another_ordering_is_rejected(self):
+        page, cursor = paginate_keyset(self.transactions, ['-amount', 'id'], None, 2)
+        with self.assertRaisesMessage(InvalidCursor, 'does not belong to this ordering'):
+            paginate_keyset(self.transactions, ['amount', 'id'], cursor, 2)
+
+    def test_malformed_cursor_is_rejected(self):
+        forged = encode_cursor(['-amount', 'id'], ['plenty', 3])
+        for cursor in ('not-a-cursor', 'bm90IGpzb24=', forged):
+            with self.assertRaises(InvalidCursor):
+                paginate_keyset(self.transactions, ['-amount', 'id'], cursor, 2)
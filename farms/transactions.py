@@ -0,0 +1,39 @@
+"""Commit callbacks collected over a whole transaction.
+
+Signal handlers that refresh derived data once a transaction commits see
+one row at a time, so a cascade deleting 500 rows would register 500
+identical callbacks. on_commit_collect gathers the values of every call made
+with the same key during a transaction into a single callback, which
+receives them all once it commits.
+"""
+from django.db import transaction
+
+
+class CollectedCallback:
+    def __init__(self, key, func):
+        self.key = key
+        self.func = func
+        self.values = set()
+        self.called = False
+
+    def __call__(self):
+        self.called = True
+        self.func(self.values)
+
+
+def on_commit_collect(key, values, func, using=None):
+    """Call func with the set of values collected under key once the current transaction commits.
+
+    Outside a transaction func is called at once, as on_commit does. A
+    callback dropped by a rolled back savepoint is no longer pending, so the
+    next call registers a new one.
+    """
+    connection = transaction.get_connection(using)
+    if connection.in_atomic_block:
+        for savepoint_ids, callback, robust in connection.run_on_commit:
+            if isinstance(callback, CollectedCallback) and callback.key == key and not callback.called:
+                callback.values.update(values)
+                return
+    callback = CollectedCallback(key, func)
+    callback.values.update(values)
+    transaction.on_commit(callback, using)
@@ -53,9 +53,13 @@ urlpatterns = [
     
     # Farm Statistics URLs
     path("get_farm_statistics/<int:farm_id>", views.get_farm_statistics, name="get_farm_statistics"),
+    path("get_farm_time_series/<int:farm_id>", views.get_farm_time_series, name="get_farm_time_series"),
     path("get_farm_income/<int:farm_id>", views.get_farm_income, name="get_farm_income"),
     path("get_farm_expenses/<int:farm_id>", views.get_farm_expenses, name="get_farm_expenses"),
     
+    # Search URLs
+    path("search/<int:farm_id>", views.search_farm_records, name="search_farm_records"),
+    
     # Farm Users URLs
     path("get_farm_users/<int:farm_id>", views.get_farm_users, name="get_farm_users"),
     path("add_farm_user/<int:farm_id>", views.add_farm_user, name="add_farm_user"),
@@ -1,5 +1,5 @@
 from django.contrib import admin
-from .models import Veterinarian, HealthCondition, VetService, HealthRecord, Treatment
+from .models import Veterinarian, HealthCondition, VetService, HealthRecord, Treatment, ProductionAlert
 
 @admin.register(Veterinarian)
 class VeterinarianAdmin(admin.ModelAdmin):
@@ -36,3 +36,11 @@ class TreatmentAdmin(admin.ModelAdmin):
     list_filter = ('service', 'treatment_date')
     search_fields = ('health_record__animal__tag_number', 'notes')
     ordering = ('-treatment_date',)
+
+@admin.register(ProductionAlert)
+class ProductionAlertAdmin(admin.ModelAdmin):
+    list_display = ('animal', 'product', 'date', 'quantity', 'baseline', 'z_score', 'status', 'health_record')
+    list_filter = ('farm', 'status', 'date')
+    search_fields = ('animal__name',)
+    ordering = ('-date',)
+
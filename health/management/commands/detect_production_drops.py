@@ -0,0 +1,45 @@
+from datetime import date, timedelta
+from django.core.management.base import BaseCommand, CommandError
+from farms.models import Farm
+from health.production_alerts import detect_production_drops
+
+
+class Command(BaseCommand):
+    help = 'Flag sudden drops in the animals\' daily yields as production alerts, meant to run nightly'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--farm-id',
+            type=int,
+            help='Specific farm ID to scan',
+        )
+        parser.add_argument(
+            '--all-farms',
+            action='store_true',
+            help='Scan all farms',
+        )
+        parser.add_argument(
+            '--date',
+            help='Last day to scan in YYYY-MM-DD format, yesterday by default as today may be incomplete',
+        )
+
+    def handle(self, *args, **options):
+        try:
+            day = date.fromisoformat(options['date']) if options['date'] else date.today() - timedelta(days=1)
+        except ValueError:
+            raise CommandError('--date must be in YYYY-MM-DD format')
+
+        if options['farm_id']:
+            if not Farm.objects.filter(id=options['farm_id']).exists():
+                raise CommandError(f'Farm with ID {options["farm_id"]} does not exist')
+            farm_ids = [options['farm_id']]
+        elif options['all_farms']:
+            farm_ids = None
+        else:
+            self.stdout.write(
+                self.style.WARNING('Please specify --farm-id or --all-farms')
+            )
+            return
+
+        count = detect_production_drops(day, farm_ids)
+        self.stdout.write(self.style.SUCCESS(f'Successfully flagged {count} production drops up to {day}'))
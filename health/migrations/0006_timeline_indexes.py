@@ -0,0 +1,17 @@
+# Generated by Django 4.2.13 on 2026-10-18 12:09
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('health', '0005_alter_treatment_transactions'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='healthrecord',
+            index=models.Index(fields=['animal', 'diagnosis_date', 'id'], name='health_animal_date_idx'),
+        ),
+    ]
@@ -0,0 +1,40 @@
+# Generated by Django 4.2.13 on 2026-10-18 12:23
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('farms', '0015_search_trigram_indexes'),
+        ('products', '0008_lactation'),
+        ('animals', '0013_ai_farm_date_index'),
+        ('health', '0006_timeline_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ProductionAlert',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField()),
+                ('quantity', models.FloatField()),
+                ('baseline', models.FloatField()),
+                ('deviation', models.FloatField()),
+                ('z_score', models.FloatField()),
+                ('status', models.CharField(choices=[('OPEN', 'Open'), ('DISMISSED', 'Dismissed'), ('RECORDED', 'Health Record Created')], default='OPEN', max_length=10)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('animal', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='production_alerts', to='animals.animal')),
+                ('farm', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='production_alerts', to='farms.farm')),
+                ('health_record', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='production_alerts', to='health.healthrecord')),
+                ('product', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='production_alerts', to='products.product')),
+            ],
+            options={
+                'ordering': ['-date', '-id'],
+                'indexes': [models.Index(fields=['farm', 'status', 'date'], name='production_alert_status_idx')],
+                'unique_together': {('animal', 'product', 'date')},
+            },
+        ),
+    ]
@@ -75,6 +75,9 @@ class HealthRecord(models.Model):
 
     class Meta:
         ordering = ['-diagnosis_date']
+        indexes = [
+            models.Index(fields=['animal', 'diagnosis_date', 'id'], name='health_animal_date_idx'),
+        ]
 
 class Treatment(models.Model):
     health_record = models.ForeignKey(HealthRecord, on_delete=models.CASCADE, related_name='treatments')
@@ -129,3 +132,35 @@ class Treatment(models.Model):
         """Remove a transaction and update payment status"""
         self.transactions.remove(transaction)
         self.save()  # This will trigger the payment status update
+
+class ProductionAlert(models.Model):
+    """A sudden drop in an animal's daily yield of a product, flagged by health.production_alerts"""
+    STATUS_CHOICES = [
+        ('OPEN', 'Open'),
+        ('DISMISSED', 'Dismissed'),
+        ('RECORDED', 'Health Record Created'),
+    ]
+
+    farm = models.ForeignKey(Farm, on_delete=models.CASCADE, related_name='production_alerts')
+    animal = models.ForeignKey(Animal, on_delete=models.CASCADE, related_name='production_alerts')
+    product = models.ForeignKey('products.Product', on_delete=models.CASCADE, related_name='production_alerts')
+    date = models.DateField()
+    quantity = models.FloatField()
+    # Median and median absolute deviation of the animal's daily yields before the drop
+    baseline = models.FloatField()
+    deviation = models.FloatField()
+    z_score = models.FloatField()
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default='OPEN')
+    health_record = models.ForeignKey(HealthRecord, on_delete=models.SET_NULL, null=True, blank=True, related_name='production_alerts')
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"{self.animal.name} - {self.quantity:g} against {self.baseline:g} ({self.date})"
+
+    class Meta:
+        ordering = ['-date', '-id']
+        unique_together = ['animal', 'product', 'date']
+        indexes = [
+            models.Index(fields=['farm', 'status', 'date'], name='production_alert_status_idx'),
+        ]
@@ -0,0 +1,99 @@
+"""Detection of sudden drops in an animal's milk yield, often the first sign of mastitis.
+
+Each day's yield of an animal is compared with its own baseline, the daily
+yields it recorded over the BASELINE_DAYS before, through the robust z-score
+
+    z = 0.6745 * (yield - median) / MAD
+
+where MAD is the median absolute deviation of the baseline. The median and
+MAD are not pulled by the occasional odd day the way a mean and standard
+deviation are. A day is flagged when z is at most Z_SCORE_THRESHOLD and the
+yield is also at least MIN_DROP below the median, so an animal with a very
+steady baseline is not flagged for a trivial dip.
+
+The daily yields of every animal of a product come from one query as a
+matrix (products.yields), and the baselines of all animals and scanned days
+are sliding windows over it, so a run is a few array operations per product.
+The last SCAN_DAYS days are scanned so records entered late are still seen;
+a day is flagged once per animal and product.
+"""
+from datetime import timedelta
+import warnings
+import numpy as np
+from products.models import Product
+from products.yields import load_daily_yields
+from .models import ProductionAlert
+
+BASELINE_DAYS = 21
+# Recorded days a baseline needs before days are compared with it
+MIN_BASELINE_DAYS = 7
+SCAN_DAYS = 3
+Z_SCORE_THRESHOLD = -3.5
+# Smallest drop flagged, as a share of the baseline median
+MIN_DROP = 0.15
+# MAD of a normal distribution is 0.6745 standard deviations
+MAD_SCALE = 0.6745
+
+
+def robust_z_scores(values, baseline_days=BASELINE_DAYS):
+    """Robust z-score of every day against the baseline_days before it.
+
+    values holds a row of daily yields per animal, NaN on days without
+    records. Returns (z, median, mad) for the days from baseline_days on, NaN
+    where the day is unrecorded or its baseline has fewer than
+    MIN_BASELINE_DAYS recorded days.
+    """
+    windows = np.lib.stride_tricks.sliding_window_view(values[:, :-1], baseline_days, axis=1)
+    days = values[:, baseline_days:]
+    enough = (~np.isnan(windows)).sum(axis=2) >= MIN_BASELINE_DAYS
+    with warnings.catch_warnings():
+        # Baselines without records give NaN, which is what is wanted
+        warnings.simplefilter('ignore', RuntimeWarning)
+        median = np.nanmedian(windows, axis=2)
+        mad = np.nanmedian(np.abs(windows - median[..., None]), axis=2)
+        # A baseline of identical days has no spread, so the floor keeps z finite
+        mad = np.maximum(mad, 0.01 * median)
+        z = np.where(enough, MAD_SCALE * (days - median) / mad, np.nan)
+    return z, median, mad
+
+
+def find_production_drops(farm_id, product_id, day):
+    """Unsaved ProductionAlert rows for the drops in a farm product's yields over the SCAN_DAYS ending on day"""
+    first = day - timedelta(days=BASELINE_DAYS + SCAN_DAYS - 1)
+    yields = load_daily_yields([farm_id], product_id, first, day)
+    if not len(yields.animal_ids):
+        return []
+    values = np.where(yields.recorded, yields.totals, np.nan)
+    z, median, mad = robust_z_scores(values)
+    days = values[:, BASELINE_DAYS:]
+    with np.errstate(invalid='ignore'):
+        flagged = (z <= Z_SCORE_THRESHOLD) & (days <= (1 - MIN_DROP) * median)
+
+    rows, columns = np.nonzero(flagged)
+    return [
+        ProductionAlert(
+            farm_id=farm_id, animal_id=int(yields.animal_ids[row]), product_id=product_id,
+            date=yields.day(BASELINE_DAYS + column), quantity=float(days[row, column]),
+            baseline=float(median[row, column]), deviation=float(mad[row, column]),
+            z_score=round(float(z[row, column]), 2),
+        )
+        for row, column in zip(rows.tolist(), columns.tolist())
+    ]
+
+
+def detect_production_drops(day, farm_ids=None):
+    """Flag the drops of every product of the farms (all farms when None), returning the count of new alerts"""
+    products = Product.objects.all()
+    if farm_ids is not None:
+        products = products.filter(farm_id__in=farm_ids)
+    alerts = []
+    for product_id, farm_id in products.values_list('id', 'farm_id'):
+        alerts.extend(find_production_drops(farm_id, product_id, day))
+    existing = set(ProductionAlert.objects.filter(
+        product_id__in={alert.product_id for alert in alerts},
+        date__range=(day - timedelta(days=SCAN_DAYS - 1), day),
+    ).values_list('animal_id', 'product_id', 'date'))
+    new = [alert for alert in alerts if (alert.animal_id, alert.product_id, alert.date) not in existing]
+    # ignore_conflicts covers a concurrent run flagging the same day
+    ProductionAlert.objects.bulk_create(new, ignore_conflicts=True)
+    return len(new)
@@ -1,5 +1,5 @@
 from rest_framework import serializers
-from .models import Veterinarian, HealthCondition, VetService, HealthRecord, Treatment
+from .models import Veterinarian, HealthCondition, VetService, HealthRecord, Treatment, ProductionAlert
 from animals.serializers import AnimalSerializer
 from farms.serializers import FarmSerializer
 from django.core.validators import URLValidator
@@ -104,4 +104,13 @@ class HealthRecordSerializer(serializers.ModelSerializer):
 
     def get_treatments(self, obj):
         treatments = Treatment.objects.filter(health_record=obj)
-        return TreatmentSerializer(treatments, many=True).data 
\ No newline at end of file
+        return TreatmentSerializer(treatments, many=True).data
+
+class ProductionAlertSerializer(serializers.ModelSerializer):
+    animal_name = serializers.CharField(source='animal.name', read_only=True)
+    product_name = serializers.CharField(source='product.name', read_only=True)
+
+    class Meta:
+        model = ProductionAlert
+        fields = ['id', 'animal', 'animal_name', 'product', 'product_name', 'date', 'quantity', 'baseline',
+                  'deviation', 'z_score', 'status', 'health_record', 'created_at', 'updated_at']
@@ -39,4 +39,9 @@ urlpatterns = [
     path("delete_treatment/<int:farm_id>/<int:id>", delete_treatment, name="delete_treatment"),
     path('treatments/<int:farm_id>/<int:treatment_id>/add_transaction/', add_transaction_to_treatment, name='add_transaction_to_treatment'),
     path('treatments/<int:farm_id>/<int:treatment_id>/remove_transaction/<int:transaction_id>/', remove_transaction_from_treatment, name='remove_transaction_from_treatment'),
+
+    # Production Alerts
+    path("get_production_alerts/<int:farm_id>", get_production_alerts, name="get_production_alerts"),
+    path("add_health_record_from_alert/<int:farm_id>/<int:id>", add_health_record_from_alert, name="add_health_record_from_alert"),
+    path("dismiss_production_alert/<int:farm_id>/<int:id>", dismiss_production_alert, name="dismiss_production_alert"),
 ] 
\ No newline at end of file
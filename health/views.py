@@ -1,10 +1,11 @@
 from django.shortcuts import render
 from rest_framework.decorators import api_view
 from rest_framework.response import Response
-from .models import Veterinarian, HealthCondition, VetService, HealthRecord, Treatment, Transaction
+from django.db import transaction
+from .models import Veterinarian, HealthCondition, VetService, HealthRecord, Treatment, Transaction, ProductionAlert
 from .serializers import (
     VeterinarianSerializer, HealthConditionSerializer, 
-    VetServiceSerializer, HealthRecordSerializer, TreatmentSerializer
+    VetServiceSerializer, HealthRecordSerializer, TreatmentSerializer, ProductionAlertSerializer
 )
 from farms.models import Farm
 from animals.models import Animal
@@ -345,3 +346,76 @@ def remove_transaction_from_treatment(request, farm_id, treatment_id, transactio
         return Response({"error": f"Treatment with id:{treatment_id} not found in farm:{farm_id}"}, status=404)
     except Exception as e:
         return Response({"error": str(e)}, status=400)
+
+###################### PRODUCTION ALERTS ########################
+
+@api_view(['GET'])
+def get_production_alerts(request, farm_id):
+    """Get the yield drops flagged in a farm, latest first, open ones by default.
+
+    `status` selects OPEN, DISMISSED, RECORDED or all, `animal` one animal.
+    """
+    if not Farm.objects.filter(id=farm_id).exists():
+        return Response({"error": f"Farm with id:{farm_id} does not exist"}, status=404)
+    alert_status = request.query_params.get("status", "OPEN").upper()
+    if alert_status != "ALL" and alert_status not in dict(ProductionAlert.STATUS_CHOICES):
+        return Response({"error": "status must be one of OPEN, DISMISSED, RECORDED or ALL"}, status=400)
+    alerts = ProductionAlert.objects.filter(farm_id=farm_id).select_related("animal", "product")
+    if alert_status != "ALL":
+        alerts = alerts.filter(status=alert_status)
+    if "animal" in request.query_params:
+        try:
+            animal_id = int(request.query_params["animal"])
+        except ValueError:
+            return Response({"error": "animal must be an animal id"}, status=400)
+        alerts = alerts.filter(animal_id=animal_id)
+    serializer = ProductionAlertSerializer(alerts, many=True)
+    return Response(serializer.data, status=200)
+
+@api_view(['POST'])
+def add_health_record_from_alert(request, farm_id, id):
+    """Open a health record for the animal of a production alert and link it to the alert.
+
+    Takes the fields of add_health_record; the animal comes from the alert, and
+    `diagnosis_date` and `symptoms` default to the alert's date and drop.
+    """
+    try:
+        alert = ProductionAlert.objects.select_related("product").get(id=id, farm_id=farm_id)
+    except ProductionAlert.DoesNotExist:
+        return Response({"error": f"Production alert with id:{id} not found in farm:{farm_id}"}, status=404)
+    if alert.health_record_id is not None:
+        return Response({"error": "A health record was already created for this alert"}, status=409)
+
+    data = {
+        "diagnosis_date": alert.date,
+        "symptoms": f"{alert.product.name} yield dropped to {alert.quantity:g} {alert.product.unit} "
+                    f"from a median of {alert.baseline:g} {alert.product.unit} on {alert.date}",
+        **request.data,
+        "animal": alert.animal_id,
+    }
+    serializer = HealthRecordSerializer(data=data)
+    if not serializer.is_valid():
+        return Response(serializer.errors, status=400)
+    if (serializer.validated_data["condition"].farm_id != farm_id
+            or serializer.validated_data["veterinarian"].farm_id != farm_id):
+        return Response({"error": f"The condition and veterinarian must belong to farm:{farm_id}"}, status=400)
+    with transaction.atomic():
+        record = serializer.save()
+        alert.health_record = record
+        alert.status = "RECORDED"
+        alert.save(update_fields=["health_record", "status", "updated_at"])
+    return Response({"alert": ProductionAlertSerializer(alert).data, "health_record": serializer.data}, status=201)
+
+@api_view(['POST'])
+def dismiss_production_alert(request, farm_id, id):
+    """Dismiss a production alert that needs no health record"""
+    try:
+        alert = ProductionAlert.objects.get(id=id, farm_id=farm_id)
+    except ProductionAlert.DoesNotExist:
+        return Response({"error": f"Production alert with id:{id} not found in farm:{farm_id}"}, status=404)
+    if alert.status == "RECORDED":
+        return Response({"error": "A health record was already created for this alert"}, status=409)
+    alert.status = "DISMISSED"
+    alert.save(update_fields=["status", "updated_at"])
+    return Response(ProductionAlertSerializer(alert).data, status=200)
+
@@ -1,6 +1,6 @@
 from django.contrib import admin
 from import_export.admin import ImportExportModelAdmin
-from .models import Product, ProductionRecord, Buyer, Sale
+from .models import Product, ProductionRecord, Buyer, Sale, ProductInventoryMovement, ProductInventorySnapshot, Lactation
 
 @admin.register(Product)
 class ProductAdmin(ImportExportModelAdmin):
@@ -28,4 +28,27 @@ class SaleAdmin(ImportExportModelAdmin):
     list_display = ('product', 'buyer', 'quantity', 'unit_price', 'total_amount', 'payment_method', 'payment_status', 'date')
     list_filter = ('farm', 'product', 'buyer', 'payment_method', 'payment_status', 'date')
     search_fields = ('product__name', 'buyer__name', 'notes')
-    ordering = ('-date',) 
\ No newline at end of file
+    ordering = ('-date',) 
+
+@admin.register(ProductInventoryMovement)
+class ProductInventoryMovementAdmin(admin.ModelAdmin):
+    list_display = ('product', 'date', 'quantity', 'source', 'source_id', 'notes', 'created_at')
+    list_filter = ('farm', 'product', 'source')
+    date_hierarchy = 'date'
+    readonly_fields = ('product', 'farm', 'date', 'quantity', 'source', 'source_id', 'notes', 'created_at')
+
+@admin.register(ProductInventorySnapshot)
+class ProductInventorySnapshotAdmin(admin.ModelAdmin):
+    list_display = ('product', 'date', 'quantity', 'updated_at')
+    list_filter = ('product',)
+    date_hierarchy = 'date'
+    readonly_fields = ('product', 'date', 'quantity', 'updated_at')
+
+@admin.register(Lactation)
+class LactationAdmin(admin.ModelAdmin):
+    list_display = ('animal', 'product', 'number', 'calving_date', 'end_date', 'record_days', 'peak_day', 'projected_305_yield', 'updated_at')
+    list_filter = ('farm', 'product')
+    search_fields = ('animal__name',)
+    date_hierarchy = 'calving_date'
+    readonly_fields = ('farm', 'animal', 'product', 'number', 'calving_date', 'end_date', 'record_days', 'last_record_date',
+                       'total_yield', 'a', 'b', 'c', 'peak_day', 'peak_yield', 'projected_305_yield', 'updated_at')
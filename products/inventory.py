@@ -0,0 +1,61 @@
+"""Product inventory history from the ProductInventoryMovement ledger.
+
+Every production record and sale appends signed movements dated on the day
+it took effect, and Product.inventory is their running total. Snapshots
+store the inventory at the end of a day, so the inventory as of any date is
+the latest snapshot before it plus the movements since, and movements dated
+before a snapshot update it as they are recorded.
+"""
+from decimal import Decimal
+from django.db import transaction
+from django.db.models import Sum
+from .models import Product, ProductInventoryMovement, ProductInventorySnapshot
+
+
+def movements_total(product_id, after=None, until=None):
+    movements = ProductInventoryMovement.objects.filter(product_id=product_id)
+    if after is not None:
+        movements = movements.filter(date__gt=after)
+    if until is not None:
+        movements = movements.filter(date__lte=until)
+    return movements.aggregate(total=Sum('quantity'))['total'] or Decimal(0)
+
+
+def inventory_as_of(product_id, day):
+    """Inventory of a product at the end of a day"""
+    snapshot = ProductInventorySnapshot.objects.filter(product_id=product_id, date__lte=day).order_by('-date').first()
+    if snapshot is None:
+        return movements_total(product_id, until=day)
+    return snapshot.quantity + movements_total(product_id, after=snapshot.date, until=day)
+
+
+def take_inventory_snapshot(product_id, day):
+    """Store the inventory of a product at the end of a day from the previous snapshot and the movements since"""
+    with transaction.atomic():
+        # Movements lock the product row first, so none is recorded half way through
+        Product.objects.select_for_update().filter(pk=product_id).first()
+        quantity = inventory_as_of(product_id, day)
+        ProductInventorySnapshot.objects.update_or_create(product_id=product_id, date=day, defaults={'quantity': quantity})
+    return quantity
+
+
+def take_inventory_snapshots(day, farm_ids=None):
+    """Snapshot every product of the farms (all farms when None) at the end of a day"""
+    products = Product.objects.all()
+    if farm_ids is not None:
+        products = products.filter(farm_id__in=farm_ids)
+    product_ids = list(products.values_list('id', flat=True))
+    for product_id in product_ids:
+        take_inventory_snapshot(product_id, day)
+    return len(product_ids)
+
+
+def adjust_inventory(product, day, quantity=None, inventory=None, notes=''):
+    """Record a stock adjustment, either a change of quantity or a counted inventory to reach"""
+    with transaction.atomic():
+        if inventory is not None:
+            current = Product.objects.select_for_update().values_list('inventory', flat=True).get(pk=product.pk)
+            quantity = inventory - current
+        movement = ProductInventoryMovement.objects.record(product, quantity, day, 'adjustment', notes=notes)
+    product.refresh_from_db(fields=['inventory'])
+    return movement
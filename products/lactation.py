@@ -0,0 +1,303 @@
+"""Lactation curves of the herd, fitted with Wood's model.
+
+A female's lactations start on the birth dates of her calves (the
+offspring_dam relation) and each runs until the day before the next. Her
+daily yield of a product on day t in milk, 1 on the calving date, is fitted
+to Wood's curve
+
+    y = a * t^b * e^(-c t),  so  ln y = ln a + b ln t - c t
+
+by least squares on the log of the daily totals. Every lactation of a batch
+of animals is fitted at once: the sums of the normal equations are
+accumulated per lactation with np.bincount and the 3x3 systems solved in one
+stacked np.linalg.solve, so fitting the whole herd costs a query for the
+calvings, one for the records and a handful of array operations.
+
+The fits are stored in Lactation with the peak day b / c, the peak yield and
+the projected yield over the first 305 days, so ranking screens only read
+rows. Once a transaction that wrote production records commits, only the
+lactations containing them are refitted, from the records of their own
+spans, and a milking session refits the lactations of its day the same way;
+a calf written refits all of its dam's lactations, as their bounds move.
+"""
+from datetime import date, timedelta
+from functools import reduce
+import operator
+import numpy as np
+from django.db import transaction
+from django.db.models import Q
+from django.db.models.signals import pre_save, post_save, post_delete
+from animals.models import Animal
+from farms.transactions import on_commit_collect
+from .models import Lactation, ProductionRecord
+
+# Days with records a lactation needs before its curve is fitted
+MIN_FIT_DAYS = 10
+# Days in milk a lactation needs before a peak past its records is projected
+MIN_PROJECTION_DAYS = 60
+STANDARD_LACTATION_DAYS = 305
+
+REFRESH_BATCH_SIZE = 500
+
+# Room for every date ordinal, so (animal, date) pairs sort as one integer key
+ORDINAL_SPAN = date.max.toordinal() + 1
+
+
+def fit_wood_curves(groups, days_in_milk, yields, count):
+    """Fit ln y = ln a + b ln t - c t for each of count groups, returning (a, b, c, fitted) arrays.
+
+    groups, days_in_milk and yields hold one entry per recorded day; groups
+    with fewer than MIN_FIT_DAYS days or a singular system are not fitted.
+    """
+    log_t, t, log_y = np.log(days_in_milk), days_in_milk.astype(float), np.log(yields)
+    columns = [np.ones_like(t), log_t, t]
+
+    def sums(values):
+        return np.bincount(groups, weights=values, minlength=count)
+
+    normal = np.empty((count, 3, 3))
+    right = np.empty((count, 3))
+    for i, first in enumerate(columns):
+        for j, second in enumerate(columns[i:], start=i):
+            normal[:, i, j] = normal[:, j, i] = sums(first * second)
+        right[:, i] = sums(first * log_y)
+
+    fitted = (normal[:, 0, 0] >= MIN_FIT_DAYS) & (np.abs(np.linalg.det(normal)) > 1e-9)
+    coefficients = np.full((count, 3), np.nan)
+    if fitted.any():
+        coefficients[fitted] = np.linalg.solve(normal[fitted], right[fitted][..., None])[..., 0]
+    return np.exp(coefficients[:, 0]), coefficients[:, 1], -coefficients[:, 2], fitted
+
+
+def wood_curve_summary(a, b, c, last_day):
+    """Peak day, peak yield and projected 305 day yield of fitted curves, NaN where undefined.
+
+    Only curves that rise to a peak and then decline are projected, and only
+    once the peak is inside the recorded days or the lactation has reached
+    MIN_PROJECTION_DAYS in milk (last_day): a young lactation that is still
+    rising fits a curve that grows without limit or peaks far ahead.
+    """
+    with np.errstate(all='ignore'):
+        has_peak = (b > 0) & (c > 0)
+        peak_day = np.where(has_peak, b / c, np.nan)
+        peak_yield = np.where(has_peak, a * peak_day ** b * np.exp(-b), np.nan)
+        t = np.arange(1, STANDARD_LACTATION_DAYS + 1, dtype=float)
+        curves = a[:, None] * t ** b[:, None] * np.exp(-c[:, None] * t)
+        projected = curves.sum(axis=1)
+        projectable = has_peak & ((peak_day <= last_day) | (last_day >= MIN_PROJECTION_DAYS)) & np.isfinite(projected)
+    return peak_day, peak_yield, np.where(projectable, projected, np.nan)
+
+
+def optional(value):
+    return None if np.isnan(value) else float(value)
+
+
+def compute_lactations(animal_ids, days=None):
+    """Return the lactations computed and their unsaved Lactation rows, one per product with records.
+
+    Every lactation of the animals is computed, or when days maps animal ids
+    to dates only those containing one of the dates, with the records of
+    their own span. Lactations are given as (animal id, calving date) pairs.
+    """
+    calvings = sorted(set(
+        Animal.objects.filter(dam_id__in=animal_ids).values_list('dam_id', 'date_of_birth')
+    ))
+    if not calvings:
+        return [], []
+    farms = dict(Animal.objects.filter(id__in={dam for dam, day in calvings}).values_list('id', 'farm_id'))
+    calving_animals = np.array([dam for dam, day in calvings], dtype=np.int64)
+    calving_days = np.array([day.toordinal() for dam, day in calvings], dtype=np.int64)
+    calving_keys = calving_animals * ORDINAL_SPAN + calving_days
+    # Lactations end the day before the dam's next calving
+    next_is_same = np.append(calving_animals[1:] == calving_animals[:-1], False)
+    ends = np.where(next_is_same, np.append(calving_days[1:], 0) - 1, -1)
+    numbers = np.arange(len(calvings)) - np.searchsorted(calving_animals, calving_animals) + 1
+
+    rows = ProductionRecord.objects.filter(animal_id__in=list(farms))
+    if days is None:
+        selected = np.arange(len(calvings))
+        rows = rows.filter(date__gte=min(day for dam, day in calvings))
+    else:
+        keys = np.array([
+            animal_id * ORDINAL_SPAN + day.toordinal() for animal_id, dates in days.items() for day in dates
+        ], dtype=np.int64)
+        found = np.searchsorted(calving_keys, keys, side='right') - 1
+        found = found[(found >= 0) & (calving_animals[np.maximum(found, 0)] == keys // ORDINAL_SPAN)]
+        selected = np.unique(found)
+        if not len(selected):
+            return [], []
+        rows = rows.filter(reduce(operator.or_, (
+            Q(animal_id=int(calving_animals[lactation]), date__gte=date.fromordinal(int(calving_days[lactation])))
+            & (Q(date__lte=date.fromordinal(int(ends[lactation]))) if ends[lactation] > 0 else Q())
+            for lactation in selected.tolist()
+        )))
+    computed = [
+        (int(calving_animals[lactation]), date.fromordinal(int(calving_days[lactation]))) for lactation in selected.tolist()
+    ]
+
+    rows = rows.values_list('animal_id', 'product_id', 'date', 'quantity').order_by()
+    animals, products, dates, quantities = zip(*rows) if rows else ((), (), (), ())
+    if not animals:
+        return computed, []
+    record_animals = np.array(animals, dtype=np.int64)
+    record_days = np.fromiter((day.toordinal() for day in dates), dtype=np.int64, count=len(dates))
+
+    # The lactation of every record is the dam's latest calving on or before it
+    lactations = np.searchsorted(calving_keys, record_animals * ORDINAL_SPAN + record_days, side='right') - 1
+    inside = (lactations >= 0) & (calving_animals[np.maximum(lactations, 0)] == record_animals)
+    lactations, record_days = lactations[inside], record_days[inside]
+    product_ids, product_of = np.unique(np.array(products, dtype=np.int64)[inside], return_inverse=True)
+    quantities = np.array(quantities, dtype=float)[inside]
+
+    # Daily totals per (lactation, product, day in milk)
+    days_in_milk = record_days - calving_days[lactations] + 1
+    day_keys = (lactations * len(product_ids) + product_of) * ORDINAL_SPAN + days_in_milk
+    day_keys, day_of = np.unique(day_keys, return_inverse=True)
+    daily = np.bincount(day_of, weights=quantities)
+    day_lactation_products = day_keys // ORDINAL_SPAN
+    day_numbers = day_keys % ORDINAL_SPAN
+
+    # Curves per (lactation, product)
+    group_keys, groups = np.unique(day_lactation_products, return_inverse=True)
+    count = len(group_keys)
+    a, b, c, fitted = fit_wood_curves(groups, day_numbers, daily, count)
+    record_count = np.bincount(groups, minlength=count)
+    totals = np.bincount(groups, weights=daily, minlength=count)
+    last_day = np.zeros(count, dtype=np.int64)
+    np.maximum.at(last_day, groups, day_numbers)
+    peak_day, peak_yield, projected = wood_curve_summary(a, b, c, last_day)
+
+    results = []
+    for group, key in enumerate(group_keys.tolist()):
+        lactation, product = divmod(key, len(product_ids))
+        animal_id = int(calving_animals[lactation])
+        calving_date = date.fromordinal(int(calving_days[lactation]))
+        results.append(Lactation(
+            farm_id=farms[animal_id], animal_id=animal_id, product_id=int(product_ids[product]),
+            number=int(numbers[lactation]), calving_date=calving_date,
+            end_date=date.fromordinal(int(ends[lactation])) if ends[lactation] > 0 else None,
+            record_days=int(record_count[group]), total_yield=float(totals[group]),
+            last_record_date=calving_date + timedelta(days=int(last_day[group]) - 1),
+            **({
+                'a': float(a[group]), 'b': float(b[group]), 'c': float(c[group]),
+                'peak_day': optional(peak_day[group]), 'peak_yield': optional(peak_yield[group]),
+                'projected_305_yield': optional(projected[group]),
+            } if fitted[group] else {}),
+        ))
+    return computed, results
+
+
+def refresh_lactations(animal_ids, days=None):
+    """Refit and replace the stored lactations of the animals, only those containing days when given"""
+    animal_ids = list(animal_ids)
+    computed, lactations = compute_lactations(animal_ids, days)
+    with transaction.atomic():
+        if days is None:
+            Lactation.objects.filter(animal_id__in=animal_ids).delete()
+        elif computed:
+            Lactation.objects.filter(reduce(operator.or_, (
+                Q(animal_id=animal_id, calving_date=calving_date) for animal_id, calving_date in computed
+            ))).delete()
+        return len(Lactation.objects.bulk_create(lactations))
+
+
+def fit_herd_lactations(farm_ids=None):
+    """Refit the lactations of every animal that has calved on the farms (all farms when None)"""
+    dams = Animal.objects.filter(dam__isnull=False)
+    stale = Lactation.objects.all()
+    if farm_ids is not None:
+        dams = dams.filter(dam__farm_id__in=farm_ids)
+        stale = stale.filter(farm_id__in=farm_ids)
+    animal_ids = sorted(set(dams.values_list('dam_id', flat=True)))
+    stale.exclude(animal_id__in=animal_ids).delete()
+    count = 0
+    for start in range(0, len(animal_ids), REFRESH_BATCH_SIZE):
+        count += refresh_lactations(animal_ids[start:start + REFRESH_BATCH_SIZE])
+    return count
+
+
+def refit_changed_lactations(since, farm_ids=None):
+    """Refit the lactations containing production records written on or after the day since.
+
+    Writes refit their lactations as they commit, so this repairs fits after
+    records were changed without signals, such as by queryset updates.
+    """
+    records = ProductionRecord.objects.filter(updated_at__date__gte=since, animal__isnull=False)
+    if farm_ids is not None:
+        records = records.filter(farm_id__in=farm_ids)
+    return refit_lactation_days(records.values_list('animal_id', 'date').distinct())
+
+
+def refit_lactation_days(records):
+    """Refit the lactations containing the (animal id, date) pairs"""
+    days = {}
+    for animal_id, day in records:
+        days.setdefault(animal_id, set()).add(day)
+    animal_ids = sorted(days)
+    count = 0
+    for start in range(0, len(animal_ids), REFRESH_BATCH_SIZE):
+        batch = animal_ids[start:start + REFRESH_BATCH_SIZE]
+        count += refresh_lactations(batch, {animal_id: days[animal_id] for animal_id in batch})
+    return count
+
+
+def refresh_animal_lactations(animal_ids):
+    animal_ids = sorted(animal_ids)
+    for start in range(0, len(animal_ids), REFRESH_BATCH_SIZE):
+        refresh_lactations(animal_ids[start:start + REFRESH_BATCH_SIZE])
+
+
+def schedule_lactation_refresh(animal_ids):
+    """Refresh, on commit, every lactation of the animals written during the transaction"""
+    animal_ids = {animal_id for animal_id in animal_ids if animal_id is not None}
+    if animal_ids:
+        on_commit_collect('lactation_refresh', animal_ids, refresh_animal_lactations)
+
+
+def schedule_lactation_refit(records):
+    """Refit, on commit, only the lactations containing the (animal id, date) pairs written during the transaction"""
+    records = {(animal_id, day) for animal_id, day in records if animal_id is not None}
+    if records:
+        on_commit_collect('lactation_refit', records, refit_lactation_days)
+
+
+def capture_record_animal(sender, instance, **kwargs):
+    instance._stored_lactation_day = (
+        ProductionRecord.objects.filter(pk=instance.pk).values_list('animal_id', 'date').first()
+        if instance.pk else None
+    )
+
+
+def record_saved(sender, instance, **kwargs):
+    stored = getattr(instance, '_stored_lactation_day', None)
+    schedule_lactation_refit([(instance.animal_id, instance.date)] + ([stored] if stored else []))
+
+
+def record_deleted(sender, instance, **kwargs):
+    schedule_lactation_refit([(instance.animal_id, instance.date)])
+
+
+def capture_calf_dam(sender, instance, **kwargs):
+    instance._stored_lactation_dam = (
+        Animal.objects.filter(pk=instance.pk).values_list('dam_id', 'date_of_birth').first() if instance.pk else None
+    )
+
+
+def calf_saved(sender, instance, created, **kwargs):
+    # Only a calf's dam and birth date move lactation boundaries
+    stored = getattr(instance, '_stored_lactation_dam', None)
+    if created or stored != (instance.dam_id, instance.date_of_birth):
+        schedule_lactation_refresh([instance.dam_id, stored[0] if stored else None])
+
+
+def calf_deleted(sender, instance, **kwargs):
+    schedule_lactation_refresh([instance.dam_id])
+
+
+def connect_lactation_signals():
+    pre_save.connect(capture_record_animal, sender=ProductionRecord, dispatch_uid='lactation_production')
+    post_save.connect(record_saved, sender=ProductionRecord, dispatch_uid='lactation_production')
+    post_delete.connect(record_deleted, sender=ProductionRecord, dispatch_uid='lactation_production')
+    pre_save.connect(capture_calf_dam, sender=Animal, dispatch_uid='lactation_calf')
+    post_save.connect(calf_saved, sender=Animal, dispatch_uid='lactation_calf')
+    post_delete.connect(calf_deleted, sender=Animal, dispatch_uid='lactation_calf')
@@ -0,0 +1,49 @@
+from datetime import date
+from django.core.management.base import BaseCommand, CommandError
+from farms.models import Farm
+from products.lactation import fit_herd_lactations, refit_changed_lactations
+
+
+class Command(BaseCommand):
+    help = 'Refit the lactation curves of every animal that has calved, or with --since only those with new records'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--farm-id',
+            type=int,
+            help='Specific farm ID to fit the lactations of',
+        )
+        parser.add_argument(
+            '--all-farms',
+            action='store_true',
+            help='Fit the lactations of all farms',
+        )
+        parser.add_argument(
+            '--since',
+            help='Only refit the lactations containing records written on or after this day (YYYY-MM-DD), '
+                 'run daily to pick up milking sessions',
+        )
+
+    def handle(self, *args, **options):
+        try:
+            since = date.fromisoformat(options['since']) if options['since'] else None
+        except ValueError:
+            raise CommandError('--since must be in YYYY-MM-DD format')
+
+        if options['farm_id']:
+            if not Farm.objects.filter(id=options['farm_id']).exists():
+                raise CommandError(f'Farm with ID {options["farm_id"]} does not exist')
+            farm_ids = [options['farm_id']]
+        elif options['all_farms']:
+            farm_ids = None
+        else:
+            self.stdout.write(
+                self.style.WARNING('Please specify --farm-id or --all-farms')
+            )
+            return
+
+        if since is not None:
+            count = refit_changed_lactations(since, farm_ids)
+        else:
+            count = fit_herd_lactations(farm_ids)
+        self.stdout.write(self.style.SUCCESS(f'Successfully fitted {count} lactations'))
@@ -0,0 +1,49 @@
+from datetime import datetime, timedelta
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+from farms.models import Farm
+from products.inventory import take_inventory_snapshots
+
+
+class Command(BaseCommand):
+    help = 'Snapshot product inventories at the end of a day, run daily to keep "inventory as of" queries cheap'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--farm-id',
+            type=int,
+            help='Specific farm ID to snapshot products of',
+        )
+        parser.add_argument(
+            '--all-farms',
+            action='store_true',
+            help='Snapshot products of all farms',
+        )
+        parser.add_argument(
+            '--date',
+            help='Day to snapshot (YYYY-MM-DD), defaults to yesterday',
+        )
+
+    def handle(self, *args, **options):
+        if options['farm_id']:
+            if not Farm.objects.filter(id=options['farm_id']).exists():
+                raise CommandError(f'Farm with ID {options["farm_id"]} does not exist')
+            farm_ids = [options['farm_id']]
+        elif options['all_farms']:
+            farm_ids = None
+        else:
+            self.stdout.write(
+                self.style.WARNING('Please specify --farm-id or --all-farms')
+            )
+            return
+
+        if options['date']:
+            try:
+                day = datetime.strptime(options['date'], '%Y-%m-%d').date()
+            except ValueError:
+                raise CommandError(f'Invalid date "{options["date"]}", use YYYY-MM-DD')
+        else:
+            day = timezone.now().date() - timedelta(days=1)
+
+        count = take_inventory_snapshots(day, farm_ids)
+        self.stdout.write(self.style.SUCCESS(f'Successfully snapshotted {count} products on {day}'))
@@ -0,0 +1,17 @@
+# Generated by Django 4.2.13 on 2026-10-18 12:09
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0004_alter_product_inventory'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='productionrecord',
+            index=models.Index(fields=['animal', 'date', 'id'], name='production_animal_date_idx'),
+        ),
+    ]
@@ -0,0 +1,95 @@
+# Generated by Django 4.2.13 on 2026-10-18 12:15
+
+from collections import defaultdict
+from decimal import Decimal
+from django.db import migrations, models
+from django.utils import timezone
+import django.db.models.deletion
+
+BATCH_SIZE = 1000
+
+
+def backfill_movements(apps, schema_editor):
+    """Record the existing production records and sales as movements.
+
+    Inventories may have drifted from them, through edited sales that were
+    subtracted again, so the difference to each product's inventory is
+    recorded as an adjustment today and current inventories are unchanged.
+    """
+    Product = apps.get_model('products', 'Product')
+    ProductionRecord = apps.get_model('products', 'ProductionRecord')
+    Sale = apps.get_model('products', 'Sale')
+    ProductInventoryMovement = apps.get_model('products', 'ProductInventoryMovement')
+    products = {product['id']: product for product in Product.objects.values('id', 'farm_id', 'inventory')}
+
+    totals = defaultdict(Decimal)
+    batch = []
+    sources = [
+        ('production', ProductionRecord, 1),
+        ('sale', Sale, -1),
+    ]
+    for source, model, sign in sources:
+        for row in model.objects.values('id', 'product_id', 'date', 'quantity').iterator(chunk_size=BATCH_SIZE):
+            quantity = sign * row['quantity']
+            totals[row['product_id']] += quantity
+            batch.append(ProductInventoryMovement(
+                product_id=row['product_id'], farm_id=products[row['product_id']]['farm_id'], date=row['date'],
+                quantity=quantity, source=source, source_id=row['id'],
+            ))
+            if len(batch) >= BATCH_SIZE:
+                ProductInventoryMovement.objects.bulk_create(batch)
+                batch = []
+
+    today = timezone.now().date()
+    for product_id, product in products.items():
+        drift = product['inventory'] - totals[product_id]
+        if drift:
+            batch.append(ProductInventoryMovement(
+                product_id=product_id, farm_id=product['farm_id'], date=today, quantity=drift,
+                source='adjustment', notes='Inventory not explained by production records and sales',
+            ))
+    ProductInventoryMovement.objects.bulk_create(batch)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('farms', '0015_search_trigram_indexes'),
+        ('products', '0005_timeline_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ProductInventorySnapshot',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField()),
+                ('quantity', models.DecimalField(decimal_places=2, max_digits=12)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('product', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='inventory_snapshots', to='products.product')),
+            ],
+            options={
+                'ordering': ['-date'],
+                'unique_together': {('product', 'date')},
+            },
+        ),
+        migrations.CreateModel(
+            name='ProductInventoryMovement',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField()),
+                ('quantity', models.DecimalField(decimal_places=2, max_digits=12)),
+                ('source', models.CharField(choices=[('production', 'Production Record'), ('sale', 'Sale'), ('adjustment', 'Adjustment')], max_length=20)),
+                ('source_id', models.BigIntegerField(blank=True, null=True)),
+                ('notes', models.CharField(blank=True, max_length=255)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('farm', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='inventory_movements', to='farms.farm')),
+                ('product', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='inventory_movements', to='products.product')),
+            ],
+            options={
+                'ordering': ['-date', '-id'],
+                'indexes': [models.Index(fields=['product', 'date', 'id'], name='inventory_movement_date_idx'), models.Index(fields=['source', 'source_id'], name='inventory_movement_source_idx')],
+            },
+        ),
+        migrations.RunPython(backfill_movements, migrations.RunPython.noop),
+    ]
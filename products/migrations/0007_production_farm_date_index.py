@@ -0,0 +1,17 @@
+# Generated by Django 4.2.13 on 2026-10-18 12:18
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0006_product_inventory_ledger'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='productionrecord',
+            index=models.Index(fields=['farm', 'date', 'time', 'id'], name='production_farm_date_idx'),
+        ),
+    ]
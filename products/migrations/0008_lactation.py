@@ -0,0 +1,43 @@
+# Generated by Django 4.2.13 on 2026-10-18 12:21
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('farms', '0015_search_trigram_indexes'),
+        ('animals', '0013_ai_farm_date_index'),
+        ('products', '0007_production_farm_date_index'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Lactation',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('number', models.PositiveIntegerField()),
+                ('calving_date', models.DateField()),
+                ('end_date', models.DateField(blank=True, null=True)),
+                ('record_days', models.PositiveIntegerField()),
+                ('last_record_date', models.DateField()),
+                ('total_yield', models.FloatField()),
+                ('a', models.FloatField(blank=True, null=True)),
+                ('b', models.FloatField(blank=True, null=True)),
+                ('c', models.FloatField(blank=True, null=True)),
+                ('peak_day', models.FloatField(blank=True, null=True)),
+                ('peak_yield', models.FloatField(blank=True, null=True)),
+                ('projected_305_yield', models.FloatField(blank=True, null=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('animal', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='lactations', to='animals.animal')),
+                ('farm', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='lactations', to='farms.farm')),
+                ('product', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='lactations', to='products.product')),
+            ],
+            options={
+                'ordering': ['animal', '-calving_date'],
+                'indexes': [models.Index(fields=['farm', 'product', 'end_date', 'projected_305_yield'], name='lactation_ranking_idx')],
+                'unique_together': {('animal', 'product', 'calving_date')},
+            },
+        ),
+    ]
@@ -0,0 +1,140 @@
+"""Ingest of a whole milking session of production records in one request.
+
+A session is one product, date and time with a list of entries, each an
+animal or an animal type with the quantity it produced. Every entry is
+validated against lookups loaded once per session, so validation costs a
+fixed number of queries whatever the herd size. Nothing is written unless
+every entry is valid; the records are then written with one bulk_create and
+the product's inventory moves by the session total in a single update.
+"""
+from datetime import date, time
+from decimal import Decimal, InvalidOperation
+from django.db import transaction
+from farms.cache import bump_data_version
+from animals.models import Animal, AnimalType
+from .lactation import schedule_lactation_refit
+from .models import Product, ProductionRecord, ProductInventoryMovement
+
+MAX_SESSION_ENTRIES = 2000
+
+QUANTITY_FIELD = ProductionRecord._meta.get_field('quantity')
+
+
+class SessionError(ValueError):
+    """An invalid milking session, with the errors of the session and of each entry"""
+
+    def __init__(self, errors):
+        super().__init__('Invalid milking session')
+        self.errors = errors
+
+
+def parse_quantity(value):
+    try:
+        quantity = Decimal(str(value))
+    except (InvalidOperation, TypeError):
+        return None, 'A number is required'
+    if not quantity.is_finite():
+        return None, 'A number is required'
+    if quantity < Decimal('0.01'):
+        return None, 'Ensure this value is greater than or equal to 0.01'
+    quantity = quantity.quantize(Decimal('0.01'))
+    if len(quantity.as_tuple().digits) > QUANTITY_FIELD.max_digits:
+        return None, f'Ensure that there are no more than {QUANTITY_FIELD.max_digits} digits in total'
+    return quantity, None
+
+
+def parse_id(value):
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def build_session_records(farm, data):
+    """Validate a session and return its product and unsaved ProductionRecord rows, raising SessionError"""
+    errors = {}
+    product = None
+    product_id = parse_id(data.get('product'))
+    if product_id is None:
+        errors['product'] = ['A product id is required']
+    else:
+        product = Product.objects.filter(id=product_id, farm=farm).first()
+        if product is None:
+            errors['product'] = [f'Product with id:{product_id} not found in farm:{farm.id}']
+    try:
+        session_date = date.fromisoformat(str(data.get('date')))
+    except ValueError:
+        errors['date'] = ['A date in YYYY-MM-DD format is required']
+    try:
+        session_time = time.fromisoformat(str(data.get('time')))
+    except ValueError:
+        errors['time'] = ['A time in HH:MM format is required']
+
+    entries = data.get('entries')
+    if not isinstance(entries, list) or not entries:
+        errors['entries'] = ['A list of entries is required']
+        raise SessionError(errors)
+    if len(entries) > MAX_SESSION_ENTRIES:
+        errors['entries'] = [f'A session has at most {MAX_SESSION_ENTRIES} entries']
+        raise SessionError(errors)
+
+    entries = [entry if isinstance(entry, dict) else {} for entry in entries]
+    animal_ids = {parse_id(entry.get('animal')) for entry in entries} - {None}
+    type_ids = {parse_id(entry.get('animal_type')) for entry in entries} - {None}
+    animals = set(Animal.objects.filter(farm=farm, id__in=animal_ids).values_list('id', flat=True))
+    animal_types = set(AnimalType.objects.filter(farm=farm, id__in=type_ids).values_list('id', flat=True))
+
+    records = []
+    entry_errors = []
+    seen = {}
+    for index, entry in enumerate(entries):
+        problems = {}
+        animal_id, type_id = parse_id(entry.get('animal')), parse_id(entry.get('animal_type'))
+        if (entry.get('animal') is None) == (entry.get('animal_type') is None):
+            problems['animal'] = ['Give either animal or animal_type']
+        elif entry.get('animal') is not None and animal_id not in animals:
+            problems['animal'] = [f'Animal with id:{entry["animal"]} not found in farm:{farm.id}']
+        elif entry.get('animal_type') is not None and type_id not in animal_types:
+            problems['animal_type'] = [f'Animal type with id:{entry["animal_type"]} not found in farm:{farm.id}']
+        else:
+            key = ('animal', animal_id) if animal_id is not None else ('animal_type', type_id)
+            if key in seen:
+                problems[key[0]] = [f'Duplicate of entry {seen[key]}']
+            seen.setdefault(key, index)
+        quantity, problem = parse_quantity(entry.get('quantity'))
+        if problem:
+            problems['quantity'] = [problem]
+        if problems:
+            entry_errors.append({'entry': index, 'errors': problems})
+            continue
+        records.append(ProductionRecord(
+            farm=farm, record_type='individual' if animal_id is not None else 'group',
+            animal_id=animal_id, animal_type_id=type_id, quantity=quantity,
+            notes=str(entry.get('notes') or data.get('notes') or ''),
+        ))
+
+    if entry_errors:
+        errors['entries'] = entry_errors
+    if errors:
+        raise SessionError(errors)
+    for record in records:
+        record.product = product
+        record.date = session_date
+        record.time = session_time
+    return product, records
+
+
+def record_milking_session(farm, data):
+    """Validate and write a milking session, returning its product and the created records"""
+    product, records = build_session_records(farm, data)
+    with transaction.atomic():
+        records = ProductionRecord.objects.bulk_create(records)
+        ProductInventoryMovement.objects.record_batch(
+            product, records[0].date, 'production', [(record.id, record.quantity) for record in records]
+        )
+        # bulk_create sends no signals, so invalidate the farm's cached responses
+        # and refit the lactations containing the session day here
+        transaction.on_commit(lambda: bump_data_version(farm.id))
+        schedule_lactation_refit([(record.animal_id, record.date) for record in records])
+    product.refresh_from_db(fields=['inventory'])
+    return product, records
@@ -1,5 +1,7 @@
-from django.db import models
+from django.db import models, transaction
+from django.db.models import F
 from django.core.validators import MinValueValidator
+from django.utils import timezone
 from decimal import Decimal
 from animals.models import Animal, AnimalType
 from farms.models import Farm
@@ -16,6 +18,22 @@ class Product(models.Model):
     def __str__(self):
         return f"{self.name} ({self.unit})"
 
+    def save(self, *args, **kwargs):
+        adding = self._state.adding
+        if not adding and kwargs.get('update_fields') is None:
+            # inventory only changes through ProductInventoryMovement, so a save
+            # must not write back a value read before concurrent movements
+            kwargs['update_fields'] = [
+                field.name for field in self._meta.concrete_fields
+                if not field.primary_key and field.name != 'inventory'
+            ]
+        with transaction.atomic():
+            super().save(*args, **kwargs)
+            if adding and self.inventory:
+                ProductInventoryMovement.objects.record(
+                    self, self.inventory, timezone.now().date(), 'adjustment', notes='Opening stock', apply=False
+                )
+
 class ProductionRecord(models.Model):
     RECORD_TYPES = [
         ('individual', 'Individual Animal'),
@@ -35,23 +53,25 @@ class ProductionRecord(models.Model):
     updated_at = models.DateTimeField(auto_now=True)
 
     def save(self, *args, **kwargs):
-        if self.record_type == 'individual':
-            self.product.inventory += self.quantity
-        else:
-            self.product.inventory += self.quantity
-        self.product.save()
-        super().save(*args, **kwargs)
-    
+        with transaction.atomic():
+            stored = ProductionRecord.objects.filter(pk=self.pk).values('product_id', 'date', 'quantity').first() if self.pk else None
+            super().save(*args, **kwargs)
+            ProductInventoryMovement.objects.record_change(self, 'production', stored, self.quantity)
+
     def delete(self, *args, **kwargs):
-        if self.record_type == 'individual':
-            self.product.inventory -= self.quantity
-        else:
-            self.product.inventory -= self.quantity
-        self.product.save()
-        super().delete(*args, **kwargs)
+        # Deletes cascading from an animal leave the inventory alone, the product was still produced
+        with transaction.atomic():
+            ProductInventoryMovement.objects.record(self.product, -self.quantity, self.date, 'production', self.pk)
+            return super().delete(*args, **kwargs)
 
     class Meta:
         ordering = ['-date', '-time']
+        # Newest first production of an animal, as the animal timeline pages it,
+        # and of a farm, as the production record listing pages it
+        indexes = [
+            models.Index(fields=['animal', 'date', 'id'], name='production_animal_date_idx'),
+            models.Index(fields=['farm', 'date', 'time', 'id'], name='production_farm_date_idx'),
+        ]
 
     def __str__(self):
         if self.record_type == 'individual':
@@ -97,15 +117,148 @@ class Sale(models.Model):
         ordering = ['-date']
 
     def save(self, *args, **kwargs):
-        self.product.inventory -= self.quantity
-        self.product.save()
         self.total_amount = self.quantity * self.unit_price
-        super().save(*args, **kwargs)
+        with transaction.atomic():
+            stored = Sale.objects.filter(pk=self.pk).values('product_id', 'date', 'quantity').first() if self.pk else None
+            super().save(*args, **kwargs)
+            if stored is not None:
+                stored['quantity'] = -stored['quantity']
+            ProductInventoryMovement.objects.record_change(self, 'sale', stored, -self.quantity)
 
     def delete(self, *args, **kwargs):
-        self.product.inventory += self.quantity
-        self.product.save()
-        super().delete(*args, **kwargs)
+        with transaction.atomic():
+            ProductInventoryMovement.objects.record(self.product, self.quantity, self.date, 'sale', self.pk)
+            return super().delete(*args, **kwargs)
+
+    def __str__(self):
+        return f"Sale of {self.quantity} {self.product.unit} to {self.buyer} on {self.date}" 
+
+class InventoryMovementManager(models.Manager):
+    def record(self, product, quantity, day, source, source_id=None, notes='', apply=True):
+        """Append a movement of quantity (negative for stock leaving) and apply it.
+
+        The product's inventory and the snapshots the movement predates are
+        updated in place with F() expressions, so concurrent movements never
+        lose each other's updates.
+        """
+        if not quantity:
+            return None
+        with transaction.atomic():
+            if apply:
+                # Taken first, the product row lock also serializes with snapshot builds
+                Product.objects.filter(pk=product.pk).update(inventory=F('inventory') + quantity)
+            ProductInventorySnapshot.objects.filter(product=product, date__gte=day).update(quantity=F('quantity') + quantity)
+            return self.create(
+                product=product, farm_id=product.farm_id, date=day, quantity=quantity,
+                source=source, source_id=source_id, notes=notes
+            )
+
+    def record_batch(self, product, day, source, quantities):
+        """Append one movement per (source_id, quantity) pair, all on one day, applied as a single increment"""
+        total = sum(quantity for source_id, quantity in quantities)
+        with transaction.atomic():
+            if total:
+                Product.objects.filter(pk=product.pk).update(inventory=F('inventory') + total)
+                ProductInventorySnapshot.objects.filter(product=product, date__gte=day).update(quantity=F('quantity') + total)
+            return self.bulk_create([
+                self.model(product=product, farm_id=product.farm_id, date=day, quantity=quantity, source=source, source_id=source_id)
+                for source_id, quantity in quantities if quantity
+            ])
+
+    def record_change(self, record, source, stored, quantity):
+        """Record the movements of a saved production record or sale.
+
+        stored holds the product_id, date and signed quantity the record had
+        before the save, None for a new record. An edit moves only the
+        difference, or reverses the old movement when the product or date changed.
+        """
+        if stored is not None and (stored['product_id'], stored['date']) == (record.product_id, record.date):
+            quantity -= stored['quantity']
+        elif stored is not None:
+            stored_product = Product.objects.get(pk=stored['product_id'])
+            self.record(stored_product, -stored['quantity'], stored['date'], source, record.pk)
+        self.record(record.product, quantity, record.date, source, record.pk)
+        record.product.refresh_from_db(fields=['inventory'])
+
+
+class ProductInventoryMovement(models.Model):
+    """Append-only change of a product's inventory, dated on the day it took effect"""
+    SOURCES = [
+        ('production', 'Production Record'),
+        ('sale', 'Sale'),
+        ('adjustment', 'Adjustment'),
+    ]
+
+    product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name='inventory_movements')
+    farm = models.ForeignKey(Farm, on_delete=models.CASCADE, related_name='inventory_movements')
+    date = models.DateField()
+    quantity = models.DecimalField(max_digits=12, decimal_places=2)
+    source = models.CharField(max_length=20, choices=SOURCES)
+    # Id of the production record or sale, kept after it is deleted
+    source_id = models.BigIntegerField(null=True, blank=True)
+    notes = models.CharField(max_length=255, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    objects = InventoryMovementManager()
+
+    class Meta:
+        ordering = ['-date', '-id']
+        indexes = [
+            models.Index(fields=['product', 'date', 'id'], name='inventory_movement_date_idx'),
+            models.Index(fields=['source', 'source_id'], name='inventory_movement_source_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.quantity:+} {self.product.unit} of {self.product.name} on {self.date} ({self.source})"
+
+
+class ProductInventorySnapshot(models.Model):
+    """Inventory of a product at the end of a day, maintained by products.inventory"""
+    product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name='inventory_snapshots')
+    date = models.DateField()
+    quantity = models.DecimalField(max_digits=12, decimal_places=2)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        ordering = ['-date']
+        unique_together = ['product', 'date']
+
+    def __str__(self):
+        return f"{self.product.name} on {self.date}: {self.quantity}"
+
+
+class Lactation(models.Model):
+    """A lactation of an animal with Wood's curve y = a * t^b * e^(-c t) fitted to its yield of a product.
+
+    Maintained by products.lactation. t is the day in milk, 1 on the calving
+    date. The curve fields are null until enough days are recorded to fit it,
+    and peak_day and peak_yield also when the fitted curve has no peak.
+    """
+    farm = models.ForeignKey(Farm, on_delete=models.CASCADE, related_name='lactations')
+    animal = models.ForeignKey(Animal, on_delete=models.CASCADE, related_name='lactations')
+    product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name='lactations')
+    number = models.PositiveIntegerField()
+    calving_date = models.DateField()
+    # The day before the next calving, null while the lactation is current
+    end_date = models.DateField(null=True, blank=True)
+    record_days = models.PositiveIntegerField()
+    last_record_date = models.DateField()
+    total_yield = models.FloatField()
+    a = models.FloatField(null=True, blank=True)
+    b = models.FloatField(null=True, blank=True)
+    c = models.FloatField(null=True, blank=True)
+    peak_day = models.FloatField(null=True, blank=True)
+    peak_yield = models.FloatField(null=True, blank=True)
+    projected_305_yield = models.FloatField(null=True, blank=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        ordering = ['animal', '-calving_date']
+        unique_together = ['animal', 'product', 'calving_date']
+        # Herd ranking of the current lactations of a product
+        indexes = [
+            models.Index(fields=['farm', 'product', 'end_date', 'projected_305_yield'], name='lactation_ranking_idx'),
+        ]
 
     def __str__(self):
-        return f"Sale of {self.quantity} {self.product.unit} to {self.buyer} on {self.date}" 
\ No newline at end of file
+        return f"Lactation {self.number} of {self.animal.name} from {self.calving_date} ({self.product.name})"
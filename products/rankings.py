@@ -0,0 +1,77 @@
+"""Ranking of the herd's producers of each product over a period.
+
+One grouped query sums every animal's individual records of the period and
+of the period of the same length before it, then ranks the animals within
+each product with window functions: Rank from the top and from the bottom,
+PercentRank, and the herd total of the product for each animal's share. Only
+the top and bottom rows leave the database.
+"""
+from datetime import date, timedelta
+from django.db.models import F, FloatField, Func, Q, Sum, Window
+from django.db.models.functions import Cast, PercentRank, Rank
+from .models import ProductionRecord
+
+DEFAULT_RANKING_SIZE = 10
+
+
+class PartitionSum(Func):
+    """SUM usable over an aggregate inside a Window, which Sum refuses"""
+    function = 'SUM'
+    window_compatible = True
+
+
+def has_previous_period(start_date, end_date):
+    """Whether the period of the same length before start_date starts on or after date.min"""
+    return (start_date - date.min).days > (end_date - start_date).days
+
+
+def production_ranking(farm_id, start_date, end_date, limit=DEFAULT_RANKING_SIZE, product_id=None):
+    """Return {product id: {'top': rows, 'bottom': rows}} for the animals producing between start_date and end_date.
+
+    Each row has the animal's total, rank (1 for the highest), percentile
+    (the share of the herd producing less), share of the herd total and the
+    change against the previous period, null when it produced nothing then.
+    Bottom rows are lowest first. Tied animals share a rank, so a list may
+    run past limit.
+    """
+    previous_start = start_date - timedelta(days=(end_date - start_date).days + 1)
+    records = ProductionRecord.objects.filter(
+        farm_id=farm_id, animal__isnull=False, date__range=(previous_start, end_date)
+    )
+    if product_id is not None:
+        records = records.filter(product_id=product_id)
+
+    # The windows order on a float cast, as SQLite cannot order windows on decimal aggregates
+    total = Cast('total', FloatField())
+    partition = F('product_id')
+    rows = records.values('product_id', 'animal_id').annotate(
+        animal_name=F('animal__name'),
+        total=Sum('quantity', filter=Q(date__gte=start_date)),
+        previous=Sum('quantity', filter=Q(date__lt=start_date)),
+    ).filter(total__isnull=False).annotate(
+        rank=Window(Rank(), partition_by=partition, order_by=total.desc()),
+        bottom_rank=Window(Rank(), partition_by=partition, order_by=total.asc()),
+        percentile=Window(PercentRank(), partition_by=partition, order_by=total.asc()),
+        herd_total=Window(PartitionSum('total'), partition_by=partition),
+    ).filter(Q(rank__lte=limit) | Q(bottom_rank__lte=limit)).order_by('product_id', 'rank', 'animal_name')
+
+    ranking = {}
+    for row in rows:
+        product = ranking.setdefault(row['product_id'], {'top': [], 'bottom': []})
+        previous = row['previous']
+        entry = {
+            'animal': row['animal_id'],
+            'name': row['animal_name'],
+            'total': row['total'],
+            'rank': row['rank'],
+            'percentile': round(row['percentile'] * 100, 1),
+            'share': round(float(row['total'] / row['herd_total']), 4) if row['herd_total'] else None,
+            'previous_total': previous,
+            'change': row['total'] - previous if previous is not None else None,
+            'change_percent': round(float((row['total'] - previous) / previous) * 100, 1) if previous else None,
+        }
+        if row['rank'] <= limit:
+            product['top'].append(entry)
+        if row['bottom_rank'] <= limit:
+            product['bottom'].insert(0, entry)
+    return ranking
@@ -1,5 +1,5 @@
 from rest_framework import serializers
-from .models import Product, ProductionRecord, Buyer, Sale
+from .models import Product, ProductionRecord, Buyer, Sale, ProductInventoryMovement, Lactation
 from animals.serializers import AnimalSerializer, AnimalTypeSerializer
 from farms.serializers import FarmSerializer
 
@@ -11,6 +11,20 @@ class ProductSerializer(serializers.ModelSerializer):
         fields = ['id', 'name', 'description', 'unit', 'farm', 'farm_details', 'inventory', 'created_at', 'updated_at']
         read_only_fields = ['created_at', 'updated_at']
 
+    def validate_inventory(self, value):
+        # inventory is the opening stock of a new product, later changes are inventory movements.
+        # The stored value may be sent back unchanged, as clients echo the product they loaded.
+        if self.instance is not None and value != self.instance.inventory:
+            raise serializers.ValidationError(
+                "Inventory can't be edited here, record the change with adjust_product_inventory"
+            )
+        return value
+
+    def update(self, instance, validated_data):
+        # Saved through the ledger only, never over a concurrent movement
+        validated_data.pop('inventory', None)
+        return super().update(instance, validated_data)
+
     def get_farm_details(self, obj):
         return FarmSerializer(obj.farm).data
 
@@ -52,6 +66,30 @@ class ProductionRecordSerializer(serializers.ModelSerializer):
             raise serializers.ValidationError("Animal type is required for group records")
         return data
 
+class ProductionRecordRowSerializer(serializers.ModelSerializer):
+    """A production record with the ids and names of what it refers to only, for long listings"""
+    product_name = serializers.CharField(source='product.name', read_only=True)
+    unit = serializers.CharField(source='product.unit', read_only=True)
+    animal_name = serializers.CharField(source='animal.name', read_only=True, default=None)
+    animal_type_name = serializers.CharField(source='animal_type.name', read_only=True, default=None)
+
+    class Meta:
+        model = ProductionRecord
+        fields = [
+            'id', 'date', 'time', 'record_type', 'quantity', 'product', 'product_name', 'unit',
+            'animal', 'animal_name', 'animal_type', 'animal_type_name',
+        ]
+
+class LactationSerializer(serializers.ModelSerializer):
+    animal_name = serializers.CharField(source='animal.name', read_only=True)
+
+    class Meta:
+        model = Lactation
+        fields = [
+            'id', 'animal', 'animal_name', 'product', 'number', 'calving_date', 'end_date', 'record_days',
+            'last_record_date', 'total_yield', 'a', 'b', 'c', 'peak_day', 'peak_yield', 'projected_305_yield', 'updated_at',
+        ]
+
 class BuyerSerializer(serializers.ModelSerializer):
     farm_details = serializers.SerializerMethodField()
 
@@ -94,4 +132,9 @@ class SaleSerializer(serializers.ModelSerializer):
             raise serializers.ValidationError("Quantity must be greater than 0")
         if data['unit_price'] <= 0:
             raise serializers.ValidationError("Unit price must be greater than 0")
-        return data 
\ No newline at end of file
+        return data 
+
+class ProductInventoryMovementSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = ProductInventoryMovement
+        fields = ['id', 'product', 'date', 'quantity', 'source', 'source_id', 'notes', 'created_at']
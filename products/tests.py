@@ -1,3 +1,375 @@
-from django.test import TestCase
+from datetime import date, time, timedelta
+from decimal import Decimal
+from math import exp
+from django.contrib.auth.models import User
+from django.db import connection, transaction
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from rest_framework.test import APIClient
+from animals.models import Animal, AnimalType
+from farms.models import Farm
+from users.models import UserProfile
+from .inventory import adjust_inventory, inventory_as_of, take_inventory_snapshot
+from .lactation import compute_lactations, refresh_lactations
+from .milking import record_milking_session
+from .models import Buyer, Lactation, Product, ProductInventoryMovement, ProductInventorySnapshot, ProductionRecord, Sale
 
-# Create your tests here.
+LOCAL_CACHE = {'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}}
+
+
+class InventoryLedgerTestCase(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user('farmer@example.com', 'farmer@example.com', 'password')
+        UserProfile.objects.create(user=self.user, email=self.user.email, first_name='Jo', last_name='Kamau', phone='0700')
+        self.farm = Farm.objects.create(name='Green Acres', address='Nakuru', created_by=self.user)
+        self.product = Product.objects.create(name='Milk', unit='liters', farm=self.farm)
+        self.buyer = Buyer.objects.create(name='Dairy Co', contact_person='Jane', phone='0700', address='Town', farm=self.farm)
+        self.cow_type = AnimalType.objects.create(name='Cow', farm=self.farm, created_by=self.user)
+        self.cows = [
+            Animal.objects.create(
+                name=f'Cow {number}', type=self.cow_type, gender='Female',
+                date_of_birth=date(2020, 1, 1), farm=self.farm, created_by=self.user,
+            )
+            for number in range(3)
+        ]
+        self.day = date(2026, 5, 10)
+
+    def add_record(self, quantity, day=None, animal=None):
+        return ProductionRecord.objects.create(
+            product=self.product, farm=self.farm, record_type='individual', animal=animal or self.cows[0],
+            quantity=Decimal(quantity), date=day or self.day, time=time(6),
+        )
+
+    def add_sale(self, quantity, day=None):
+        return Sale.objects.create(
+            product=self.product, farm=self.farm, buyer=self.buyer, quantity=Decimal(quantity),
+            unit_price=Decimal('50'), total_amount=0, payment_method='cash', date=day or self.day,
+        )
+
+    def assertInventory(self, quantity):
+        self.product.refresh_from_db()
+        self.assertEqual(self.product.inventory, Decimal(quantity))
+        total = sum(self.product.inventory_movements.values_list('quantity', flat=True), Decimal(0))
+        self.assertEqual(total, Decimal(quantity))
+
+
+class ProductionRecordInventoryTests(InventoryLedgerTestCase):
+    def test_new_record_adds_production_movement(self):
+        record = self.add_record('12.5')
+        self.assertInventory('12.5')
+        movement = ProductInventoryMovement.objects.get()
+        self.assertEqual((movement.source, movement.source_id, movement.date), ('production', record.id, self.day))
+
+    def test_edit_moves_the_difference(self):
+        record = self.add_record('10')
+        record.quantity = Decimal('14')
+        record.save()
+        self.assertInventory('14')
+        self.assertEqual(ProductInventoryMovement.objects.first().quantity, Decimal('4'))
+
+    def test_date_change_moves_the_record_between_days(self):
+        record = self.add_record('10')
+        record.date = self.day + timedelta(days=2)
+        record.save()
+        self.assertInventory('10')
+        self.assertEqual(inventory_as_of(self.product.id, self.day), Decimal('0'))
+        self.assertEqual(inventory_as_of(self.product.id, self.day + timedelta(days=2)), Decimal('10'))
+
+    def test_delete_reverses_the_record(self):
+        self.add_record('10').delete()
+        self.assertInventory('0')
+        self.assertEqual(ProductInventoryMovement.objects.count(), 2)
+
+
+class SaleInventoryTests(InventoryLedgerTestCase):
+    def test_sale_takes_stock_out(self):
+        self.add_record('20')
+        sale = self.add_sale('8')
+        self.assertInventory('12')
+        self.assertEqual(ProductInventoryMovement.objects.get(source='sale').source_id, sale.id)
+
+    def test_sale_edit_and_delete(self):
+        self.add_record('20')
+        sale = self.add_sale('8')
+        sale.quantity = Decimal('5')
+        sale.save()
+        self.assertInventory('15')
+        sale.delete()
+        self.assertInventory('20')
+
+
+class ProductInventoryTests(InventoryLedgerTestCase):
+    def test_opening_stock_is_recorded_once(self):
+        product = Product.objects.create(name='Eggs', unit='trays', farm=self.farm, inventory=Decimal('30'))
+        product.refresh_from_db()
+        self.assertEqual(product.inventory, Decimal('30'))
+        self.assertEqual(product.inventory_movements.get().source, 'adjustment')
+
+    def test_product_save_keeps_concurrent_movements(self):
+        stale = Product.objects.get(pk=self.product.pk)
+        self.add_record('10')
+        stale.name = 'Whole milk'
+        stale.save()
+        self.assertInventory('10')
+
+    def test_adjust_to_a_counted_inventory(self):
+        self.add_record('10')
+        movement = adjust_inventory(self.product, self.day, inventory=Decimal('7'))
+        self.assertEqual(movement.quantity, Decimal('-3'))
+        self.assertInventory('7')
+
+
+class InventorySnapshotTests(InventoryLedgerTestCase):
+    def test_inventory_as_of_a_day(self):
+        self.add_record('10', self.day - timedelta(days=1))
+        self.add_record('5', self.day + timedelta(days=1), animal=self.cows[1])
+        self.add_sale('3', self.day)
+        self.assertEqual(inventory_as_of(self.product.id, self.day - timedelta(days=2)), Decimal('0'))
+        self.assertEqual(inventory_as_of(self.product.id, self.day), Decimal('7'))
+        self.assertEqual(inventory_as_of(self.product.id, self.day + timedelta(days=1)), Decimal('12'))
+
+    def test_snapshot_matches_the_movements(self):
+        self.add_record('10', self.day - timedelta(days=1))
+        self.assertEqual(take_inventory_snapshot(self.product.id, self.day), Decimal('10'))
+        self.add_record('4', self.day + timedelta(days=1), animal=self.cows[1])
+        self.assertEqual(inventory_as_of(self.product.id, self.day + timedelta(days=1)), Decimal('14'))
+
+    def test_backdated_movement_updates_later_snapshots(self):
+        self.add_record('10', self.day)
+        take_inventory_snapshot(self.product.id, self.day)
+        take_inventory_snapshot(self.product.id, self.day + timedelta(days=3))
+        self.add_record('6', self.day - timedelta(days=5), animal=self.cows[1])
+        snapshots = dict(ProductInventorySnapshot.objects.values_list('date', 'quantity'))
+        self.assertEqual(snapshots, {self.day: Decimal('16'), self.day + timedelta(days=3): Decimal('16')})
+        self.assertEqual(inventory_as_of(self.product.id, self.day + timedelta(days=1)), Decimal('16'))
+
+    def test_movement_after_a_snapshot_leaves_it(self):
+        take_inventory_snapshot(self.product.id, self.day)
+        self.add_record('6', self.day + timedelta(days=1))
+        self.assertEqual(ProductInventorySnapshot.objects.get().quantity, Decimal('0'))
+
+
+class MilkingSessionInventoryTests(InventoryLedgerTestCase):
+    def test_session_moves_inventory_in_one_update(self):
+        data = {
+            'product': self.product.id, 'date': self.day.isoformat(), 'time': '06:00',
+            'entries': [{'animal': cow.id, 'quantity': '10.25'} for cow in self.cows],
+        }
+        with CaptureQueriesContext(connection) as queries:
+            product, records = record_milking_session(self.farm, data)
+        updates = [query for query in queries if query['sql'].startswith('UPDATE "products_product"')]
+        self.assertEqual(len(updates), 1)
+        self.assertEqual(product.inventory, Decimal('30.75'))
+        self.assertEqual(
+            set(ProductInventoryMovement.objects.values_list('source_id', flat=True)),
+            {record.id for record in records},
+        )
+        self.assertInventory('30.75')
+
+
+@override_settings(CACHES=LOCAL_CACHE)
+class EditProductInventoryTests(InventoryLedgerTestCase):
+    def setUp(self):
+        super().setUp()
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        self.add_record('10')
+        self.url = f'/products/edit_product/{self.farm.id}/{self.product.id}'
+
+    def test_inventory_change_is_rejected(self):
+        response = self.client.put(self.url, {'name': 'Milk', 'unit': 'liters', 'inventory': '50'}, format='json')
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('adjust_product_inventory', response.data['inventory'][0])
+        self.assertInventory('10')
+
+    def test_unchanged_inventory_is_accepted(self):
+        response = self.client.put(self.url, {'name': 'Raw milk', 'unit': 'liters', 'inventory': '10.00'}, format='json')
+        self.assertEqual(response.status_code, 200)
+        self.assertInventory('10')
+
+
+class LactationTestCase(InventoryLedgerTestCase):
+    def setUp(self):
+        super().setUp()
+        self.dam = self.cows[0]
+
+    def add_calf(self, born, name='Calf'):
+        return Animal.objects.create(
+            name=name, type=self.cow_type, gender='Female', date_of_birth=born,
+            dam=self.dam, farm=self.farm, created_by=self.user,
+        )
+
+    def add_yields(self, calving, yields, animal=None):
+        """Bulk insert a record on each day in milk of yields, a {day in milk: quantity} dict"""
+        ProductionRecord.objects.bulk_create([
+            ProductionRecord(
+                product=self.product, farm=self.farm, record_type='individual', animal=animal or self.dam,
+                quantity=Decimal(str(round(quantity, 2))), date=calving + timedelta(days=day - 1), time=time(6),
+            )
+            for day, quantity in yields.items()
+        ])
+
+
+class LactationProjectionTests(LactationTestCase):
+    def test_rising_lactation_is_not_projected(self):
+        self.add_calf(self.day)
+        self.add_yields(self.day, {day: 10 + 1.5 * day for day in range(1, 13)})
+        computed, (lactation,) = compute_lactations([self.dam.id])
+        self.assertEqual(computed, [(self.dam.id, self.day)])
+        self.assertEqual(lactation.record_days, 12)
+        self.assertLess(lactation.c, 0)
+        self.assertIsNone(lactation.peak_day)
+        self.assertIsNone(lactation.projected_305_yield)
+
+    def test_peak_past_young_lactation_is_not_projected(self):
+        self.add_calf(self.day)
+        # Wood's curve peaking on day 60, recorded for 20 days only
+        self.add_yields(self.day, {day: 15 * day ** 0.3 * exp(-0.005 * day) for day in range(1, 21)})
+        computed, (lactation,) = compute_lactations([self.dam.id])
+        self.assertAlmostEqual(lactation.peak_day, 60, delta=3)
+        self.assertIsNone(lactation.projected_305_yield)
+
+
+class LactationRefitTests(LactationTestCase):
+    def test_milking_session_refits_its_lactation(self):
+        self.add_calf(self.day)
+        self.add_yields(self.day, {day: 20 for day in range(1, 31)})
+        session_day = self.day + timedelta(days=30)
+        data = {
+            'product': self.product.id, 'date': session_day.isoformat(), 'time': '06:00',
+            'entries': [{'animal': self.dam.id, 'quantity': '21'}],
+        }
+        with self.captureOnCommitCallbacks(execute=True):
+            record_milking_session(self.farm, data)
+        lactation = Lactation.objects.get(animal=self.dam)
+        self.assertEqual((lactation.record_days, lactation.last_record_date), (31, session_day))
+
+    def test_deleted_records_refit_once(self):
+        self.add_calf(self.day)
+        self.add_yields(self.day, {day: 20 for day in range(1, 31)})
+        with self.captureOnCommitCallbacks() as callbacks:
+            with transaction.atomic():
+                for record in ProductionRecord.objects.filter(animal=self.dam):
+                    record.delete()
+        refits = [callback for callback in callbacks if getattr(callback, 'key', None) == 'lactation_refit']
+        self.assertEqual(len(refits), 1)
+        self.assertEqual(len(refits[0].values), 30)
+
+
+def wood_yields(a, b, c, days):
+    return {day: a * day ** b * exp(-c * day) for day in days}
+
+
+class LactationFitTests(LactationTestCase):
+    def test_batch_recovers_known_curves(self):
+        second_dam = self.cows[1]
+        self.add_calf(self.day)
+        Animal.objects.create(
+            name='Second calf', type=self.cow_type, gender='Female', date_of_birth=self.day,
+            dam=second_dam, farm=self.farm, created_by=self.user,
+        )
+        curves = {self.dam.id: (18.0, 0.25, 0.004), second_dam.id: (12.0, 0.35, 0.006)}
+        for animal_id, curve in curves.items():
+            self.add_yields(self.day, wood_yields(*curve, range(1, 201, 2)), animal=Animal.objects.get(id=animal_id))
+        computed, lactations = compute_lactations([self.dam.id, second_dam.id])
+        self.assertEqual(len(lactations), 2)
+        for lactation in lactations:
+            a, b, c = curves[lactation.animal_id]
+            self.assertAlmostEqual(lactation.a, a, delta=a * 0.01)
+            self.assertAlmostEqual(lactation.b, b, delta=0.005)
+            self.assertAlmostEqual(lactation.c, c, delta=0.0002)
+            self.assertAlmostEqual(lactation.peak_day, b / c, delta=b / c * 0.03)
+            projected = sum(wood_yields(a, b, c, range(1, 306)).values())
+            self.assertAlmostEqual(lactation.projected_305_yield, projected, delta=projected * 0.01)
+            self.assertEqual(lactation.record_days, 100)
+
+    def test_too_few_days_are_not_fitted(self):
+        self.add_calf(self.day)
+        self.add_yields(self.day, wood_yields(18, 0.25, 0.004, range(1, 10)))
+        computed, (lactation,) = compute_lactations([self.dam.id])
+        self.assertEqual(lactation.record_days, 9)
+        self.assertIsNone(lactation.a)
+        self.assertIsNone(lactation.projected_305_yield)
+
+    def test_lactations_split_at_calving_dates(self):
+        second_calving = self.day + timedelta(days=100)
+        self.add_calf(self.day, 'First calf')
+        self.add_calf(second_calving, 'Second calf')
+        # Records before the first calving belong to no lactation
+        self.add_yields(self.day - timedelta(days=5), {1: 9, 2: 9})
+        self.add_yields(self.day, wood_yields(18, 0.25, 0.004, range(1, 101)))
+        self.add_yields(second_calving, wood_yields(22, 0.2, 0.003, range(1, 31)))
+        computed, lactations = compute_lactations([self.dam.id])
+        first, second = sorted(lactations, key=lambda lactation: lactation.number)
+        self.assertEqual((first.number, first.calving_date, first.end_date), (1, self.day, second_calving - timedelta(days=1)))
+        self.assertEqual((first.record_days, first.last_record_date), (100, second_calving - timedelta(days=1)))
+        self.assertEqual((second.number, second.calving_date, second.end_date), (2, second_calving, None))
+        self.assertEqual(second.record_days, 30)
+        self.assertAlmostEqual(second.a, 22, delta=0.3)
+        self.assertAlmostEqual(
+            first.total_yield, sum(round(value, 2) for value in wood_yields(18, 0.25, 0.004, range(1, 101)).values()),
+            places=6,
+        )
+
+
+class LactationRefitScopeTests(LactationTestCase):
+    def setUp(self):
+        super().setUp()
+        self.second_calving = self.day + timedelta(days=100)
+        self.add_calf(self.day, 'First calf')
+        self.add_calf(self.second_calving, 'Second calf')
+        self.add_yields(self.day, {day: 20 for day in range(1, 101)})
+        self.add_yields(self.second_calving, {day: 25 for day in range(1, 31)})
+        refresh_lactations([self.dam.id])
+        self.first, self.second = Lactation.objects.filter(animal=self.dam).order_by('number')
+
+    def test_refit_replaces_only_the_lactation_of_the_day(self):
+        day = self.second_calving + timedelta(days=3)
+        computed, lactations = compute_lactations([self.dam.id], {self.dam.id: {day}})
+        self.assertEqual(computed, [(self.dam.id, self.second_calving)])
+        self.assertEqual([lactation.calving_date for lactation in lactations], [self.second_calving])
+
+        refresh_lactations([self.dam.id], {self.dam.id: {day}})
+        first, second = Lactation.objects.filter(animal=self.dam).order_by('number')
+        self.assertEqual(first.id, self.first.id)
+        self.assertNotEqual(second.id, self.second.id)
+
+    def test_record_edit_refits_its_lactation(self):
+        record = ProductionRecord.objects.get(animal=self.dam, date=self.day + timedelta(days=9))
+        with self.captureOnCommitCallbacks(execute=True):
+            record.quantity = Decimal('30')
+            record.save()
+        first, second = Lactation.objects.filter(animal=self.dam).order_by('number')
+        self.assertEqual(first.total_yield, 20 * 100 + 10)
+        self.assertEqual(second.id, self.second.id)
+
+    def test_day_before_any_calving_refits_nothing(self):
+        self.assertEqual(compute_lactations([self.dam.id], {self.dam.id: {self.day - timedelta(days=1)}}), ([], []))
+
+
+@override_settings(CACHES=LOCAL_CACHE)
+class AnalyticsPeriodTests(InventoryLedgerTestCase):
+    def setUp(self):
+        super().setUp()
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        self.add_record('12', day=date(1, 2, 15))
+
+    def get(self, endpoint, **params):
+        return self.client.get(f'/products/{endpoint}/{self.farm.id}', {'product_id': self.product.id, **params})
+
+    def test_ranking_needs_a_previous_period(self):
+        for params in ({'start': '0001-01-01', 'end': '0001-01-01'}, {'start': '0001-01-10', 'end': '0001-02-15'},
+                       {'end': '0001-01-05'}):
+            self.assertEqual(self.get('get_production_ranking', **params).status_code, 400, params)
+        response = self.get('get_production_ranking', start='0001-02-01', end='0001-03-01')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['products'][0]['top'][0]['total'], Decimal('12'))
+
+    def test_analytics_needs_its_warmup(self):
+        for params in ({'start': '0001-01-01', 'end': '0001-01-01'}, {'start': '0001-01-29', 'end': '0001-02-15'},
+                       {'end': '0001-01-05'}):
+            self.assertEqual(self.get('get_yield_analytics', **params).status_code, 400, params)
+        response = self.get('get_yield_analytics', start='0001-01-30', end='0001-02-15')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['animals'][0]['daily_total'][-1], 12.0)
@@ -8,13 +8,21 @@ urlpatterns = [
     path('add_product/<int:farm_id>', views.add_product, name='add_product'),
     path('edit_product/<int:farm_id>/<int:id>', views.edit_product, name='edit_product'),
     path('delete_product/<int:farm_id>/<int:id>', views.delete_product, name='delete_product'),
+    path('get_product_inventory/<int:farm_id>/<int:id>', views.get_product_inventory, name='get_product_inventory'),
+    path('get_inventory_movements/<int:farm_id>/<int:id>', views.get_inventory_movements, name='get_inventory_movements'),
+    path('adjust_product_inventory/<int:farm_id>/<int:id>', views.adjust_product_inventory, name='adjust_product_inventory'),
 
     # Production Record URLs
     path('get_production_records/<int:farm_id>', views.get_production_records, name='get_production_records'),
+    path('get_production_record_page/<int:farm_id>', views.get_production_record_page, name='get_production_record_page'),
     path('get_production_record/<int:farm_id>/<int:id>', views.get_production_record, name='get_production_record'),
     path('add_production_record/<int:farm_id>', views.add_production_record, name='add_production_record'),
     path('edit_production_record/<int:farm_id>/<int:id>', views.edit_production_record, name='edit_production_record'),
     path('delete_production_record/<int:farm_id>/<int:id>', views.delete_production_record, name='delete_production_record'),
+    path('get_yield_analytics/<int:farm_id>', views.get_yield_analytics, name='get_yield_analytics'),
+    path('get_production_ranking/<int:farm_id>', views.get_production_ranking, name='get_production_ranking'),
+    path('get_lactations/<int:farm_id>', views.get_lactations, name='get_lactations'),
+    path('add_milking_session/<int:farm_id>', views.add_milking_session, name='add_milking_session'),
 
     # Buyer URLs
     path('get_buyers/<int:farm_id>', views.get_buyers, name='get_buyers'),
@@ -3,9 +3,20 @@ from rest_framework.permissions import IsAuthenticated
 from rest_framework.response import Response
 from rest_framework import status
 from django.shortcuts import get_object_or_404
-from .models import Product, ProductionRecord, Buyer, Sale
-from .serializers import ProductSerializer, ProductionRecordSerializer, BuyerSerializer, SaleSerializer
+from .models import Product, ProductionRecord, Buyer, Sale, ProductInventoryMovement, Lactation
+from .serializers import (
+    ProductSerializer, ProductionRecordSerializer, ProductionRecordRowSerializer, BuyerSerializer, SaleSerializer,
+    ProductInventoryMovementSerializer, LactationSerializer,
+)
+from django.db.models import F
+from .inventory import inventory_as_of, adjust_inventory
+from .milking import SessionError, record_milking_session
+from .yields import EARLIEST_START, MAX_ANALYTICS_DAYS, yield_analytics
+from .rankings import DEFAULT_RANKING_SIZE, has_previous_period, production_ranking
 from farms.models import Farm
+from farms.pagination import paginate_keyset, get_page_size
+from datetime import date, timedelta
+from decimal import Decimal, InvalidOperation
 from animals.models import Animal, AnimalType
 
 # Product Views
@@ -70,6 +81,66 @@ def delete_product(request, farm_id, id):
     product.delete()
     return Response(status=status.HTTP_204_NO_CONTENT)
 
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+def get_product_inventory(request, farm_id, id):
+    """Get the inventory of a product at the end of `date`, the current inventory by default"""
+    farm = get_object_or_404(Farm, id=farm_id)
+    product = get_object_or_404(Product, id=id, farm=farm)
+    if 'date' not in request.query_params:
+        return Response({'product': product.id, 'date': date.today(), 'inventory': product.inventory})
+    try:
+        day = date.fromisoformat(request.query_params['date'])
+    except ValueError:
+        return Response({'error': 'date must be in YYYY-MM-DD format'}, status=status.HTTP_400_BAD_REQUEST)
+    return Response({'product': product.id, 'date': day, 'inventory': inventory_as_of(product.id, day)})
+
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+def get_inventory_movements(request, farm_id, id):
+    """Get the inventory movements of a product, latest first, one keyset page at a time"""
+    farm = get_object_or_404(Farm, id=farm_id)
+    product = get_object_or_404(Product, id=id, farm=farm)
+    movements = ProductInventoryMovement.objects.filter(product=product)
+    try:
+        if 'start_date' in request.query_params:
+            movements = movements.filter(date__gte=date.fromisoformat(request.query_params['start_date']))
+        if 'end_date' in request.query_params:
+            movements = movements.filter(date__lte=date.fromisoformat(request.query_params['end_date']))
+        limit = get_page_size(request.query_params.get('limit'))
+        page, next_cursor = paginate_keyset(movements, ['-date', '-id'], request.query_params.get('cursor'), limit)
+    except ValueError as e:
+        return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+    serializer = ProductInventoryMovementSerializer(page, many=True)
+    return Response({'results': serializer.data, 'next_cursor': next_cursor})
+
+@api_view(['POST'])
+@permission_classes([IsAuthenticated])
+def adjust_product_inventory(request, farm_id, id):
+    """Record a stock adjustment of a product.
+
+    Either `quantity`, the change (negative for losses), or `inventory`, the
+    counted stock to correct the inventory to, is required. `date` defaults to today.
+    """
+    farm = get_object_or_404(Farm, id=farm_id)
+    product = get_object_or_404(Product, id=id, farm=farm)
+    given = [field for field in ('quantity', 'inventory') if request.data.get(field) not in (None, '')]
+    if len(given) != 1:
+        return Response({'error': 'Give either quantity or inventory'}, status=status.HTTP_400_BAD_REQUEST)
+    try:
+        value = Decimal(str(request.data[given[0]]))
+        day = date.fromisoformat(request.data['date']) if request.data.get('date') else date.today()
+    except (InvalidOperation, ValueError):
+        return Response({'error': f'{given[0]} must be a number and date in YYYY-MM-DD format'}, status=status.HTTP_400_BAD_REQUEST)
+    if not value.is_finite():
+        return Response({'error': f'{given[0]} must be a number'}, status=status.HTTP_400_BAD_REQUEST)
+
+    movement = adjust_inventory(product, day, notes=str(request.data.get('notes') or '')[:255], **{given[0]: value})
+    return Response({
+        'movement': ProductInventoryMovementSerializer(movement).data if movement else None,
+        'inventory': product.inventory,
+    }, status=status.HTTP_201_CREATED if movement else status.HTTP_200_OK)
+
 # Production Record Views
 @api_view(['GET'])
 @permission_classes([IsAuthenticated])
@@ -97,6 +168,42 @@ def get_production_records(request, farm_id):
     serializer = ProductionRecordSerializer(records, many=True)
     return Response(serializer.data)
 
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+def get_production_record_page(request, farm_id):
+    """Get a farm's production records, latest first, one keyset page of slim rows at a time.
+
+    Takes the filters of get_production_records and `limit` and `cursor`.
+    Rows carry the ids and names of their product, animal and animal type;
+    get_production_record returns the full record.
+    """
+    farm = get_object_or_404(Farm, id=farm_id)
+    params = request.query_params
+    records = ProductionRecord.objects.filter(farm=farm).select_related('product', 'animal', 'animal_type').only(
+        'id', 'date', 'time', 'record_type', 'quantity',
+        'product__name', 'product__unit', 'animal__name', 'animal_type__name',
+    )
+    try:
+        if params.get('animal_id'):
+            records = records.filter(animal_id=int(params['animal_id']))
+        if params.get('animal_type_id'):
+            records = records.filter(animal_type_id=int(params['animal_type_id']))
+        if params.get('product_id'):
+            records = records.filter(product_id=int(params['product_id']))
+        if params.get('start_date'):
+            records = records.filter(date__gte=date.fromisoformat(params['start_date']))
+        if params.get('end_date'):
+            records = records.filter(date__lte=date.fromisoformat(params['end_date']))
+    except ValueError:
+        return Response({'error': 'ids must be numbers and dates in YYYY-MM-DD format'}, status=status.HTTP_400_BAD_REQUEST)
+    try:
+        limit = get_page_size(params.get('limit'))
+        page, next_cursor = paginate_keyset(records, ['-date', '-time', '-id'], params.get('cursor'), limit)
+    except ValueError as e:
+        return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+    serializer = ProductionRecordRowSerializer(page, many=True)
+    return Response({'results': serializer.data, 'next_cursor': next_cursor})
+
 @api_view(['GET'])
 @permission_classes([IsAuthenticated])
 def get_production_record(request, farm_id, id):
@@ -156,6 +263,117 @@ def delete_production_record(request, farm_id, id):
     record.delete()
     return Response(status=status.HTTP_204_NO_CONTENT)
 
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+def get_yield_analytics(request, farm_id):
+    """Get the daily yield of a product per animal with its 7 and 30 day rolling means and day over day change.
+
+    Covers `start` to `end`, the last 30 days by default, with the herd's
+    percentiles per day. `product_id` is required.
+    """
+    farm = get_object_or_404(Farm, id=farm_id)
+    try:
+        product_id = int(request.query_params['product_id'])
+    except (KeyError, ValueError):
+        return Response({'error': 'product_id is required'}, status=status.HTTP_400_BAD_REQUEST)
+    product = get_object_or_404(Product, id=product_id, farm=farm)
+    try:
+        end_date = date.fromisoformat(request.query_params['end']) if 'end' in request.query_params else date.today()
+        start_date = date.fromisoformat(request.query_params['start']) if 'start' in request.query_params else end_date - timedelta(days=29)
+    except (ValueError, OverflowError):
+        return Response({'error': 'start and end must be dates in YYYY-MM-DD format'}, status=status.HTTP_400_BAD_REQUEST)
+    if start_date > end_date or (end_date - start_date).days >= MAX_ANALYTICS_DAYS:
+        return Response({'error': f'start must be on or before end and at most {MAX_ANALYTICS_DAYS} days before it'}, status=status.HTTP_400_BAD_REQUEST)
+    if start_date < EARLIEST_START:
+        return Response({'error': f'start must be on or after {EARLIEST_START.isoformat()}'}, status=status.HTTP_400_BAD_REQUEST)
+    return Response({'product': product.id, 'unit': product.unit, **yield_analytics(farm.id, product.id, start_date, end_date)})
+
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+def get_production_ranking(request, farm_id):
+    """Get the top and bottom producers of each product between `start` and `end`, the last 30 days by default.
+
+    Rows carry rank, percentile, share of the herd total and change against
+    the period of the same length before `start`. `limit` sets how many
+    animals each list holds and `product_id` restricts it to one product.
+    """
+    farm = get_object_or_404(Farm, id=farm_id)
+    params = request.query_params
+    try:
+        end_date = date.fromisoformat(params['end']) if 'end' in params else date.today()
+        start_date = date.fromisoformat(params['start']) if 'start' in params else end_date - timedelta(days=29)
+        product_id = int(params['product_id']) if params.get('product_id') else None
+    except (ValueError, OverflowError):
+        return Response({'error': 'start and end must be dates in YYYY-MM-DD format and product_id a number'}, status=status.HTTP_400_BAD_REQUEST)
+    if start_date > end_date:
+        return Response({'error': 'start must be on or before end'}, status=status.HTTP_400_BAD_REQUEST)
+    if not has_previous_period(start_date, end_date):
+        return Response({'error': 'start is too early to compare with the period before it'}, status=status.HTTP_400_BAD_REQUEST)
+    try:
+        limit = get_page_size(params.get('limit'), default=DEFAULT_RANKING_SIZE)
+    except ValueError as e:
+        return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+
+    ranking = production_ranking(farm.id, start_date, end_date, limit, product_id)
+    products = Product.objects.filter(id__in=list(ranking)).values('id', 'name', 'unit')
+    return Response({
+        'start': start_date,
+        'end': end_date,
+        'products': [{'product': product['id'], 'name': product['name'], 'unit': product['unit'], **ranking[product['id']]}
+                     for product in products.order_by('name')],
+    })
+
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+def get_lactations(request, farm_id):
+    """Get the fitted lactation curves of a product, highest projected 305 day yield first.
+
+    `product_id` is required. `current=true` keeps the lactations still
+    running and `animal_id` those of one animal.
+    """
+    farm = get_object_or_404(Farm, id=farm_id)
+    try:
+        product_id = int(request.query_params['product_id'])
+        animal_id = int(request.query_params['animal_id']) if request.query_params.get('animal_id') else None
+    except (KeyError, ValueError):
+        return Response({'error': 'product_id is required and ids must be numbers'}, status=status.HTTP_400_BAD_REQUEST)
+    product = get_object_or_404(Product, id=product_id, farm=farm)
+    lactations = Lactation.objects.filter(farm=farm, product=product).select_related('animal')
+    if request.query_params.get('current') == 'true':
+        lactations = lactations.filter(end_date__isnull=True)
+    if animal_id is not None:
+        lactations = lactations.filter(animal_id=animal_id)
+    lactations = lactations.order_by(F('projected_305_yield').desc(nulls_last=True), 'animal_id', '-calving_date')
+    serializer = LactationSerializer(lactations, many=True)
+    return Response(serializer.data)
+
+@api_view(['POST'])
+@permission_classes([IsAuthenticated])
+def add_milking_session(request, farm_id):
+    """Record the production of a whole milking session.
+
+    Takes `product`, `date`, `time`, optional `notes` and `entries`, a list of
+    `{animal, quantity}` or `{animal_type, quantity}`. Either every entry is
+    recorded or, when any is invalid, none is and the errors are returned per entry.
+    """
+    farm = get_object_or_404(Farm, id=farm_id)
+    try:
+        product, records = record_milking_session(farm, request.data)
+    except SessionError as e:
+        return Response(e.errors, status=status.HTTP_400_BAD_REQUEST)
+    return Response({
+        'product': product.id,
+        'date': records[0].date,
+        'time': records[0].time,
+        'created': len(records),
+        'total_quantity': sum(record.quantity for record in records),
+        'inventory': product.inventory,
+        'records': [
+            {'id': record.id, 'animal': record.animal_id, 'animal_type': record.animal_type_id, 'quantity': record.quantity}
+            for record in records
+        ],
+    }, status=status.HTTP_201_CREATED)
+
 # Buyer Views
 @api_view(['GET'])
 @permission_classes([IsAuthenticated])
@@ -0,0 +1,153 @@
+"""Per-animal daily yields of a product and their rolling analytics.
+
+The individual production records of a farm's product are read in one query
+as columns and summed into a matrix with a row per animal and a column per
+day, so the analytics of the whole herd are a handful of vectorized NumPy
+operations whatever its size. Group records, which belong to no single
+animal, are left out.
+
+A day without records is a day the animal was not milked rather than one it
+gave nothing, so rolling means average the recorded days of their window
+only, and are missing when the window has none.
+"""
+from datetime import date, timedelta
+import numpy as np
+from animals.models import Animal
+from .models import ProductionRecord
+
+ROLLING_WINDOWS = (7, 30)
+HERD_PERCENTILES = (10, 25, 50, 75, 90)
+MAX_ANALYTICS_DAYS = 366
+# The rolling means of start_date read the days before it
+EARLIEST_START = date.min + timedelta(days=max(ROLLING_WINDOWS) - 1)
+
+
+class DailyYields:
+    """Daily totals of a product per animal.
+
+    totals[i, d] is the yield of animal_ids[i] on first_day + d days, and
+    recorded[i, d] whether it has records that day.
+    """
+
+    def __init__(self, animal_ids, first_day, totals, recorded):
+        self.animal_ids = animal_ids
+        self.first_day = first_day
+        self.totals = totals
+        self.recorded = recorded
+
+    @property
+    def days(self):
+        return self.totals.shape[1]
+
+    def day(self, position):
+        return self.first_day + timedelta(days=position)
+
+
+def load_daily_yields(farm_ids, product_id, start_date, end_date):
+    """Sum a product's individual records on the farms from start_date to end_date into a DailyYields"""
+    rows = ProductionRecord.objects.filter(
+        farm_id__in=farm_ids, product_id=product_id, animal__isnull=False, date__range=(start_date, end_date)
+    ).values_list('animal_id', 'date', 'quantity').order_by()
+    animals, dates, quantities = zip(*rows) if rows else ((), (), ())
+
+    first = start_date.toordinal()
+    days = (end_date - start_date).days + 1
+    animal_ids, rows_of = np.unique(np.array(animals, dtype=np.int64), return_inverse=True)
+    columns = np.fromiter((day.toordinal() - first for day in dates), dtype=np.int64, count=len(dates))
+
+    totals = np.zeros((len(animal_ids), days))
+    np.add.at(totals, (rows_of, columns), np.array(quantities, dtype=float))
+    recorded = np.zeros((len(animal_ids), days), dtype=bool)
+    recorded[rows_of, columns] = True
+    return DailyYields(animal_ids, start_date, totals, recorded)
+
+
+def window_sums(values, window):
+    """Sum of each row over the trailing window of days ending on every day"""
+    cumulative = np.concatenate([np.zeros((values.shape[0], 1)), np.cumsum(values, axis=1)], axis=1)
+    ends = np.arange(1, values.shape[1] + 1)
+    return cumulative[:, ends] - cumulative[:, np.maximum(ends - window, 0)]
+
+
+def rolling_means(yields, window):
+    """Mean daily yield over the recorded days of the trailing window, NaN where it has none"""
+    counts = window_sums(yields.recorded.astype(float), window)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        return np.where(counts > 0, window_sums(yields.totals, window) / counts, np.nan)
+
+
+def day_over_day_change(yields):
+    """Change of the daily yield from the day before, NaN unless both days are recorded"""
+    change = np.full(yields.totals.shape, np.nan)
+    both = yields.recorded[:, 1:] & yields.recorded[:, :-1]
+    change[:, 1:] = np.where(both, yields.totals[:, 1:] - yields.totals[:, :-1], np.nan)
+    return change
+
+
+def herd_percentiles(yields, percentiles=HERD_PERCENTILES):
+    """{percentile: daily series} over the animals recorded each day, NaN on days without records"""
+    values = np.where(yields.recorded, yields.totals, np.nan)
+    result = np.full((len(percentiles), yields.days), np.nan)
+    recorded_days = yields.recorded.any(axis=0)
+    if recorded_days.any():
+        result[:, recorded_days] = np.nanpercentile(values[:, recorded_days], percentiles, axis=0)
+    return dict(zip(percentiles, result))
+
+
+def percent_ranks(values):
+    """Share of the other non-NaN values that are lower than each value, NaN for NaN values.
+
+    Ties share the lowest rank, as PercentRank does in SQL.
+    """
+    known = ~np.isnan(values)
+    ranks = np.full(values.shape, np.nan)
+    count = int(known.sum())
+    if count:
+        ordered = np.sort(values[known])
+        ranks[known] = np.searchsorted(ordered, values[known], side='left') / max(count - 1, 1)
+    return ranks
+
+
+def to_series(values, digits=2):
+    """JSON friendly list of rounded values, None for NaN"""
+    return [None if np.isnan(value) else value for value in np.round(values, digits).tolist()]
+
+
+def yield_analytics(farm_id, product_id, start_date, end_date):
+    """Daily totals, rolling means and day over day change per animal, and herd percentiles per day.
+
+    Every series has one value per day from start_date to end_date, None on
+    days without one. The rolling means of the first days use the records
+    before start_date. Animals are ranked by the percentile of their 7 day
+    mean on end_date among the herd, lowest first, so underperformers lead.
+    """
+    warmup = (EARLIEST_START - date.min).days
+    yields = load_daily_yields([farm_id], product_id, start_date - timedelta(days=warmup), end_date)
+    shown = slice(warmup, None)
+    means = {window: rolling_means(yields, window) for window in ROLLING_WINDOWS}
+    change = day_over_day_change(yields)
+    ranks = percent_ranks(means[7][:, -1])
+
+    in_range = yields.recorded[:, shown].any(axis=1)
+    order = sorted(np.flatnonzero(in_range).tolist(), key=lambda row: (np.isnan(ranks[row]), ranks[row]))
+    names = dict(Animal.objects.filter(id__in=yields.animal_ids[in_range].tolist()).values_list('id', 'name'))
+    animals = []
+    for row in order:
+        totals = np.where(yields.recorded[row, shown], yields.totals[row, shown], np.nan)
+        animals.append({
+            'animal': int(yields.animal_ids[row]),
+            'name': names.get(int(yields.animal_ids[row])),
+            'percentile': None if np.isnan(ranks[row]) else round(float(ranks[row]) * 100, 1),
+            'daily_total': to_series(totals),
+            'mean_7': to_series(means[7][row, shown]),
+            'mean_30': to_series(means[30][row, shown]),
+            'change': to_series(change[row, shown]),
+        })
+
+    herd = herd_percentiles(yields)
+    return {
+        'start': start_date,
+        'end': end_date,
+        'herd': {f'p{percentile}': to_series(series[shown]) for percentile, series in herd.items()},
+        'animals': animals,
+    }
@@ -105,7 +105,7 @@ def login(request):
         if "farm_code" in request.data:
             if farm.id in profile.farms.all().values_list('id', flat=True):
                 farm_details = FarmSerializer(farm)
-                animals = Animal.objects.filter(farm=farm)
+                animals = AnimalSerializer.prefetch_for_list(Animal.objects.filter(farm=farm))
                 types = AnimalType.objects.filter(farm=farm)
                 breeds = AnimalBreed.objects.filter(farm=farm)
             else:
@@ -177,7 +177,7 @@ def edit_profile(request):
 def get_farm(request, farm_id):
     """Get farm"""
     farm = Farm.objects.get(id=farm_id)
-    animals = Animal.objects.filter(farm=farm)
+    animals = AnimalSerializer.prefetch_for_list(Animal.objects.filter(farm=farm))
     types = AnimalType.objects.filter(farm=farm)
     breeds = AnimalBreed.objects.filter(farm=farm)
 